@@ -1,6 +1,422 @@
+import copy
 import json
 import numpy as np
 import pandas as pd
+import Rolling
+from Panel import OHLCVPanel, align_frame, apply_missing, check_policies, period_returns
+
+# Correspondance entre les clés du JSON de résultats et les attributs de Stats
+METRICS = [
+    ('Rendement Annuel', 'r_annual'),
+    ('Volatilite Annuelle', 'vol_annual'),
+    ('Ratio de Sharpe', 'sharpe_r'),
+    ('Skewness', 'skew'),
+    ('Kurtosis', 'kurt'),
+    ('Semi-Deviation', 'semi_deviation'),
+    ('VaR Historique', 'var_hist'),
+    ('Drawdown Maximal', 'max_draw'),
+    ('Volatilite a la Baisse', 'downside_vol'),
+    ('Ratio de Sortino', 'sortino_ratio'),
+    ('Ratio de Calmar', 'calmar_ratio'),
+]
+
+# Métriques ajoutées lorsque les poids passent par le simulateur de portefeuille (Simulator.PortfolioSimulator)
+TRADING_METRICS = [
+    ('Turnover Moyen', 'turnover'),
+    ('Couts Totaux', 'costs'),
+]
+
+# Paramètres de QuantileDigest : nombre de rendements conservés tels quels (VaR exacte en dessous), puis
+# compression (les centroïdes sont au plus compression / 2 + 1)
+QUANTILE_BUFFER = 5000
+QUANTILE_COMPRESSION = 1000
+
+
+def returns_panel(dfs_dict, fill='ffill', missing='zero'):
+    """
+    Description : Aligne les prix de clôture de tous les actifs sur un calendrier commun et calcule leurs
+    rendements, selon les politiques d'alignement choisies (voir Panel.FILL_POLICIES et Panel.MISSING_POLICIES).
+
+    Renvoie : Un triplet (calendrier, liste des tickers, tableau numpy dates x tickers des rendements).
+    """
+    panel = OHLCVPanel.from_frames(dfs_dict, ['Close'])
+    index, returns = panel.returns('Close', fill, missing)
+    return index, panel.tickers, returns
+
+
+def returns_matrix(dfs_dict, fill='ffill', missing='zero'):
+    """
+    Description : Aligne les prix de clôture de tous les actifs sur un index commun et calcule leurs rendements.
+
+    Renvoie : Un couple (liste des tickers, tableau numpy dates x tickers des rendements). Par défaut, les prix
+    manquants sont propagés depuis la dernière valeur connue et les rendements non définis valent 0.
+    """
+    _, tickers, returns = returns_panel(dfs_dict, fill, missing)
+    return tickers, returns
+
+
+def chunk_returns(closes, previous=None, fill='ffill', missing='zero'):
+    """
+    Description : Calcule les rendements d'un bloc de prix de clôture (dates x tickers), en prolongeant les
+    derniers prix du bloc précédent. Enchaîner les blocs donne les mêmes rendements que returns_panel
+    sur toute la période.
+
+    Paramètres :
+        closes : Tableau numpy des prix de clôture du bloc (NaN pour les prix manquants).
+        previous : Derniers prix à la fin du bloc précédent (None pour le premier bloc).
+        fill, missing : Politiques d'alignement.
+    Renvoie : Un triplet (rendements du bloc, derniers prix à la fin du bloc, masque des dates conservées).
+    """
+    check_policies(fill, missing)
+    returns, previous = period_returns(closes, previous, fill)
+    returns, keep = apply_missing(returns, missing)
+    return returns, previous, keep
+
+
+def align_weights(poids_ts, tickers, index):
+    """
+    Description : Convertit les poids renvoyés par la stratégie en un tableau aligné sur les rendements.
+
+    Paramètres :
+        poids_ts : DataFrame des poids (une colonne par ticker).
+        tickers : Ordre des actifs du tableau de rendements.
+        index : Calendrier du tableau de rendements (ou son nombre de périodes).
+    Renvoie : Un tableau numpy (périodes x tickers) des poids. Les colonnes sont associées par nom ; les lignes
+    par date si les poids sont indexés par des dates, par position sinon. Les poids manquants valent 0.
+    """
+    if isinstance(index, (int, np.integer)):
+        index = pd.RangeIndex(index)
+    return align_frame(poids_ts, index, tickers)
+
+
+def compute_metrics(r, rf_rate=0.2, scale=9):
+    """
+    Description : Calcule l'ensemble des métriques de performance en une seule passe, à partir de moments
+    partagés (moyenne, moments centrés d'ordre 2 à 4, produits composés).
+
+    Paramètres :
+        r : Rendements de l'indice, tableau numpy à une dimension ou à deux dimensions (une ligne par série).
+        rf_rate : Taux sans risque annuel.
+        scale : Nombre de périodes par an utilisé pour l'annualisation.
+    Renvoie : Un dictionnaire {attribut de Stats: valeur ou tableau de valeurs (une par série)}.
+    """
+    r = np.asarray(r, dtype=float)
+    n = r.shape[-1]
+    rf_per_period = (1 + rf_rate) ** (1 / scale) - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = r.mean(axis=-1, keepdims=True)
+        demeaned = r - mean
+        squared = demeaned * demeaned
+        m2 = squared.mean(axis=-1)
+        m3 = (squared * demeaned).mean(axis=-1)
+        m4 = (squared * squared).mean(axis=-1)
+        std_pop = np.sqrt(m2)
+        std_sample = np.sqrt(m2 * n / (n - 1)) if n > 1 else np.full_like(m2, np.nan)
+
+        r_annual = np.prod(1 + r, axis=-1) ** (scale / n) - 1
+        excess_annual = np.prod(1 + r - rf_per_period, axis=-1) ** (scale / n) - 1
+        vol_annual = std_sample * np.sqrt(scale)
+
+        negative = r < 0
+        n_negative = negative.sum(axis=-1)
+        mean_negative = np.where(negative, r, 0).sum(axis=-1) / n_negative
+        semi_deviation = np.sqrt(np.where(negative, (r - mean_negative[..., None]) ** 2, 0).sum(axis=-1)
+                                 / n_negative)
+
+        peaks = np.maximum.accumulate(r, axis=-1)
+        # fmin ignore les NaN (0/0) comme le ferait pandas
+        max_draw = np.fmin.reduce((r - peaks) / peaks, axis=-1)
+        downside_vol = np.sqrt(np.mean(np.minimum(r - rf_rate, 0) ** 2, axis=-1))
+
+        metrics = {
+            'r_annual': r_annual,
+            'vol_annual': vol_annual,
+            'sharpe_r': excess_annual / vol_annual,
+            'skew': m3 / std_pop ** 3,
+            'kurt': m4 / std_pop ** 4,
+            'semi_deviation': semi_deviation,
+            'var_hist': np.percentile(r, 5, axis=-1),
+            'max_draw': max_draw,
+            'downside_vol': downside_vol,
+            'sortino_ratio': excess_annual / downside_vol,
+            'calmar_ratio': r_annual / -max_draw,
+        }
+    return metrics
+
+
+class QuantileDigest:
+    """
+    La classe QuantileDigest estime les quantiles d'une série de rendements en mémoire bornée (t-digest de taille
+    fixe, échelle k1). Tant que la série compte au plus buffer_size valeurs, elles sont conservées telles quelles
+    et quantile() renvoie exactement np.percentile. Au-delà, les valeurs triées sont regroupées en centroïdes
+    (moyenne, poids) d'autant plus fins qu'ils sont proches des extrémités de la distribution, où se trouve la VaR :
+    la mémoire, la taille de l'état sérialisé et le coût d'une estimation ne dépendent plus de la longueur de
+    l'historique.
+    """
+    def __init__(self, compression=QUANTILE_COMPRESSION, buffer_size=QUANTILE_BUFFER):
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.n_nan = 0
+        self.minimum = np.inf
+        self.maximum = -np.inf
+
+    def update(self, values):
+        """
+        Description : Intègre de nouvelles valeurs (traitement vectorisé, sans boucle Python par valeur).
+        """
+        values = np.asarray(values, dtype=float).ravel()
+        nan = np.isnan(values)
+        self.n_nan += int(nan.sum())
+        values = values[~nan]
+        if values.size == 0:
+            return self
+        self.minimum = min(self.minimum, float(values.min()))
+        self.maximum = max(self.maximum, float(values.max()))
+        means = np.concatenate([self.means, values])
+        weights = np.concatenate([self.weights, np.ones(values.size)])
+        order = np.argsort(means, kind='stable')
+        self.means, self.weights = means[order], weights[order]
+        if self.means.size > self.buffer_size:
+            self._compress()
+        return self
+
+    def _compress(self):
+        # Position de chaque centroïde dans la distribution, puis découpage en intervalles de l'échelle
+        # k1(q) = compression / (2π) * asin(2q - 1) : au plus compression / 2 + 1 groupes de centroïdes contigus
+        total = self.weights.sum()
+        q = (np.cumsum(self.weights) - self.weights / 2) / total
+        k = np.floor(self.compression / (2 * np.pi) * np.arcsin(2 * q - 1))
+        starts = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+        weights = np.add.reduceat(self.weights, starts)
+        self.means = np.add.reduceat(self.means * self.weights, starts) / weights
+        self.weights = weights
+
+    def quantile(self, q):
+        """
+        Description : Estime le quantile q (entre 0 et 1), avec la même interpolation linéaire que np.percentile.
+
+        Renvoie : Le quantile, NaN si la série est vide ou contient des NaN (comme np.percentile).
+        """
+        if self.n_nan or self.weights.size == 0:
+            return np.nan
+        cumulative = np.cumsum(self.weights)
+        n = cumulative[-1]
+        # Rang (base 0) du centre de chaque centroïde : i pour une valeur isolée
+        centers = cumulative - (self.weights + 1) / 2
+        means = self.means
+        if self.weights[0] > 1:
+            centers, means = np.r_[0.0, centers], np.r_[self.minimum, means]
+        if self.weights[-1] > 1:
+            centers, means = np.r_[centers, n - 1], np.r_[means, self.maximum]
+        return float(np.interp(q * (n - 1), centers, means))
+
+    def get_state(self):
+        """
+        Description : Renvoie le digest sous une forme sérialisable en JSON (au plus buffer_size centroïdes).
+        """
+        return {"compression": self.compression, "buffer_size": self.buffer_size, "means": self.means.tolist(),
+                "weights": self.weights.tolist(), "n_nan": self.n_nan, "minimum": self.minimum,
+                "maximum": self.maximum}
+
+    @classmethod
+    def from_state(cls, state):
+        digest = cls(state["compression"], state["buffer_size"])
+        digest.means = np.array(state["means"], dtype=float)
+        digest.weights = np.array(state["weights"], dtype=float)
+        digest.n_nan, digest.minimum, digest.maximum = state["n_nan"], state["minimum"], state["maximum"]
+        return digest
+
+
+class RunningStats:
+    """
+    La classe RunningStats maintient les agrégats nécessaires aux métriques de compute_metrics (moments centrés
+    fusionnables, produits composés, pic courant, sommes des rendements négatifs, QuantileDigest pour la VaR
+    historique), afin de mettre à jour les statistiques d'un backtest avec de nouveaux rendements sans reparcourir
+    l'historique. La mémoire et l'état sérialisé sont bornés quelle que soit la longueur de l'historique.
+    La série des rendements n'est conservée que si keep_series est vrai, pour les séries de suivi (rolling) ;
+    elle ne fait jamais partie de l'état (get_state).
+    """
+    def __init__(self, rf_rate=0.2, scale=9, simulated=False, keep_series=False):
+        self.rf_rate = rf_rate
+        self.scale = scale
+        self.simulated = simulated
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.m3 = 0.0
+        self.m4 = 0.0
+        self.growth = 1.0
+        self.excess_growth = 1.0
+        self.peak = -np.inf
+        self.max_draw = np.nan
+        self.n_negative = 0
+        self.sum_negative = 0.0
+        self.sumsq_negative = 0.0
+        self.downside_sumsq = 0.0
+        self.turnover_sum = 0.0
+        self.costs_sum = 0.0
+        self.quantiles = QuantileDigest()
+        self.keep_series = keep_series
+        self.returns = [] if keep_series else None
+        self.dates = [] if keep_series else None
+
+    def update(self, r, turnover=None, costs=None, dates=None):
+        """
+        Description : Intègre de nouveaux rendements de l'indice aux agrégats.
+
+        Paramètres :
+            r : Nouveaux rendements, dans l'ordre chronologique.
+            turnover, costs : Turnover et coûts de chaque nouvelle bougie, renvoyés par le simulateur de
+                              portefeuille (optionnels).
+            dates : Dates des nouveaux rendements (optionnelles), conservées avec les rendements pour les séries de
+                    rolling si keep_series est vrai.
+        Processus :
+            Les moments du bloc sont fusionnés avec les moments courants (formules de fusion de Pébay), les produits
+            composés sont multipliés, et le drawdown est calculé par rapport au pic courant.
+        """
+        r = np.asarray(r, dtype=float)
+        n_b = r.shape[0]
+        if n_b == 0:
+            return self
+        if turnover is not None:
+            self.turnover_sum += float(np.sum(turnover))
+            self.costs_sum += float(np.sum(costs))
+        rf_per_period = (1 + self.rf_rate) ** (1 / self.scale) - 1
+        mean_b = r.mean()
+        demeaned = r - mean_b
+        m2_b = np.sum(demeaned ** 2)
+        m3_b = np.sum(demeaned ** 3)
+        m4_b = np.sum(demeaned ** 4)
+
+        n_a = self.n
+        n = n_a + n_b
+        delta = mean_b - self.mean
+        m4 = (self.m4 + m4_b + delta ** 4 * n_a * n_b * (n_a ** 2 - n_a * n_b + n_b ** 2) / n ** 3
+              + 6 * delta ** 2 * (n_a ** 2 * m2_b + n_b ** 2 * self.m2) / n ** 2
+              + 4 * delta * (n_a * m3_b - n_b * self.m3) / n)
+        m3 = (self.m3 + m3_b + delta ** 3 * n_a * n_b * (n_a - n_b) / n ** 2
+              + 3 * delta * (n_a * m2_b - n_b * self.m2) / n)
+        self.m2 = self.m2 + m2_b + delta ** 2 * n_a * n_b / n
+        self.m3, self.m4 = m3, m4
+        self.mean = self.mean + delta * n_b / n
+        self.n = n
+
+        self.growth *= np.prod(1 + r)
+        self.excess_growth *= np.prod(1 + r - rf_per_period)
+
+        negative = r[r < 0]
+        self.n_negative += negative.shape[0]
+        self.sum_negative += negative.sum()
+        self.sumsq_negative += np.sum(negative ** 2)
+        self.downside_sumsq += np.sum(np.minimum(r - self.rf_rate, 0) ** 2)
+
+        peaks = np.maximum.accumulate(np.concatenate([[self.peak], r]))[1:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.max_draw = np.fmin(self.max_draw, np.fmin.reduce((r - peaks) / peaks))
+        self.peak = peaks[-1]
+        self.quantiles.update(r)
+        if self.keep_series:
+            self.returns.extend(r.tolist())
+            if dates is not None:
+                self.dates.extend(pd.DatetimeIndex(dates).as_unit('ns').asi8.tolist())
+        return self
+
+    def metrics(self):
+        """
+        Description : Calcule les métriques à partir des agrégats courants.
+
+        Renvoie : Un dictionnaire {attribut de Stats: valeur}, identique (aux erreurs d'arrondi près) à celui que
+        renverrait compute_metrics sur l'ensemble des rendements intégrés ; la VaR historique est exacte jusqu'à
+        QUANTILE_BUFFER rendements, estimée par QuantileDigest au-delà.
+        """
+        n, scale = self.n, self.scale
+        with np.errstate(divide='ignore', invalid='ignore'):
+            m2 = self.m2 / n
+            std_pop = np.sqrt(m2)
+            vol_annual = np.sqrt(self.m2 / (n - 1)) * np.sqrt(scale) if n > 1 else np.nan
+            r_annual = self.growth ** (scale / n) - 1
+            excess_annual = self.excess_growth ** (scale / n) - 1
+            mean_negative = np.float64(self.sum_negative) / self.n_negative
+            semi_deviation = np.sqrt(np.maximum(np.float64(self.sumsq_negative) / self.n_negative
+                                                - mean_negative ** 2, 0))
+            downside_vol = np.sqrt(self.downside_sumsq / n)
+            metrics = {
+                'r_annual': r_annual,
+                'vol_annual': vol_annual,
+                'sharpe_r': excess_annual / vol_annual,
+                'skew': self.m3 / n / std_pop ** 3,
+                'kurt': self.m4 / n / std_pop ** 4,
+                'semi_deviation': semi_deviation,
+                'var_hist': self.quantiles.quantile(0.05),
+                'max_draw': self.max_draw,
+                'downside_vol': downside_vol,
+                'sortino_ratio': excess_annual / downside_vol,
+                'calmar_ratio': r_annual / -self.max_draw,
+            }
+            if self.simulated:
+                metrics['turnover'] = self.turnover_sum / n
+                metrics['costs'] = self.costs_sum
+        return {attribute: float(value) for attribute, value in metrics.items()}
+
+    def to_dict(self):
+        """
+        Description : Renvoie les statistiques de performance sous forme de dictionnaire, avec les clés de Stats.
+        """
+        metrics = self.metrics()
+        return {key: metrics[attribute] for key, attribute in METRICS + (TRADING_METRICS if self.simulated else [])}
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=4)
+
+    def rolling(self, windows):
+        """
+        Description : Calcule les séries de suivi (drawdown, métriques glissantes) sur l'ensemble des rendements
+        intégrés (voir Rolling.series_to_dict). Nécessite keep_series.
+        """
+        if not self.keep_series:
+            raise ValueError("Les séries de suivi nécessitent RunningStats(keep_series=True)")
+        index = pd.DatetimeIndex(self.dates) if len(self.dates) == len(self.returns) else None
+        return Rolling.series_to_dict(self.returns, windows, index, self.rf_rate, self.scale)
+
+    def get_state(self):
+        """
+        Description : Renvoie les agrégats sous une forme sérialisable en JSON, pour être conservés entre deux
+        exécutions d'un backtest récurrent. Sa taille est bornée : la série des rendements n'en fait pas partie
+        (elle est conservée avec le résultat, clé Series, si la requête demande des séries de suivi).
+        """
+        state = {attribute: float(value) if isinstance(value, np.floating) else value
+                 for attribute, value in vars(self).items() if attribute not in ('keep_series', 'returns', 'dates')}
+        state['quantiles'] = self.quantiles.get_state()
+        return state
+
+    @classmethod
+    def from_state(cls, state, returns=None, dates=None):
+        """
+        Description : Reconstruit les agrégats conservés par get_state().
+
+        Paramètres :
+            state : État renvoyé par get_state() ; il n'est pas modifié par les mises à jour suivantes.
+            returns, dates : Série des rendements déjà intégrés et leurs dates en nanosecondes (optionnelles),
+                             pour continuer les séries de suivi (keep_series).
+        """
+        running_stats = cls(state['rf_rate'], state['scale'], keep_series=returns is not None)
+        for attribute, value in state.items():
+            if attribute == 'quantiles':
+                value = QuantileDigest.from_state(value)
+            elif attribute in ('returns', 'dates'):
+                continue
+            setattr(running_stats, attribute, copy.deepcopy(value))
+        if 'quantiles' not in state:
+            # État écrit avant QuantileDigest : il contient la série complète des rendements
+            running_stats.quantiles.update(state.get('returns', []))
+        if returns is not None:
+            running_stats.returns = list(returns)
+            running_stats.dates = list(dates) if dates is not None else []
+        return running_stats
+
+
 class Stats:
     """
     La classe Stats est conçue pour calculer et fournir des statistiques de performance
@@ -8,9 +424,12 @@ class Stats:
     stratégie et les données des actifs pour calculer différents indicateurs de performance,
     tels que le rendement annuel, la volatilité, le ratio de Sharpe, et plus encore.
     """
-    def __init__(self, poids_ts, dfs_dict):
+    def __init__(self, poids_ts, dfs_dict, fill='ffill', missing='zero', simulator=None):
         self.poids_ts = poids_ts
         self.dfs_dict = dfs_dict
+        self.fill = fill
+        self.missing = missing
+        self.simulator = simulator
         self.rf_rate = 0.2
         self.scale = 9
         self.r_indice = self.calculate_index_returns()
@@ -22,29 +441,26 @@ class Stats:
 
         Renvoie : Un DataFrame des rendements calculés pour chaque actif.
         """
-        df_closes = pd.DataFrame()
-        df_concat = pd.DataFrame()
-        for key, df in self.dfs_dict.items():
-            df_closes = pd.DataFrame(df['Close'].items(), columns=['Date', key]).set_index('Date')
-            df_closes[key] = df_closes[key].astype(float)
-            df_concat = pd.concat([df_closes, df_concat], axis=1)
-        df_returns = df_concat.pct_change().fillna(0)
-        df_returns = df_returns.reset_index(drop=True)
-        return df_returns
+        index, tickers, returns = returns_panel(self.dfs_dict, self.fill, self.missing)
+        return pd.DataFrame(returns, index=index, columns=tickers)
 
     def calculate_index_returns(self):
         """
         Description : Calcule les rendements de l'indice composé, basés sur
                     les poids de la stratégie et les rendements des actifs.
 
-        Renvoie : Un DataFrame contenant les rendements de l'indice pour chaque période.
+        Renvoie : Un DataFrame contenant les rendements de l'indice pour chaque date du calendrier commun. Les
+        poids sont joints aux rendements par date (voir align_weights). Si un simulateur de portefeuille est
+        fourni, les rendements sont nets des coûts de transaction, et le turnover et les coûts de chaque date
+        sont conservés dans turnover_ts et costs_ts.
         """
-        df_returns = self.calculate_returns_from_dfs()
-        df_poids = self.poids_ts.reset_index(drop=True)
-        df_index_returns = (df_returns * df_poids).sum(axis=1)
-        return df_index_returns.to_frame(name='Index_Return')
-        #return self.poids_ts
-        #return df_returns
+        index, tickers, returns = returns_panel(self.dfs_dict, self.fill, self.missing)
+        weights = align_weights(self.poids_ts, tickers, index)
+        if self.simulator is None:
+            index_returns = np.einsum('tn,tn->t', returns, weights)
+        else:
+            index_returns, self.turnover_ts, self.costs_ts, self.simulator_state = self.simulator.run(returns, weights)
+        return pd.DataFrame({'Index_Return': index_returns}, index=index)
 
     def setup_metrics(self):
         """
@@ -52,64 +468,122 @@ class Stats:
                         basées sur les rendements de l'indice.
 
         Rôle : Calcule et stocke les indicateurs clés de performance, comme le rendement annuel,
-        la volatilité annuelle, le ratio de Sharpe, et d'autres statistiques.
-        """
-        self.r_annual = self.annualize_rets(self.r_indice, self.scale)
-        self.vol_annual = self.annualize_vol()
-        self.sharpe_r = self.sharpe_ratio()
-        self.skew = self.skewness()
-        self.kurt = self.kurtosis()
-        self.semi_deviation = self.semideviation()
-        self.var_hist = self.var_historic()
-        self.max_draw = self.compute_drawdowns()
-        self.downside_vol = self.downside_volatility()
-        self.sortino_ratio = self.sortino_ratio()
-        self.calmar_ratio = self.calmar_ratio()
+        la volatilité annuelle, le ratio de Sharpe, et d'autres statistiques, en une seule passe
+        avec compute_metrics.
+        """
+        metrics = compute_metrics(self.r_indice['Index_Return'].to_numpy(), self.rf_rate, self.scale)
+        if self.simulator is not None:
+            metrics['turnover'] = self.turnover_ts.mean() if self.turnover_ts.size else 0.0
+            metrics['costs'] = self.costs_ts.sum()
+        for attribute, value in metrics.items():
+            setattr(self, attribute, float(value))
 
     @staticmethod
-    def annualize_rets(r, scale):
-        compounded_growth = (1 + r).prod()
-        n_periods = r.shape[0]
-        return compounded_growth ** (scale / n_periods) - 1
+    def batch(poids_list, dfs_dict, rf_rate=0.2, scale=9, fill='ffill', missing='zero', simulator=None):
+        """
+        Description : Évalue plusieurs jeux de poids sur les mêmes données en une seule passe vectorisée.
 
-    def annualize_vol(self):
-        return self.r_indice.std() * np.sqrt(self.scale)
+        Paramètres :
+            poids_list : Liste (ou dictionnaire {nom: poids}) de DataFrames de poids.
+            dfs_dict : Dictionnaire des DataFrames contenant les prix des actifs.
+            fill, missing : Politiques d'alignement.
+            simulator : Simulateur de portefeuille appliqué à tous les jeux de poids (optionnel).
+        Renvoie : Un DataFrame avec une ligne par jeu de poids et une colonne par métrique.
+        """
+        names, index_returns, turnover, costs = Stats.batch_returns(poids_list, dfs_dict, fill, missing, simulator)
+        return Stats.metrics_table(index_returns, turnover, costs, names, rf_rate, scale)
 
-    def sharpe_ratio(self):
-        rf_per_period = (1 + self.rf_rate) ** (1 / self.scale) - 1
-        excess_ret = self.r_indice - rf_per_period
-        return self.annualize_rets(excess_ret, self.scale) / self.annualize_vol()
+    @staticmethod
+    def batch_returns(poids_list, dfs_dict, fill='ffill', missing='zero', simulator=None):
+        """
+        Description : Calcule en une passe les rendements de l'indice de plusieurs jeux de poids.
 
-    def skewness(self):
-        demeaned_r = self.r_indice - self.r_indice.mean()
-        return (demeaned_r ** 3).mean() / (self.r_indice.std(ddof=0) ** 3)
+        Renvoie : Un quadruplet (noms, rendements (jeux x dates), turnover, coûts), les deux derniers valant None
+        sans simulateur.
+        """
+        names = list(poids_list.keys()) if isinstance(poids_list, dict) else list(range(len(poids_list)))
+        poids_list = list(poids_list.values()) if isinstance(poids_list, dict) else list(poids_list)
+        index, tickers, returns = returns_panel(dfs_dict, fill, missing)
+        weights = np.stack([align_weights(poids, tickers, index) for poids in poids_list])
+        if simulator is None:
+            return names, np.einsum('ktn,tn->kt', weights, returns), None, None
+        index_returns, turnover, costs, _ = simulator.run(returns, weights)
+        return names, index_returns, turnover, costs
 
-    def kurtosis(self):
-        demeaned_r = self.r_indice - self.r_indice.mean()
-        return (demeaned_r ** 4).mean() / (self.r_indice.std(ddof=0) ** 4)
+    @staticmethod
+    def metrics_table(index_returns, turnover, costs, names, rf_rate=0.2, scale=9):
+        """
+        Description : Calcule les métriques de plusieurs séries de rendements (une ligne par série), avec le
+        turnover moyen et les coûts totaux si turnover et costs sont fournis.
 
-    def semideviation(self):
-        return self.r_indice[self.r_indice < 0].std(ddof=0)
+        Renvoie : Un DataFrame avec une ligne par série et une colonne par métrique.
+        """
+        metrics = compute_metrics(index_returns, rf_rate, scale)
+        if turnover is None:
+            return pd.DataFrame({key: metrics[attribute] for key, attribute in METRICS}, index=names)
+        metrics['turnover'] = turnover.mean(axis=-1) if turnover.shape[-1] else np.zeros(len(names))
+        metrics['costs'] = costs.sum(axis=-1)
+        return pd.DataFrame({key: metrics[attribute] for key, attribute in METRICS + TRADING_METRICS}, index=names)
 
-    def var_historic(self, level=5):
-        return np.percentile(self.r_indice, level)
+    @staticmethod
+    def compare(poids_dict, dfs_dict, allocation=None, rf_rate=0.2, scale=9, fill='ffill', missing='zero',
+                simulator=None):
+        """
+        Description : Compare plusieurs stratégies sur les mêmes données et évalue le portefeuille qui les combine,
+        en une seule passe vectorisée.
 
-    def compute_drawdowns(self):
-        peaks = self.r_indice.cummax()
-        drawdowns = (self.r_indice - peaks) / peaks
-        return drawdowns.min()
+        Paramètres :
+            poids_dict : Dictionnaire {nom de la stratégie: DataFrame de poids}.
+            dfs_dict : Dictionnaire des DataFrames contenant les prix des actifs.
+            allocation : Dictionnaire {nom de la stratégie: part du capital} du portefeuille de stratégies
+                         (par défaut, parts égales).
+            fill, missing : Politiques d'alignement.
+            simulator : Simulateur de portefeuille appliqué à chaque stratégie (optionnel).
+        Renvoie : Un triplet (statistiques, matrice de corrélation, statistiques du portefeuille) : un DataFrame
+        avec une ligne par stratégie, un DataFrame (stratégies x stratégies) des corrélations de leurs rendements
+        et un dictionnaire des métriques du portefeuille.
 
-    def downside_volatility(self):
-        downside = np.minimum(self.r_indice - self.rf_rate, 0)
-        return np.sqrt(np.mean(downside ** 2))
+        Processus :
+            Les rendements de toutes les stratégies sont calculés en une passe (batch_returns). Le portefeuille
+            de stratégies est rééquilibré à chaque bougie vers l'allocation : son rendement est la moyenne des
+            rendements (nets de coûts) des stratégies pondérée par l'allocation, sans compensation des ordres
+            entre stratégies. Ses métriques sont calculées dans le même appel à compute_metrics que celles des
+            stratégies.
+        """
+        names, index_returns, turnover, costs = Stats.batch_returns(poids_dict, dfs_dict, fill, missing, simulator)
+        if allocation is None:
+            allocation = {name: 1 / len(names) for name in names}
+        shares = np.array([allocation.get(name, 0.0) for name in names], dtype=float)
+        stacked = np.vstack([index_returns, shares @ index_returns])
+        if turnover is not None:
+            turnover = np.vstack([turnover, shares @ turnover])
+            costs = np.vstack([costs, shares @ costs])
+        table = Stats.metrics_table(stacked, turnover, costs, names + ['portfolio'], rf_rate, scale)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            correlation = np.corrcoef(index_returns) if index_returns.shape[-1] > 1 else np.full((len(names),) * 2,
+                                                                                                 np.nan)
+        correlation = pd.DataFrame(np.atleast_2d(correlation), index=names, columns=names)
+        return table.iloc[:-1], correlation, table.iloc[-1].to_dict()
 
-    def sortino_ratio(self):
-        rf_per_period = (1 + self.rf_rate) ** (1 / self.scale) - 1
-        excess_return = self.r_indice - rf_per_period
-        return self.annualize_rets(excess_return, self.scale) / self.downside_volatility()
+    def to_dict(self):
+        """
+        Description : Renvoie les statistiques de performance calculées sous forme de dictionnaire.
+        """
+        metrics = METRICS + (TRADING_METRICS if self.simulator is not None else [])
+        return {key: getattr(self, attribute) for key, attribute in metrics}
+
+    def rolling(self, windows):
+        """
+        Description : Calcule les séries de suivi des rendements de l'indice : courbe de drawdown, durée sous
+        l'eau et, pour chaque taille de fenêtre, rendement, volatilité, ratio de Sharpe et drawdown glissants.
+        Chaque série est calculée en O(n) (voir le module Rolling).
 
-    def calmar_ratio(self):
-        return self.r_annual / -self.max_draw
+        Paramètres :
+            windows : Tailles des fenêtres, en nombre de bougies.
+        Renvoie : Un dictionnaire sérialisable en JSON (voir Rolling.series_to_dict).
+        """
+        return Rolling.series_to_dict(self.r_indice['Index_Return'].to_numpy(), windows, self.r_indice.index,
+                                      self.rf_rate, self.scale)
 
     def to_json(self):
         """
@@ -117,27 +591,9 @@ class Stats:
 
         Renvoie : Une chaîne JSON contenant toutes les métriques de performance calculées par l'instance Stats.
         """
-        stats_dict = {
-            'Rendement Annuel': self.r_annual.item() if isinstance(self.r_annual, pd.Series) else self.r_annual,
-            'Volatilite Annuelle': self.vol_annual.item() if isinstance(self.vol_annual,
-                                                                        pd.Series) else self.vol_annual,
-            'Ratio de Sharpe': self.sharpe_r.item() if isinstance(self.sharpe_r, pd.Series) else self.sharpe_r,
-            'Skewness': self.skew.item() if isinstance(self.skew, pd.Series) else self.skew,
-            'Kurtosis': self.kurt.item() if isinstance(self.kurt, pd.Series) else self.kurt,
-            'Semi-Deviation': self.semi_deviation.item() if isinstance(self.semi_deviation,
-                                                                       pd.Series) else self.semi_deviation,
-            'VaR Historique': self.var_hist.item() if isinstance(self.var_hist, pd.Series) else self.var_hist,
-            'Drawdown Maximal': self.max_draw.item() if isinstance(self.max_draw, pd.Series) else self.max_draw,
-            'Volatilite a la Baisse': self.downside_vol.item() if isinstance(self.downside_vol,
-                                                                             pd.Series) else self.downside_vol,
-            'Ratio de Sortino': self.sortino_ratio.item() if isinstance(self.sortino_ratio,
-                                                                        pd.Series) else self.sortino_ratio,
-            'Ratio de Calmar': self.calmar_ratio.item() if isinstance(self.calmar_ratio,
-                                                                      pd.Series) else self.calmar_ratio
-        }
-        return json.dumps(stats_dict, indent=4)
+        return json.dumps(self.to_dict(), indent=4)
 
 
 if __name__ == "__main__":
 
-    statistiques = Stats()
\ No newline at end of file
+    statistiques = Stats()
@@ -1,9 +1,25 @@
 import Backtest
+import numpy as np
 import pandas as pd
 import subprocess
 import os
-import sys
+import itertools
+import hashlib
+import shutil
+import tempfile
 import json
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+import DataTransport
+from VenvPool import VenvPool, venv_pool
+from WorkerPool import worker_pool
+from JobQueue import JobCancelled
+from ResultCache import cache_key, panel_fingerprint, result_cache, strategy_fingerprint
+from CandleStore import INTERVAL_MS
+from Simulator import PortfolioSimulator
+from PanelRegistry import disk_root, panel_registry, shared_memory_root
+import Instrumentation
 
 class BacktestHandler:
     """
@@ -13,9 +29,54 @@ class BacktestHandler:
     """
     def __init__(self,
                  user_input,
-                 data: pd.DataFrame):
+                 data: pd.DataFrame,
+                 cancel_event=None,
+                 panel_path: str = None):
         self.user_input = user_input
         self.data = data
+        # Manifeste d'un panel déjà écrit sur disque (exécution par blocs, voir DataCollector.collect_panel) : data
+        # vaut alors None et les bougies ne sont lues dans le panel que bloc par bloc
+        self.disk_panel = panel_path
+        self.cancel_event = cancel_event
+        self.cache_hit = False
+        self.simulator = PortfolioSimulator.from_user_input(user_input)
+
+    def alignment(self):
+        """
+        Description : Renvoie les politiques d'alignement des séries choisies dans la requête (voir
+        Panel.FILL_POLICIES et Panel.MISSING_POLICIES).
+        """
+        return {"fill": self.user_input.fill_policy, "missing": self.user_input.missing_policy}
+
+    def summary(self, stats):
+        """
+        Description : Met en forme les statistiques d'un backtest (Backtest.Stats ou Backtest.RunningStats).
+
+        Renvoie : Le dictionnaire des statistiques, accompagné des séries de suivi (clé Series, voir
+        Stats.rolling) si la requête demande des fenêtres glissantes (rolling_windows).
+        """
+        result = stats.to_dict()
+        if self.user_input.rolling_windows:
+            result["Series"] = stats.rolling(self.user_input.rolling_windows)
+        return result
+
+    def report(self, stats):
+        """
+        Description : Renvoie les statistiques d'un backtest au format JSON (voir summary).
+        """
+        if not self.user_input.rolling_windows:
+            return stats.to_json()
+        return json.dumps(self.summary(stats), indent=4)
+
+    @staticmethod
+    def publish_partial(running_stats, **progress):
+        """
+        Description : Publie les statistiques partielles d'une exécution par blocs ou par plis (évènement
+        partial_stats de la trace du job, voir Instrumentation.emit), les valeurs non définies valant None.
+        """
+        if running_stats.n:
+            stats = {key: value if np.isfinite(value) else None for key, value in running_stats.to_dict().items()}
+            Instrumentation.emit("partial_stats", stats=stats, **progress)
 
     @staticmethod
     def run_subprocess(*args, **kwargs):
@@ -46,57 +107,614 @@ class BacktestHandler:
         Renvoie : Les résultats du backtesting sous forme de données structurées.
 
         Processus :
+            Renvoie directement le résultat mémorisé si une requête identique (même stratégie, mêmes packages, mêmes
+            données) a déjà été calculée ; cache_hit vaut alors True.
+            Délègue à run_walk_forward si la requête demande une validation walk-forward, et à run_streaming si elle
+            demande une exécution par blocs.
             Sauvegarde la stratégie de trading de l'utilisateur et les données financières dans des fichiers temporaires.
-            Crée un environnement virtuel et installe les packages requis.
-            Exécute la stratégie de trading dans l'environnement virtuel et collecte les résultats.
+            Obtient un environnement virtuel contenant les packages requis.
+            Exécute la stratégie de trading dans un worker de cet environnement et collecte les résultats.
             Nettoie les fichiers temporaires et renvoie les résultats du backtesting.
         """
-        # Save du dataframe en json
-        with open("user_function.py", "w") as file:
-            file.write(self.user_input.func_strat)
+        chunk_size = self.user_input.chunk_size
+        params = {"fill_policy": self.user_input.fill_policy, "missing_policy": self.user_input.missing_policy}
+        if chunk_size:
+            params.update(chunk_size=chunk_size, warmup_bars=self.user_input.warmup_bars)
+        if self.simulator is not None:
+            params["simulator"] = self.simulator.config()
+        if self.user_input.rolling_windows:
+            params["rolling_windows"] = sorted(set(self.user_input.rolling_windows))
+        walk_forward = self.user_input.walk_forward
+        if walk_forward is not None:
+            params["walk_forward"] = walk_forward.dict()
+        fingerprint = panel_fingerprint(self.disk_panel) if self.disk_panel is not None else None
+        key = cache_key(self.user_input.func_strat, self.user_input.requirements, self.data, params, fingerprint)
+        cached = result_cache.get(key)
+        Instrumentation.cache_lookup("result", hit=cached is not None)
+        if cached is not None:
+            self.cache_hit = True
+            return cached
 
-        # Conversion de chaque df en json
-        dico_df_json = {key: df.to_json() for key, df in self.data.items()}
+        if walk_forward is not None:
+            stats_backtest = self.run_walk_forward(**walk_forward.dict())
+        elif chunk_size:
+            stats_backtest = self.run_streaming(chunk_size, self.user_input.warmup_bars or 0)
+        else:
+            result = self.run_strategy()
+            stats_backtest = self.backtesting(result, self.data)
+        result_cache.put(key, stats_backtest)
+        return stats_backtest
 
-        # Serialisation du dico en json et save dans un fichier
-        with open("user_data.json", "w") as file:
-            json.dump(dico_df_json, file)
+    def run_streaming(self, chunk_size: int, warmup_bars: int = 0):
+        """
+        Description : Exécute le backtest par blocs temporels, pour que la mémoire utilisée par le worker et par le
+        calcul des statistiques ne dépende que de la taille des blocs et non de la longueur de la période.
 
-        result_json = self.create_venv()
-        result = pd.read_json(result_json, orient="index")
+        Paramètres :
+            chunk_size : Nombre de bougies (de l'index commun à tous les tickers) par bloc.
+            warmup_bars : Nombre de bougies précédant chaque bloc transmises à la stratégie en préchauffage.
+        Renvoie : Les statistiques de performance au format JSON.
 
-        stats_backtest = self.backtesting(result, self.data)
-        os.remove(os.path.relpath("user_function.py", start=os.path.curdir))
-        os.remove(os.path.relpath("user_data.json", start=os.path.curdir))
-        return stats_backtest
+        Processus :
+            Parcourt l'index commun par blocs (calendar_blocks, à partir des index du panel projetés en mémoire)
+            sans le construire en entier, et confie au worker l'exécution bloc par bloc (voir
+            Wrapper.fonction_run_chunks), les poids de chaque bloc étant écrits sur disque.
+            Relit ensuite, bloc par bloc, les poids et les bougies du bloc (window), calcule les rendements du
+            bloc (Backtest.chunk_returns), les fait passer par le simulateur de portefeuille s'il y en a un (son
+            état étant transmis d'un bloc au suivant) et met à jour les agrégats Backtest.RunningStats, de taille
+            bornée. Avec un panel sur disque (panel_path), les bougies ne sont jamais toutes en mémoire.
+        """
+        self.write_inputs()
+        try:
+            indexes = self.indexes()
+            chunks = []
+            warmup = np.empty(0, dtype=np.int64)
+            for dates in BacktestHandler.calendar_blocks(list(indexes.values()), chunk_size):
+                window = np.concatenate([warmup, dates])
+                chunks.append({"window_start": int(window[0]), "start": int(dates[0]), "stop": int(dates[-1]),
+                               "n_warmup": len(warmup), "n_rows": len(dates)})
+                # Préchauffage du bloc suivant : les warmup_bars dernières dates
+                warmup = window[max(len(window) - warmup_bars, 0):] if warmup_bars else warmup
 
-    def create_venv(self):
+            with venv_pool.interpreter(self.user_input.requirements) as python_executable:
+                response = worker_pool.run(python_executable, self.data_path, self.function_path,
+                                           output_dir=os.path.join(self.work_dir, "output"),
+                                           cancel_event=self.cancel_event, chunks=chunks)
+            tickers = list(indexes)
+            running_stats = Backtest.RunningStats(simulated=self.simulator is not None,
+                                                  keep_series=bool(self.user_input.rolling_windows))
+            previous = None
+            simulator_state = None
+            with Instrumentation.span("stats"):
+                for position, (chunk, result) in enumerate(zip(chunks, json.loads(response)["results"])):
+                    window = self.window(chunk["start"], chunk["stop"])
+                    rows = pd.DatetimeIndex([], name='Dates')
+                    for df in window.values():
+                        rows = rows.union(df.index)
+                    closes = np.column_stack([window[ticker]['Close'].reindex(rows).to_numpy(dtype=float)
+                                              for ticker in tickers])
+                    returns, previous, keep = Backtest.chunk_returns(closes, previous, **self.alignment())
+                    weights = Backtest.align_weights(DataTransport.read_result(result), tickers, rows)[keep]
+                    if self.simulator is None:
+                        running_stats.update(np.einsum('tn,tn->t', returns, weights), dates=rows[keep])
+                    else:
+                        net, turnover, costs, simulator_state = self.simulator.run(returns, weights, simulator_state)
+                        running_stats.update(net, turnover, costs, dates=rows[keep])
+                    self.publish_partial(running_stats, chunks_done=position + 1, chunks=len(chunks))
+        finally:
+            self.cleanup_inputs()
+        return self.report(running_stats)
+
+    @staticmethod
+    def calendar_blocks(indexes: list, size: int):
+        """
+        Description : Parcourt l'union de plusieurs index triés (tableaux d'entiers, éventuellement projetés en
+        mémoire) par blocs de size dates distinctes, sans construire l'union complète.
+
+        Renvoie : Un générateur de tableaux numpy d'au plus size dates, dans l'ordre croissant ; enchaîner les
+        blocs donne l'union des index.
+
+        Processus :
+            Les size plus petites dates restantes de l'union figurent parmi les size dates suivantes de chaque
+            index : seules celles-ci sont lues, puis la position de chaque index est avancée après le bloc.
+        """
+        positions = [0] * len(indexes)
+        while True:
+            heads = [index[position:position + size] for index, position in zip(indexes, positions)]
+            block = np.unique(np.concatenate(heads + [np.empty(0, dtype=np.int64)]))[:size]
+            if block.size == 0:
+                return
+            positions = [position + int(np.searchsorted(head, block[-1], side='right'))
+                         for position, head in zip(positions, heads)]
+            yield block
+
+    def indexes(self):
+        """
+        Description : Renvoie l'index de chaque ticker (valeurs en nanosecondes UTC) : projeté en mémoire depuis le
+        panel transmis au worker (voir DataTransport.panel_indexes), ou tiré des DataFrames en mémoire pour le
+        transport JSON.
+        """
+        if os.path.basename(self.data_path) == DataTransport.MANIFEST_NAME:
+            return DataTransport.panel_indexes(self.data_path)
+        return {ticker: df.index.as_unit('ns').asi8 for ticker, df in self.data.items()}
+
+    def window(self, start: int, stop: int):
+        """
+        Description : Renvoie les bougies de chaque ticker dont la date (en nanosecondes UTC) est comprise entre
+        start et stop inclus. Seules les lignes de la fenêtre sont lues dans le panel.
+        """
+        if os.path.basename(self.data_path) == DataTransport.MANIFEST_NAME:
+            return DataTransport.read_panel(self.data_path, start=start, stop=stop)
+        window = {}
+        for ticker, df in self.data.items():
+            dates = df.index.as_unit('ns').asi8
+            window[ticker] = df.iloc[np.searchsorted(dates, start):np.searchsorted(dates, stop, side='right')]
+        return window
+
+    @staticmethod
+    def walk_forward_folds(n_bars: int, n_folds: int, train_bars: int = None, test_bars: int = None,
+                           gap_bars: int = 0):
+        """
+        Description : Découpe un calendrier de n_bars bougies en plis de validation walk-forward.
+
+        Paramètres :
+            n_bars : Nombre de bougies du calendrier commun.
+            n_folds : Nombre de plis.
+            train_bars : Nombre de bougies d'entraînement de chaque pli (None : fenêtre croissante depuis le début
+                         de la période).
+            test_bars : Nombre de bougies de test de chaque pli (par défaut n_bars // (n_folds + 1)).
+            gap_bars : Nombre de bougies écartées entre l'entraînement et le test de chaque pli.
+        Renvoie : La liste des plis {train_start, train_end, test_start, test_end} (positions incluses). Les
+        périodes de test sont consécutives et se terminent à la fin du calendrier.
+        """
+        test_bars = test_bars or n_bars // (n_folds + 1)
+        folds = []
+        for position in range(n_folds):
+            test_start = n_bars - (n_folds - position) * test_bars
+            train_end = test_start - gap_bars - 1
+            train_start = 0 if train_bars is None else max(train_end - train_bars + 1, 0)
+            if test_bars < 1 or train_end < train_start:
+                raise ValueError(f"Période trop courte ({n_bars} bougies) pour {n_folds} plis de {test_bars} "
+                                 f"bougies de test précédés d'au moins une bougie d'entraînement")
+            folds.append({"train_start": train_start, "train_end": train_end, "test_start": test_start,
+                          "test_end": test_start + test_bars - 1})
+        return folds
+
+    def run_walk_forward(self, n_folds: int, train_bars: int = None, test_bars: int = None, gap_bars: int = 0):
+        """
+        Description : Valide la stratégie hors échantillon, par plis walk-forward exécutés en parallèle.
+
+        Paramètres : Voir walk_forward_folds.
+        Renvoie : Une chaîne JSON contenant les statistiques de chaque pli (ou l'erreur rencontrée) et les
+        statistiques agrégées sur l'ensemble des périodes de test.
+
+        Processus :
+            Écrit une seule fois les données (panel binaire projeté en mémoire par chaque worker) et la
+            stratégie, et obtient un seul environnement virtuel.
+            Exécute chaque pli dans un worker d'un pool dimensionné sur le nombre de cœurs : la stratégie reçoit
+            les bougies de la période d'entraînement et de la période de test (lues dans le panel partagé, voir
+            Wrapper.fonction_run_chunks) et seuls ses poids sur la période de test sont évalués. Si la
+            stratégie accepte un argument nommé fold, elle reçoit les dates de début et de fin des deux périodes.
+            Calcule les rendements des actifs une seule fois sur toute la période, puis les statistiques de
+            chaque pli et les statistiques agrégées (Backtest.RunningStats, périodes de test enchaînées).
+        """
+        index = pd.DatetimeIndex([], name='Dates')
+        for df in self.data.values():
+            index = index.union(df.index)
+        folds = self.walk_forward_folds(len(index), n_folds, train_bars, test_bars, gap_bars)
+        chunks = []
+        for fold in folds:
+            fold["dates"] = {bound: str(index[fold[bound]])
+                             for bound in ("train_start", "train_end", "test_start", "test_end")}
+            chunks.append({"window_start": int(index[fold["train_start"]].value),
+                           "start": int(index[fold["test_start"]].value), "stop": int(index[fold["test_end"]].value),
+                           "n_warmup": fold["test_start"] - fold["train_start"],
+                           "n_rows": fold["test_end"] - fold["test_start"] + 1, "fold": fold["dates"]})
+
+        outcomes = {}
+        self.write_inputs()
+        try:
+            with venv_pool.interpreter(self.user_input.requirements) as python_executable:
+                with ThreadPoolExecutor(max_workers=worker_pool.parallelism(len(folds))) as executor:
+                    futures = {position: executor.submit(contextvars.copy_context().run, worker_pool.run,
+                                                         python_executable, self.data_path, self.function_path,
+                                                         output_dir=os.path.join(self.work_dir, f"fold_{position}"),
+                                                         cancel_event=self.cancel_event, chunks=[chunk])
+                               for position, chunk in enumerate(chunks)}
+                    for position, future in futures.items():
+                        try:
+                            result = json.loads(future.result())["results"][0]
+                            outcomes[position] = DataTransport.read_result(result)
+                        except Exception as e:
+                            outcomes[position] = e
+                        Instrumentation.emit("fold_done", fold=position, folds=len(folds),
+                                             ok=not isinstance(outcomes[position], Exception))
+            if self.cancel_event is not None and self.cancel_event.is_set():
+                raise JobCancelled("La validation walk-forward a été annulée")
+        finally:
+            self.cleanup_inputs()
+
+        with Instrumentation.span("stats"):
+            calendar, tickers, returns = Backtest.returns_panel(self.data, **self.alignment())
+            keep_series = bool(self.user_input.rolling_windows)
+            aggregate = Backtest.RunningStats(simulated=self.simulator is not None, keep_series=keep_series)
+            rows = []
+            for position, fold in enumerate(folds):
+                row = {"fold": position, "train": [fold["dates"]["train_start"], fold["dates"]["train_end"]],
+                       "test": [fold["dates"]["test_start"], fold["dates"]["test_end"]]}
+                if isinstance(outcomes[position], Exception):
+                    row["error"] = str(outcomes[position])
+                    rows.append(row)
+                    continue
+                test = (calendar >= index[fold["test_start"]]) & (calendar <= index[fold["test_end"]])
+                weights = Backtest.align_weights(outcomes[position], tickers, calendar[test])
+                fold_stats = Backtest.RunningStats(simulated=self.simulator is not None, keep_series=keep_series)
+                if self.simulator is None:
+                    updates = (np.einsum('tn,tn->t', returns[test], weights),)
+                else:
+                    # Chaque pli part d'un portefeuille vide
+                    updates = self.simulator.run(returns[test], weights)[:3]
+                for running_stats in (fold_stats, aggregate):
+                    running_stats.update(*updates, dates=calendar[test])
+                if fold_stats.n:
+                    row["stats"] = self.summary(fold_stats)
+                else:
+                    row["error"] = "Aucun rendement défini sur la période de test"
+                rows.append(row)
+                self.publish_partial(aggregate, folds_done=position + 1, folds=len(folds))
+            result = {"folds": rows, "aggregate": self.summary(aggregate) if aggregate.n else None}
+        return json.dumps(result, indent=4)
+
+    def run_strategy(self):
+        """
+        Description : Exécute la stratégie de l'utilisateur sur self.data dans un worker et renvoie ses poids.
+
+        Renvoie : Le DataFrame des poids renvoyé par func_strat.
+        """
+        self.write_inputs()
+        try:
+            result_json = self.create_venv()
+            return DataTransport.read_result(result_json)
+        finally:
+            self.cleanup_inputs()
+
+    @staticmethod
+    def recurring_signature(user_input):
         """
-        Description : Crée un environnement virtuel Python, installe les packages requis par
-        la stratégie de trading de l'utilisateur, et exécute la stratégie dans cet environnement.
+        Description : Identifie la configuration d'un backtest récurrent (stratégie, packages, tickers, intervalle,
+        date de début, fenêtre de préchauffage, politiques d'alignement, simulateur de portefeuille). L'état
+        incrémental d'une requête n'est réutilisé que si cette signature n'a pas changé.
+        """
+        signature = {
+            "strategy": strategy_fingerprint(user_input.func_strat),
+            "requirements": VenvPool.normalize_requirements(user_input.requirements),
+            "tickers": list(user_input.tickers),
+            "interval": user_input.interval,
+            "start": user_input.dates[0],
+            "warmup_bars": user_input.warmup_bars,
+            "fill_policy": user_input.fill_policy,
+            "missing_policy": user_input.missing_policy,
+            "simulator": PortfolioSimulator(user_input.fee_bps, user_input.slippage_bps, user_input.drift,
+                                            user_input.rebalance_every).config(),
+        }
+        return hashlib.sha256(json.dumps(signature, sort_keys=True).encode()).hexdigest()
+
+    @staticmethod
+    def incremental_dates(user_input, state):
+        """
+        Description : Calcule la plage de dates à charger pour une exécution d'un backtest récurrent.
 
-        Renvoie : La sortie standard du sous-processus exécutant le code de la stratégie.
+        Renvoie : Les dates de la requête si aucun état réutilisable n'existe ; sinon une plage ne couvrant que
+        les warmup_bars dernières bougies déjà traitées et les nouvelles bougies.
+        """
+        if state is None or state["signature"] != BacktestHandler.recurring_signature(user_input):
+            return user_input.dates
+        interval_ms = INTERVAL_MS[user_input.interval]
+        last_date = pd.Timestamp(state["last_date"])
+        window_start = last_date - pd.Timedelta(milliseconds=interval_ms * (user_input.warmup_bars + 1))
+        start = max(window_start.strftime('%Y-%m-%d'), user_input.dates[0])
+        return [start, user_input.dates[1]]
+
+    def run_incremental(self, state=None, previous_series=None):
+        """
+        Description : Exécute un backtest récurrent en ne traitant que les bougies apparues depuis l'exécution
+        précédente.
+
+        Paramètres :
+            state : État conservé à l'issue de l'exécution précédente (None pour la première exécution).
+            previous_series : Séries de suivi du résultat précédent (clé Series), dont les rendements sont
+                              prolongés si la requête demande des fenêtres glissantes (optionnel).
+        Renvoie : Un couple (statistiques en JSON, nouvel état).
 
         Processus :
-            Utilise Python pour créer un nouvel environnement virtuel.
-            Installe les packages requis dans l'environnement virtuel.
-            Prépare et exécute la stratégie de trading de l'utilisateur dans l'environnement virtuel.
+            Ne conserve que les bougies closes, la bougie en cours étant traitée à l'exécution suivante.
+            Sans état réutilisable, exécute la stratégie sur tout l'historique et initialise les agrégats
+            (Backtest.RunningStats) avec les rendements de l'indice.
+            Sinon, exécute la stratégie sur les données chargées (fenêtre de préchauffage + nouvelles bougies),
+            ne retient que les poids des nouvelles bougies, et met à jour les agrégats avec les nouveaux
+            rendements de l'indice. Le coût d'une exécution ne dépend donc pas de la longueur de l'historique.
+            Les poids d'une bougie ne doivent dépendre que des warmup_bars bougies précédentes.
+            L'état ne contient que des agrégats de taille bornée : la série des rendements nécessaire aux séries de
+            suivi est relue dans le résultat précédent (previous_series) ; s'il n'est plus disponible, les séries
+            reprennent aux nouvelles bougies.
         """
-        # Création de l'environnement virtuel
-        BacktestHandler.run_subprocess(sys.executable, "-m", "venv", self.user_input.request_id)
+        keep_series = bool(self.user_input.rolling_windows)
+        interval_ms = INTERVAL_MS[self.user_input.interval]
+        cutoff = pd.Timestamp(time.time() * 1000 - interval_ms, unit='ms')
+        self.data = {ticker: df[df.index <= cutoff] for ticker, df in self.data.items()}
+        index = pd.DatetimeIndex([], name='Dates')
+        for df in self.data.values():
+            index = index.union(df.index)
+
+        signature = self.recurring_signature(self.user_input)
+        reusable = state is not None and state["signature"] == signature
+        if reusable:
+            last_date = pd.Timestamp(state["last_date"])
+            n_processed = int((index <= last_date).sum())
+            # Sans bougie déjà traitée dans la fenêtre, le premier nouveau rendement ne peut pas être calculé
+            reusable = n_processed > 0
 
-        # Création du chemin vers le pip executable pour l'env virtuel
-        pip_route = os.path.join(self.user_input.request_id, "Scripts" if os.name == "nt" else "bin", "pip")
+        if not reusable:
+            weights = self.run_strategy()
+            stats = Backtest.Stats(weights, self.data, simulator=self.simulator, **self.alignment())
+            running_stats = Backtest.RunningStats(stats.rf_rate, stats.scale, simulated=self.simulator is not None,
+                                                  keep_series=keep_series)
+            if self.simulator is None:
+                running_stats.update(stats.r_indice['Index_Return'].to_numpy(), dates=stats.r_indice.index)
+            else:
+                running_stats.update(stats.r_indice['Index_Return'].to_numpy(), stats.turnover_ts, stats.costs_ts,
+                                     dates=stats.r_indice.index)
+                simulator_state = stats.simulator_state
+        else:
+            returns = dates = None
+            if keep_series:
+                returns, dates = self.series_returns(previous_series)
+            running_stats = Backtest.RunningStats.from_state(state["running_stats"], returns, dates)
+            if n_processed == len(index):
+                return self.report(running_stats), state
+            weights = self.run_strategy()
+            calendar, tickers, returns = Backtest.returns_panel(self.data, **self.alignment())
+            weights = Backtest.align_weights(weights, tickers, calendar)
+            new = calendar > last_date
+            if self.simulator is None:
+                running_stats.update(np.einsum('tn,tn->t', returns[new], weights[new]), dates=calendar[new])
+            else:
+                net, turnover, costs, simulator_state = self.simulator.run(returns[new], weights[new],
+                                                                           state["simulator"])
+                running_stats.update(net, turnover, costs, dates=calendar[new])
 
-        # Installation des packages
-        for package in self.user_input.requirements:
-            BacktestHandler.run_subprocess(pip_route, "install", package)
+        new_state = {"signature": signature, "last_date": str(index[-1]),
+                     "running_stats": running_stats.get_state()}
+        if self.simulator is not None:
+            # Positions détenues et derniers poids cibles, pour reprendre la simulation à l'exécution suivante
+            new_state["simulator"] = PortfolioSimulator.state_to_json(simulator_state)
+        return self.report(running_stats), new_state
+
+    @staticmethod
+    def series_returns(series):
+        """
+        Description : Relit les rendements et les dates (en nanosecondes) des séries de suivi d'un résultat
+        (clé Series, voir Rolling.series_to_dict).
+
+        Renvoie : Un couple (rendements, dates), deux listes vides si les séries ne sont pas disponibles.
+        """
+        if not series or not series.get("returns"):
+            return [], []
+        returns = [np.nan if value is None else float(value) for value in series["returns"]]
+        index = series.get("index") or []
+        if len(index) != len(returns) or not isinstance(index[0], str):
+            return returns, []
+        return returns, pd.DatetimeIndex(pd.to_datetime(index)).as_unit('ns').asi8.tolist()
 
-        python_executable = os.path.join(self.user_input.request_id, "Scripts" if os.name == "nt" else "bin", "python")
-        function_path = os.path.relpath("user_function.py", start=os.path.curdir)
-        wrapper_path = os.path.relpath("script_wrapper.py", start=os.path.curdir)
-        data_path = os.path.relpath("user_data.json", start=os.path.curdir)
-        response = BacktestHandler.run_subprocess(python_executable, wrapper_path, data_path, function_path, text=True)
+    def work_root(self):
+        """
+        Description : Choisit le répertoire où créer le répertoire de travail de la requête (voir
+        PanelRegistry.shared_memory_root) : les résultats écrits par le worker y sont relus sans accès disque.
+        Avec un panel sur disque, les poids des blocs sont eux aussi écrits sur disque (PanelRegistry.disk_root).
+        """
+        if self.disk_panel is not None:
+            return disk_root()
+        return shared_memory_root(self.data)
+
+    def write_inputs(self):
+        """
+        Description : Crée le répertoire de travail de la requête et y écrit la stratégie de l'utilisateur et les
+        données financières.
+
+        Processus :
+            Utilise un répertoire propre à la requête, pour que plusieurs backtests puissent tourner simultanément,
+            en mémoire partagée lorsque c'est possible (voir work_root).
+            Obtient les données au format binaire (un .npy par colonne + manifeste) auprès de PanelRegistry : les
+            requêtes simultanées portant sur les mêmes données partagent un seul panel en lecture seule. Si une
+            colonne n'est pas numérique, écrit en repli les données en JSON dans le répertoire de la requête.
+            Un panel déjà écrit sur disque (panel_path) est transmis tel quel au worker.
+            Les entrées sont libérées par cleanup_inputs.
+        """
+        self.panel_path = None
+        with Instrumentation.span("serialize"):
+            self.work_dir = tempfile.mkdtemp(prefix=f"{self.user_input.request_id}_", dir=self.work_root())
+            self.function_path = os.path.join(self.work_dir, "user_function.py")
+            # Une comparaison de stratégies n'a pas de stratégie principale (voir run_compare)
+            if self.user_input.func_strat is not None:
+                with open(self.function_path, "w") as file:
+                    file.write(self.user_input.func_strat)
+
+            if self.disk_panel is not None:
+                # Panel déjà écrit sur disque (exécution par blocs) : transmis tel quel au worker
+                self.data_path = self.disk_panel
+            elif all(DataTransport.can_write_frame(df) for df in self.data.values()):
+                self.panel_path = self.data_path = panel_registry.acquire(self.data)
+            else:
+                # Conversion de chaque df en json
+                dico_df_json = {key: df.to_json() for key, df in self.data.items()}
+
+                # Serialisation du dico en json et save dans un fichier
+                self.data_path = os.path.join(self.work_dir, "user_data.json")
+                with open(self.data_path, "w") as file:
+                    json.dump(dico_df_json, file)
+        Instrumentation.count("bytes", sum(os.path.getsize(os.path.join(directory, name))
+                                           for directory, _, names in os.walk(self.work_dir) for name in names),
+                              kind="inputs")
+
+    def cleanup_inputs(self):
+        """
+        Description : Supprime le répertoire de travail de la requête et libère son panel de données.
+        """
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+        if getattr(self, "panel_path", None) is not None:
+            panel_registry.release(self.panel_path)
+            self.panel_path = None
+
+    def run_sweep(self, param_grid: dict):
+        """
+        Description : Évalue la même stratégie pour toutes les combinaisons d'une grille de paramètres, en ne
+        chargeant les données et en ne préparant l'environnement qu'une seule fois.
+
+        Paramètres :
+            param_grid : Dictionnaire {nom du paramètre: liste de valeurs}. Chaque combinaison est passée à
+                         func_strat sous forme d'arguments nommés.
+        Renvoie : Une chaîne JSON contenant, pour chaque variante, ses paramètres et ses statistiques (ou l'erreur
+        rencontrée).
+
+        Processus :
+            Écrit une seule fois les données et la stratégie, et obtient un seul environnement virtuel.
+            Répartit les variantes sur les workers du pool partagé worker_pool, au plus
+            worker_pool.parallelism(nombre de variantes) à la fois (voir run_parallel).
+            Calcule les statistiques de toutes les variantes en une passe avec Backtest.Stats.batch.
+        """
+        names = list(param_grid.keys())
+        variants = [dict(zip(names, values)) for values in itertools.product(*param_grid.values())]
+        self.write_inputs()
+        try:
+            outcomes = self.run_parallel([(self.function_path, params) for params in variants])
+            if self.cancel_event is not None and self.cancel_event.is_set():
+                raise JobCancelled("Le balayage de paramètres a été annulé")
+        finally:
+            self.cleanup_inputs()
+
+        weights = {position: result for position, result in outcomes.items() if isinstance(result, pd.DataFrame)}
+        with Instrumentation.span("stats"):
+            table = (Backtest.Stats.batch(weights, self.data, simulator=self.simulator, **self.alignment())
+                     if weights else pd.DataFrame())
+        rows = []
+        for position, params in enumerate(variants):
+            if position in weights:
+                rows.append({"params": params, "stats": table.loc[position].to_dict()})
+            else:
+                rows.append({"params": params, "error": str(outcomes[position])})
+        return json.dumps(rows, indent=4)
+
+    def run_parallel(self, tasks):
+        """
+        Description : Exécute plusieurs stratégies (ou variantes d'une stratégie) sur les données déjà écrites par
+        write_inputs, en parallèle dans les workers du pool partagé (au plus worker_pool.parallelism tâches à la
+        fois).
+
+        Paramètres :
+            tasks : Liste de couples (chemin du script de la stratégie, arguments nommés passés à func_strat).
+        Renvoie : Un dictionnaire {position de la tâche: poids renvoyés, ou exception rencontrée}.
+        """
+        outcomes = {}
+        with venv_pool.interpreter(self.user_input.requirements) as python_executable:
+            with ThreadPoolExecutor(max_workers=worker_pool.parallelism(len(tasks))) as executor:
+                # Chaque tâche est exécutée dans une copie du contexte, pour être mesurée dans la trace du job
+                futures = {position: executor.submit(contextvars.copy_context().run, worker_pool.run,
+                                                     python_executable, self.data_path, function_path,
+                                                     output_dir=os.path.join(self.work_dir, f"output_{position}"),
+                                                     params=params, cancel_event=self.cancel_event)
+                           for position, (function_path, params) in enumerate(tasks)}
+                for position, future in futures.items():
+                    try:
+                        outcomes[position] = DataTransport.read_result(future.result())
+                    except Exception as e:
+                        outcomes[position] = e
+        return outcomes
+
+    def run_compare(self, strategies: dict, allocation: dict = None):
+        """
+        Description : Compare plusieurs stratégies sur un même univers, en ne chargeant et n'alignant les données
+        qu'une seule fois.
+
+        Paramètres :
+            strategies : Dictionnaire {nom de la stratégie: code source} ; chaque source définit func_strat.
+            allocation : Parts du capital de chaque stratégie dans le portefeuille de stratégies (par défaut, parts
+                         égales), positives ou nulles et de somme strictement positive (voir CompareInput).
+        Renvoie : Une chaîne JSON contenant les statistiques de chaque stratégie (ou l'erreur rencontrée), la
+        matrice de corrélation de leurs rendements et les statistiques du portefeuille de stratégies.
+
+        Processus :
+            Écrit une seule fois les données (panel binaire partagé par les workers) et le script de chaque
+            stratégie, obtient un seul environnement virtuel et exécute les stratégies en parallèle
+            (run_parallel).
+            Calcule les statistiques, les corrélations et le portefeuille en une passe avec
+            Backtest.Stats.compare, sur les stratégies ayant abouti. Les parts des stratégies en échec sont
+            redistribuées entre les autres au prorata de leurs parts (la somme des parts demandées est
+            conservée) ; l'allocation demandée et l'allocation utilisée figurent dans le résultat.
+        """
+        names = list(strategies)
+        self.write_inputs()
+        try:
+            tasks = []
+            for position, name in enumerate(names):
+                function_path = os.path.join(self.work_dir, f"strategy_{position}.py")
+                with open(function_path, "w") as file:
+                    file.write(strategies[name])
+                tasks.append((function_path, None))
+            outcomes = self.run_parallel(tasks)
+            if self.cancel_event is not None and self.cancel_event.is_set():
+                raise JobCancelled("La comparaison de stratégies a été annulée")
+        finally:
+            self.cleanup_inputs()
+
+        weights = {names[position]: result for position, result in outcomes.items()
+                   if isinstance(result, pd.DataFrame)}
+        requested = dict(allocation) if allocation is not None else {name: 1 / len(names) for name in names}
+        allocation = None
+        kept = sum(share for name, share in requested.items() if name in weights)
+        if kept > 0:
+            scale = sum(requested.values()) / kept
+            allocation = {name: share * scale for name, share in requested.items() if name in weights}
+        result = {"strategies": [], "correlation": None, "portfolio": None}
+        if weights:
+            with Instrumentation.span("stats"):
+                table, correlation, portfolio = Backtest.Stats.compare(weights, self.data, allocation,
+                                                                       simulator=self.simulator,
+                                                                       **self.alignment())
+            result["correlation"] = {"names": list(weights),
+                                     "matrix": correlation.astype(object).where(correlation.notna(), None)
+                                     .values.tolist()}
+            if allocation is None:
+                result["portfolio"] = {"requested_allocation": requested,
+                                       "error": "Aucune des stratégies de l'allocation n'a abouti"}
+            else:
+                result["portfolio"] = {"allocation": allocation, "requested_allocation": requested,
+                                       "stats": portfolio}
+        for position, name in enumerate(names):
+            if name in weights:
+                result["strategies"].append({"name": name, "stats": table.loc[name].to_dict()})
+            else:
+                result["strategies"].append({"name": name, "error": str(outcomes[position])})
+        return json.dumps(result, indent=4)
+
+    def create_venv(self):
+        """
+        Description : Obtient un environnement virtuel Python contenant les packages requis par la stratégie de
+        trading de l'utilisateur auprès du pool d'environnements, et exécute la stratégie dans un worker de
+        cet environnement.
+
+        Renvoie : La sortie du worker exécutant le code de la stratégie.
+
+        Processus :
+            Récupère auprès de VenvPool un environnement déjà construit pour le même ensemble de packages,
+            ou le construit une seule fois s'il n'existe pas encore. Une stratégie n'utilisant que des packages
+            installés avec le serveur s'exécute directement avec son interpréteur, dans un worker isolé.
+            Confie l'exécution de la stratégie à un worker de longue durée de WorkerPool, qui a déjà
+            importé pandas et numpy.
+        """
+        with venv_pool.interpreter(self.user_input.requirements) as python_executable:
+            output_dir = os.path.join(self.work_dir, "output")
+            response = worker_pool.run(python_executable, self.data_path, self.function_path, output_dir=output_dir,
+                                       cancel_event=self.cancel_event)
         return response
 
     def backtesting(self, weights, dico_df):
@@ -109,6 +727,7 @@ class BacktestHandler:
             dico_df : Dictionnaire des DataFrames contenant les données financières utilisées pour le backtesting.
         Renvoie : Les statistiques de performance du backtesting sous forme de données structurées.
         """
-        backtest = Backtest.Stats(weights, dico_df)
-        stats_bt = backtest.to_json()
+        with Instrumentation.span("stats"):
+            backtest = Backtest.Stats(weights, dico_df, simulator=self.simulator, **self.alignment())
+            stats_bt = self.report(backtest)
         return stats_bt
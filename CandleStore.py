@@ -0,0 +1,170 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# Durée approximative de chaque intervalle Binance en millisecondes
+INTERVAL_MS = {
+    "1m": 60_000, "3m": 180_000, "5m": 300_000, "15m": 900_000, "30m": 1_800_000,
+    "1h": 3_600_000, "2h": 7_200_000, "4h": 14_400_000, "6h": 21_600_000, "8h": 28_800_000,
+    "12h": 43_200_000, "1d": 86_400_000, "3d": 259_200_000, "1w": 604_800_000, "1M": 2_678_400_000,
+}
+
+# Nombre de bougies lues par requête SQL lors d'une lecture par lots (voir CandleStore.load_batches)
+LOAD_BATCH_SIZE = int(os.environ.get("CANDLE_STORE_BATCH_SIZE", 50_000))
+
+KLINE_COLUMNS = ['Open_time', 'Open', 'High', 'Low', 'Close', 'Volume', 'Close_time',
+                 'Quote_volume', 'Nb_trades', 'ignore1', 'ignore2', 'ignore3']
+
+
+class CandleStore:
+    """
+    La classe CandleStore conserve sur disque (SQLite) les bougies déjà téléchargées, partitionnées par couple
+    (symbole, intervalle), ainsi que les plages de temps déjà couvertes. Elle permet au DataCollector de ne
+    télécharger que les sous-plages manquantes d'une requête.
+    """
+    def __init__(self, db_path: str = "candles.sqlite"):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._initialized = False
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        if not self._initialized:
+            with self._lock:
+                connection.executescript("""
+                    CREATE TABLE IF NOT EXISTS candles (
+                        symbol TEXT NOT NULL, interval TEXT NOT NULL, open_time INTEGER NOT NULL,
+                        open REAL, high REAL, low REAL, close REAL, volume REAL, close_time INTEGER,
+                        quote_volume REAL, nb_trades INTEGER, taker_base REAL, taker_quote REAL, ignore TEXT,
+                        PRIMARY KEY (symbol, interval, open_time)
+                    ) WITHOUT ROWID;
+                    CREATE TABLE IF NOT EXISTS coverage (
+                        symbol TEXT NOT NULL, interval TEXT NOT NULL, start_ms INTEGER NOT NULL, end_ms INTEGER NOT NULL
+                    );
+                    CREATE INDEX IF NOT EXISTS coverage_key ON coverage (symbol, interval);
+                """)
+                self._initialized = True
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def missing_ranges(self, symbol: str, interval: str, start_ms: int, end_ms: int):
+        """
+        Description : Calcule les sous-plages de [start_ms, end_ms] qui ne sont pas encore présentes dans le store.
+
+        Renvoie : Une liste de couples (début, fin) en millisecondes, bornes incluses.
+        """
+        with self._connect() as connection:
+            covered = connection.execute(
+                "SELECT start_ms, end_ms FROM coverage WHERE symbol = ? AND interval = ? "
+                "AND end_ms >= ? AND start_ms <= ? ORDER BY start_ms",
+                (symbol, interval, start_ms, end_ms)).fetchall()
+        missing = []
+        cursor = start_ms
+        for covered_start, covered_end in covered:
+            if covered_start > cursor:
+                missing.append((cursor, covered_start - 1))
+            cursor = max(cursor, covered_end + 1)
+        if cursor <= end_ms:
+            missing.append((cursor, end_ms))
+        return missing
+
+    def insert(self, symbol: str, interval: str, rows, start_ms: int, end_ms: int):
+        """
+        Description : Enregistre les bougies téléchargées pour une plage et marque cette plage comme couverte.
+
+        Paramètres :
+            rows : Bougies au format renvoyé par l'API Binance (listes de 12 éléments).
+            start_ms, end_ms : Bornes de la plage demandée à l'API.
+
+        Processus :
+            La plage couverte est celle des bougies effectivement renvoyées (de la première ouverture à la
+            dernière clôture) : une page tronquée par l'API ne marque pas la fin de la plage comme couverte.
+            Une réponse vide couvre toute la plage demandée (aucune bougie n'existe sur cette plage) : une fin de
+            plage sans bougie est demandée de nouveau une fois, puis couverte.
+            La plage n'est marquée comme couverte que jusqu'à la dernière bougie close : la bougie en cours
+            sera téléchargée de nouveau lors d'une prochaine requête.
+            Les plages couvertes qui se chevauchent ou se touchent sont fusionnées.
+        """
+        now_ms = int(time.time() * 1000)
+        covered_end = min(end_ms, now_ms - INTERVAL_MS.get(interval, 0))
+        if rows:
+            start_ms = max(start_ms, min(row[0] for row in rows))
+            covered_end = min(covered_end, max(row[6] for row in rows))
+        with self._lock, self._connect() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO candles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(symbol, interval, *row[:12]) for row in rows])
+            if covered_end < start_ms:
+                return
+            overlapping = connection.execute(
+                "SELECT rowid, start_ms, end_ms FROM coverage WHERE symbol = ? AND interval = ? "
+                "AND end_ms >= ? AND start_ms <= ?",
+                (symbol, interval, start_ms - 1, covered_end + 1)).fetchall()
+            merged_start = min([start_ms] + [row[1] for row in overlapping])
+            merged_end = max([covered_end] + [row[2] for row in overlapping])
+            connection.executemany("DELETE FROM coverage WHERE rowid = ?", [(row[0],) for row in overlapping])
+            connection.execute("INSERT INTO coverage VALUES (?, ?, ?, ?)",
+                               (symbol, interval, merged_start, merged_end))
+
+    def load(self, symbol: str, interval: str, start_ms: int, end_ms: int):
+        """
+        Description : Lit les bougies stockées pour un symbole et un intervalle sur une plage donnée.
+
+        Renvoie : Une liste de bougies au format de l'API Binance, triées par date d'ouverture.
+        """
+        with self._connect() as connection:
+            return connection.execute(
+                "SELECT open_time, open, high, low, close, volume, close_time, quote_volume, nb_trades, "
+                "taker_base, taker_quote, ignore FROM candles WHERE symbol = ? AND interval = ? "
+                "AND open_time BETWEEN ? AND ? ORDER BY open_time",
+                (symbol, interval, start_ms, end_ms)).fetchall()
+
+    def extent(self, symbol: str, interval: str, start_ms: int, end_ms: int):
+        """
+        Description : Compte les bougies stockées pour un symbole et un intervalle sur une plage donnée.
+
+        Renvoie : Un couple (nombre de bougies, date d'ouverture de la dernière bougie ou None). Les bougies
+        n'étant jamais supprimées, load_batches jusqu'à cette date renvoie exactement ce nombre de bougies, même
+        si d'autres requêtes en ajoutent entre-temps.
+        """
+        with self._connect() as connection:
+            return connection.execute(
+                "SELECT COUNT(*), MAX(open_time) FROM candles WHERE symbol = ? AND interval = ? "
+                "AND open_time BETWEEN ? AND ?",
+                (symbol, interval, start_ms, end_ms)).fetchone()
+
+    def load_batches(self, symbol: str, interval: str, start_ms: int, end_ms: int,
+                     batch_size: int = LOAD_BATCH_SIZE):
+        """
+        Description : Lit les bougies stockées comme load, par lots d'au plus batch_size bougies, pour qu'elles ne
+        soient jamais toutes en mémoire.
+
+        Renvoie : Un générateur de listes de bougies au format de l'API Binance, triées par date d'ouverture.
+
+        Processus :
+            Chaque lot est lu par une requête distincte reprenant après la dernière bougie du lot précédent :
+            aucune transaction n'est maintenue ouverte pendant le traitement des lots.
+        """
+        cursor = start_ms
+        while cursor <= end_ms:
+            with self._connect() as connection:
+                rows = connection.execute(
+                    "SELECT open_time, open, high, low, close, volume, close_time, quote_volume, nb_trades, "
+                    "taker_base, taker_quote, ignore FROM candles WHERE symbol = ? AND interval = ? "
+                    "AND open_time BETWEEN ? AND ? ORDER BY open_time LIMIT ?",
+                    (symbol, interval, cursor, end_ms, batch_size)).fetchall()
+            if not rows:
+                return
+            yield rows
+            if len(rows) < batch_size:
+                return
+            cursor = rows[-1][0] + 1
+
+
+candle_store = CandleStore(os.environ.get("CANDLE_STORE_PATH", "candles.sqlite"))
@@ -0,0 +1,69 @@
+import os
+import threading
+
+# Fichier d'identifiants du compte de service livré avec l'API
+DEFAULT_CREDENTIALS_FILE = "boreal-forest-416815-c57cb5c11bdc.json"
+
+
+class CloudClients:
+    """
+    La classe CloudClients fournit les clients Google Cloud (Cloud Storage, Cloud Scheduler) partagés par tout le
+    serveur. Les bibliothèques google-cloud ne sont importées, et chaque client n'est créé, qu'au premier accès :
+    le démarrage du serveur ne dépend ni de ces imports ni du réseau. Un client créé est ensuite réutilisé par
+    toutes les requêtes (ses connexions HTTP et ses jetons d'accès sont ainsi conservés).
+    """
+    def __init__(self, credentials_file: str = None):
+        self.credentials_file = credentials_file
+        self._credentials = None
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def credentials(self):
+        """
+        Description : Charge une seule fois les identifiants du compte de service.
+
+        Renvoie : Les identifiants lus dans credentials_file, ou None si ce fichier n'existe pas (les clients
+        utilisent alors les identifiants par défaut de l'environnement).
+        """
+        with self._lock:
+            if self._credentials is None and self.credentials_file and os.path.isfile(self.credentials_file):
+                from google.oauth2 import service_account
+                self._credentials = service_account.Credentials.from_service_account_file(self.credentials_file)
+            return self._credentials
+
+    def _client(self, name, factory):
+        client = self._clients.get(name)
+        if client is not None:
+            return client
+        credentials = self.credentials()
+        with self._lock:
+            if name not in self._clients:
+                self._clients[name] = factory(credentials)
+            return self._clients[name]
+
+    def storage(self):
+        """
+        Description : Renvoie le client Cloud Storage partagé.
+        """
+        def factory(credentials):
+            from google.cloud import storage
+            project = getattr(credentials, "project_id", None)
+            return storage.Client(project=project, credentials=credentials)
+        return self._client("storage", factory)
+
+    def scheduler(self):
+        """
+        Description : Renvoie le client Cloud Scheduler partagé.
+        """
+        def factory(credentials):
+            from google.cloud import scheduler
+            return scheduler.CloudSchedulerClient(credentials=credentials)
+        return self._client("scheduler", factory)
+
+    def reset(self):
+        with self._lock:
+            self._credentials = None
+            self._clients.clear()
+
+
+cloud_clients = CloudClients(os.environ.get("GOOGLE_APPLICATION_CREDENTIALS", DEFAULT_CREDENTIALS_FILE))
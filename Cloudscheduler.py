@@ -1,20 +1,15 @@
 
 from datetime import datetime, timedelta
-from google.cloud import scheduler
-from google.oauth2 import service_account
-from google.cloud import storage
-from google.api_core.exceptions import GoogleAPICallError, AlreadyExists
-import os
+from CloudClients import cloud_clients
 import json
 
-os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = os.path.relpath("boreal-forest-416815-c57cb5c11bdc.json", start=os.path.curdir)
-
 class CloudScheduler:
     """
     La classe CloudScheduler permet de planifier et de gérer l'exécution automatisée
     de requêtes utilisateur dans le Cloud. Elle utilise Google Cloud Scheduler pour
     configurer des tâches planifiées qui déclenchent des fonctions Cloud, permettant
     ainsi l'exécution récurrente des requêtes de backtesting de stratégies de trading à des intervalles prédéfinis.
+    Les clients Google Cloud sont ceux, partagés et créés au premier accès, de CloudClients.
     """
     def __init__(self,
                  user_input):
@@ -37,6 +32,20 @@ class CloudScheduler:
         else:
             raise ValueError("La fréquence spécifiée n'est pas supportée en format cron")
 
+    def scheduled_request(self):
+        """
+        Description : Prépare la requête à réexécuter : la date de fin est avancée de repeat_frequency jours.
+
+        Renvoie : Un dictionnaire des données de la requête utilisateur.
+        """
+        user_input_dict = self.user_input.dict()
+        dates = user_input_dict.get("dates")
+        date_fin = datetime.strptime(dates[1], "%Y-%m-%d")
+        date_fin = date_fin + timedelta(days=self.user_input.repeat_frequency)
+        dates[1] = date_fin.strftime("%Y-%m-%d")
+        user_input_dict["dates"] = dates
+        return user_input_dict
+
     def save_request_to_storage(self, bucket_name="backtestapi_bucket"):
         """
         Description : Sauvegarde la requête de l'utilisateur dans un fichier JSON sur Google Cloud Storage pour
@@ -52,17 +61,11 @@ class CloudScheduler:
         """
         try:
             # Transforme les données d'entrée en JSON
-            user_input_dict = self.user_input.dict()
-            dates = user_input_dict.get("dates")
-            date_fin = datetime.strptime(dates[1], "%Y-%m-%d")
-            date_fin = date_fin + timedelta(days=self.user_input.repeat_frequency)
-            dates[1] = date_fin.strftime("%Y-%m-%d")
-            user_input_dict["dates"] = dates
+            user_input_dict = self.scheduled_request()
             data_to_save = json.dumps(user_input_dict).encode("utf-8")
 
-            # Crée une instance du client de stockage
-            storage_client = storage.Client()
-            bucket = storage_client.bucket(bucket_name)
+            # Client de stockage partagé
+            bucket = cloud_clients.storage().bucket(bucket_name)
 
             # Crée un nouvel objet blob dans le bucket
             file_name = self.user_input.request_id
@@ -89,8 +92,8 @@ class CloudScheduler:
             .
             Utilise le client Cloud Scheduler pour soumettre la requête de création de tâche.
         """
-        credentials_path = os.path.relpath("boreal-forest-416815-c57cb5c11bdc.json", start=os.path.curdir)
-        credentials = service_account.Credentials.from_service_account_file(credentials_path)
+        from google.cloud import scheduler
+        from google.api_core.exceptions import GoogleAPICallError, AlreadyExists
 
         project = 'boreal-forest-416815'
         location = 'europe-west1'
@@ -98,7 +101,7 @@ class CloudScheduler:
         job_name = f'{self.user_input.request_id}'
         frequency = self.frequency_to_cron()
 
-        client = scheduler.CloudSchedulerClient(credentials=credentials)
+        client = cloud_clients.scheduler()
         function_url = "https://europe-west9-boreal-forest-416815.cloudfunctions.net/trigger_api"
 
         body = json.dumps({"bucket_name": bucket_name, "file_name": self.user_input.request_id}).encode('utf-8')
@@ -0,0 +1,250 @@
+import io
+import json
+import os
+import numpy as np
+import pandas as pd
+
+MANIFEST_NAME = "manifest.json"
+
+
+def _numeric_columns(df: pd.DataFrame):
+    """
+    Description : Convertit les colonnes d'un DataFrame en tableaux numériques contigus.
+
+    Renvoie : Une liste de couples (nom de colonne, tableau numpy), ou None si une colonne ne peut pas être
+    représentée sous forme binaire (texte, objets, noms de colonnes non textuels).
+    """
+    columns = []
+    for name in df.columns:
+        if not isinstance(name, str):
+            return None
+        values = df[name]
+        if not pd.api.types.is_numeric_dtype(values):
+            try:
+                values = pd.to_numeric(values)
+            except (ValueError, TypeError):
+                return None
+            if not pd.api.types.is_numeric_dtype(values):
+                return None
+        array = values.to_numpy()
+        if array.dtype == object:
+            # Types pandas nullables contenant des valeurs manquantes
+            return None
+        columns.append((name, np.ascontiguousarray(array)))
+    return columns
+
+
+def can_write_frame(df) -> bool:
+    """
+    Description : Indique si un DataFrame peut être transmis au format binaire. Dans le cas contraire,
+    l'appelant doit utiliser le transport JSON.
+    """
+    if not isinstance(df, pd.DataFrame) or df.columns.has_duplicates:
+        return False
+    index = df.index
+    if not (isinstance(index, pd.DatetimeIndex) or pd.api.types.is_numeric_dtype(index)):
+        return False
+    return _numeric_columns(df) is not None
+
+
+def write_frame(df: pd.DataFrame, directory: str, name: str) -> dict:
+    """
+    Description : Écrit un DataFrame sous la forme d'un fichier .npy par colonne, plus un fichier pour l'index.
+
+    Paramètres :
+        df : DataFrame à écrire (colonnes numériques, index temporel ou numérique).
+        directory : Répertoire de destination.
+        name : Préfixe des fichiers écrits.
+    Renvoie : La description du DataFrame à inscrire dans le manifeste.
+    """
+    columns = _numeric_columns(df)
+    if columns is None:
+        raise ValueError(f"Le DataFrame {name} ne peut pas être écrit au format binaire")
+    os.makedirs(directory, exist_ok=True)
+    index = df.index
+    meta = {"index_name": index.name, "columns": []}
+    if isinstance(index, pd.DatetimeIndex):
+        meta["index_kind"] = "datetime"
+        meta["tz"] = str(index.tz) if index.tz is not None else None
+        index_values = index.tz_convert("UTC").tz_localize(None) if index.tz is not None else index
+        index_values = index_values.as_unit("ns").asi8
+    else:
+        meta["index_kind"] = "values"
+        index_values = index.to_numpy()
+    meta["index"] = f"{name}.__index__.npy"
+    np.save(os.path.join(directory, meta["index"]), np.ascontiguousarray(index_values))
+    for position, (column, values) in enumerate(columns):
+        file_name = f"{name}.{position}.npy"
+        np.save(os.path.join(directory, file_name), values)
+        meta["columns"].append({"name": column, "file": file_name})
+    return meta
+
+
+def read_frame(directory: str, meta: dict, mmap: bool = True, rows: slice = None) -> pd.DataFrame:
+    """
+    Description : Relit un DataFrame écrit par write_frame. Les colonnes sont projetées en mémoire (mmap) en
+    copie sur écriture : elles ne sont lues sur disque qu'à l'accès, et une modification par la stratégie
+    n'altère pas les fichiers partagés.
+
+    Paramètres :
+        rows : Plage de lignes à relire (optionnelle) ; seules les pages correspondantes sont lues sur disque.
+    """
+    mmap_mode = "c" if mmap else None
+    rows = rows if rows is not None else slice(None)
+    index_values = np.load(os.path.join(directory, meta["index"]), mmap_mode=mmap_mode)[rows]
+    if meta["index_kind"] == "datetime":
+        index = pd.DatetimeIndex(np.asarray(index_values).view("datetime64[ns]"), name=meta["index_name"])
+        if meta.get("tz"):
+            index = index.tz_localize("UTC").tz_convert(meta["tz"])
+    else:
+        index = pd.Index(np.asarray(index_values), name=meta["index_name"])
+    data = {column["name"]: np.load(os.path.join(directory, column["file"]), mmap_mode=mmap_mode)[rows]
+            for column in meta["columns"]}
+    return pd.DataFrame(data, index=index, copy=False)
+
+
+def write_panel(dfs_dict: dict, directory: str) -> str:
+    """
+    Description : Écrit un dictionnaire de DataFrames (un par ticker) au format binaire, accompagné d'un petit
+    manifeste JSON décrivant les fichiers.
+
+    Renvoie : Le chemin du manifeste.
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest = {"format": "npy", "version": 1, "frames": {}}
+    for position, (key, df) in enumerate(dfs_dict.items()):
+        manifest["frames"][key] = write_frame(df, directory, f"frame{position}")
+    return _write_manifest(manifest, directory)
+
+
+def _write_manifest(manifest: dict, directory: str) -> str:
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    with open(manifest_path, "w") as file:
+        json.dump(manifest, file)
+    return manifest_path
+
+
+def write_frame_batches(batches, n_rows: int, dtypes: dict, directory: str, name: str,
+                        index_name: str = None) -> dict:
+    """
+    Description : Écrit au format de write_frame un DataFrame fourni par morceaux successifs, sans jamais le
+    reconstituer en mémoire : chaque colonne est un .npy de n_rows lignes projeté en mémoire
+    (np.lib.format.open_memmap) et rempli morceau par morceau.
+
+    Paramètres :
+        batches : Itérable de DataFrames consécutifs, indexés par des dates sans fuseau horaire, contenant les
+                  colonnes de dtypes.
+        n_rows : Nombre total de lignes des morceaux.
+        dtypes : Dictionnaire {nom de colonne: type numpy} des colonnes à écrire.
+        index_name : Nom de l'index relu par read_frame.
+    Renvoie : La description du DataFrame à inscrire dans le manifeste.
+    """
+    os.makedirs(directory, exist_ok=True)
+    meta = {"index_name": index_name, "columns": [], "index_kind": "datetime", "tz": None,
+            "index": f"{name}.__index__.npy"}
+    index = np.lib.format.open_memmap(os.path.join(directory, meta["index"]), mode="w+", dtype=np.int64,
+                                      shape=(n_rows,))
+    columns = []
+    for position, (column, dtype) in enumerate(dtypes.items()):
+        file_name = f"{name}.{position}.npy"
+        columns.append(np.lib.format.open_memmap(os.path.join(directory, file_name), mode="w+", dtype=dtype,
+                                                 shape=(n_rows,)))
+        meta["columns"].append({"name": column, "file": file_name})
+    row = 0
+    for df in batches:
+        stop = row + len(df)
+        if stop > n_rows:
+            raise ValueError(f"Le DataFrame {name} compte plus de {n_rows} lignes")
+        index[row:stop] = pd.DatetimeIndex(df.index).as_unit("ns").asi8
+        for values, column in zip(columns, dtypes):
+            values[row:stop] = df[column].to_numpy()
+        row = stop
+    if row != n_rows:
+        raise ValueError(f"Le DataFrame {name} compte {row} lignes au lieu de {n_rows}")
+    for values in [index] + columns:
+        values.flush()
+    return meta
+
+
+def write_panel_batches(sources: dict, dtypes: dict, directory: str, index_name: str = None) -> str:
+    """
+    Description : Écrit un panel au format de write_panel à partir de DataFrames fournis par morceaux (voir
+    write_frame_batches) : la mémoire utilisée ne dépend que de la taille des morceaux.
+
+    Paramètres :
+        sources : Dictionnaire {clé: (nombre de lignes, itérable de morceaux)}.
+    Renvoie : Le chemin du manifeste.
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest = {"format": "npy", "version": 1, "frames": {}}
+    for position, (key, (n_rows, batches)) in enumerate(sources.items()):
+        manifest["frames"][key] = write_frame_batches(batches, n_rows, dtypes, directory, f"frame{position}",
+                                                      index_name)
+    return _write_manifest(manifest, directory)
+
+
+def panel_indexes(manifest_path: str) -> dict:
+    """
+    Description : Projette en mémoire (lecture seule) l'index de chaque DataFrame d'un panel, sans lire ses
+    colonnes.
+
+    Renvoie : Un dictionnaire {clé: tableau numpy des valeurs de l'index} (nanosecondes UTC pour un index
+    temporel).
+    """
+    with open(manifest_path, "r") as file:
+        manifest = json.load(file)
+    directory = os.path.dirname(manifest_path)
+    return {key: np.load(os.path.join(directory, meta["index"]), mmap_mode="r")
+            for key, meta in manifest["frames"].items()}
+
+
+def read_panel(manifest_path: str, mmap: bool = True, start=None, stop=None) -> dict:
+    """
+    Description : Relit un dictionnaire de DataFrames écrit par write_panel, éventuellement restreint à une
+    fenêtre de l'index.
+
+    Paramètres :
+        start, stop : Bornes incluses de la fenêtre (optionnelles), exprimées dans l'unité de l'index enregistré
+                      (nanosecondes UTC pour un index temporel). Seules les lignes de la fenêtre sont lues.
+    """
+    with open(manifest_path, "r") as file:
+        manifest = json.load(file)
+    directory = os.path.dirname(manifest_path)
+    frames = {}
+    for key, meta in manifest["frames"].items():
+        rows = None
+        if start is not None or stop is not None:
+            index_values = np.load(os.path.join(directory, meta["index"]), mmap_mode="r")
+            rows = slice(np.searchsorted(index_values, start, side="left") if start is not None else None,
+                         np.searchsorted(index_values, stop, side="right") if stop is not None else None)
+        frames[key] = read_frame(directory, meta, mmap=mmap, rows=rows)
+    return frames
+
+
+def write_result(df: pd.DataFrame, directory: str) -> str:
+    """
+    Description : Écrit le DataFrame renvoyé par la stratégie au format binaire.
+
+    Renvoie : Une courte chaîne JSON référençant le manifeste, destinée à être renvoyée au serveur à la place
+    du DataFrame sérialisé en JSON.
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest = {"format": "npy", "version": 1, "frame": write_frame(df, directory, "result")}
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    with open(manifest_path, "w") as file:
+        json.dump(manifest, file)
+    return json.dumps({"format": "npy", "manifest": manifest_path})
+
+
+def read_result(result: str) -> pd.DataFrame:
+    """
+    Description : Relit le résultat d'une stratégie, qu'il ait été transmis au format binaire (référence vers
+    un manifeste) ou au format JSON historique (orient="index").
+    """
+    reference = json.loads(result)
+    # Le format est lu dans la référence analysée, quels que soient l'ordre de ses clés et sa mise en forme
+    if isinstance(reference, dict) and reference.get("format") == "npy":
+        with open(reference["manifest"], "r") as file:
+            manifest = json.load(file)
+        return read_frame(os.path.dirname(reference["manifest"]), manifest["frame"], mmap=False)
+    return pd.read_json(io.StringIO(result), orient="index")
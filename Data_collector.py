@@ -1,6 +1,68 @@
+import contextvars
+import os
+import shutil
+import tempfile
+import threading
+import time
 import pandas as pd
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from CandleStore import INTERVAL_MS, KLINE_COLUMNS, candle_store
+from Panel import OHLCVPanel
+import DataTransport
+import Instrumentation
+
+# Nombre maximal de bougies renvoyées par l'API pour un appel
+KLINES_LIMIT = 1000
+CANDLE_DTYPES = {'Open': 'float64', 'High': 'float64', 'Low': 'float64', 'Close': 'float64',
+                 'Volume': 'float64', 'Quote_volume': 'float64', 'Nb_trades': 'int64'}
+MAX_WORKERS = int(os.environ.get("DATA_COLLECTOR_WORKERS", 8))
+
+def retry_delay(retry_after, default: float) -> float:
+    """
+    Description : Convertit la valeur d'un en-tête Retry-After en durée d'attente.
+
+    Paramètres :
+        retry_after : Valeur de l'en-tête (nombre de secondes ou date HTTP), ou None.
+        default : Attente utilisée si l'en-tête est absent ou illisible.
+    Renvoie : La durée d'attente en secondes (nulle si la date indiquée est déjà passée).
+    """
+    if not retry_after:
+        return default
+    try:
+        return max(float(retry_after), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_date = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return default
+    if retry_date.tzinfo is None:
+        retry_date = retry_date.replace(tzinfo=timezone.utc)
+    return max((retry_date - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Description : Renvoie la session HTTP partagée par tous les DataCollector, dont les connexions sont
+    conservées d'une requête à l'autre.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
 
 class DataCollector:
     """
@@ -8,51 +70,229 @@ class DataCollector:
     Elle permet de récupérer des données historiques de prix pour une liste spécifiée de tickers (symboles d'actifs)
     sur une période donnée et à une fréquence définie.
     """
-    def __init__(self, tickers_list: list[str], dates_list: list[str], interval:str):
+    def __init__(self, tickers_list: list[str], dates_list: list[str], interval:str, store=None,
+                 base_url: str = None, max_workers: int = MAX_WORKERS, max_retries: int = 5):
         self.tickers_list = tickers_list
         self.dates_list = dates_list
         self.interval = interval
+        self.store = store if store is not None else candle_store
+        base_url = base_url or os.environ.get("BINANCE_API_URL", "https://data-api.binance.vision")
+        self.url = f"{base_url.rstrip('/')}/api/v3/klines"
+        self.max_workers = max_workers
+        self.max_retries = max_retries
         self.data = {}
 
+    def get_page(self, symbol: str, start_ms: int, end_ms: int):
+        """
+        Description : Effectue un appel à l'API pour une page d'au plus KLINES_LIMIT bougies, en respectant les
+        limites de débit de l'API.
+
+        Renvoie : La liste des bougies de la page au format de l'API Binance.
+
+        Processus :
+            En cas de réponse 429 (limite de débit) ou 418 (adresse bannie temporairement), attend la durée
+            indiquée par l'en-tête Retry-After (en secondes ou sous forme de date HTTP, voir retry_delay) avant
+            de réessayer. Les erreurs serveur et réseau sont réessayées
+            avec une attente exponentielle.
+        """
+        params = {
+            'symbol': symbol,
+            'interval': self.interval,
+            'startTime': start_ms,
+            'endTime': end_ms,
+            'limit': KLINES_LIMIT
+        }
+        delay = 0.5
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = get_session().get(self.url, params=params, timeout=30)
+            except requests.RequestException as e:
+                if attempt == self.max_retries:
+                    raise ValueError(f"Erreur réseau pour {symbol} : {e}") from e
+                time.sleep(delay)
+                delay *= 2
+                continue
+            if response.status_code in (418, 429) or response.status_code >= 500:
+                if attempt == self.max_retries:
+                    break
+                retry_after = response.headers.get("Retry-After")
+                time.sleep(retry_delay(retry_after, delay))
+                delay *= 2
+                continue
+            Instrumentation.count("bytes", len(response.content), kind="fetch")
+            data = response.json()
+            if not isinstance(data, list):
+                raise ValueError(f"Erreur de l'API pour {symbol} : {data}")
+            return data
+        raise ValueError(f"Erreur de l'API pour {symbol} : code {response.status_code} après "
+                         f"{self.max_retries} tentatives")
+
+    def page_windows(self, start_ms: int, end_ms: int):
+        """
+        Description : Découpe une plage en fenêtres d'au plus KLINES_LIMIT bougies, qui peuvent être demandées
+        en parallèle.
+
+        Renvoie : Une liste de couples (début, fin) en millisecondes, ou None pour les intervalles de durée
+        variable (1M) qui doivent être parcourus page par page.
+        """
+        if self.interval == "1M":
+            return None
+        window = KLINES_LIMIT * INTERVAL_MS[self.interval]
+        return [(window_start, min(window_start + window - 1, end_ms))
+                for window_start in range(start_ms, end_ms + 1, window)]
+
+    def fetch_klines(self, symbol: str, start_ms: int, end_ms: int):
+        """
+        Description : Télécharge auprès de l'API toutes les bougies d'un symbole sur une plage donnée, page par page.
+
+        Renvoie : La liste des bougies au format de l'API Binance.
+        """
+        windows = self.page_windows(start_ms, end_ms)
+        if windows is not None:
+            return [row for window_start, window_end in windows
+                    for row in self.get_page(symbol, window_start, window_end)]
+        rows = []
+        while start_ms <= end_ms:
+            page = self.get_page(symbol, start_ms, end_ms)
+            rows.extend(page)
+            if len(page) < KLINES_LIMIT:
+                break
+            start_ms = page[-1][0] + 1
+        return rows
+
     def collect_APIdata(self):
         """
         Description : Collecte les données historiques de prix pour chaque ticker spécifié dans tickers_list,
         sur la période définie par dates_list et avec l'intervalle spécifié par interval.
 
         Renvoie : Un dictionnaire où chaque clé correspond à un ticker et chaque valeur est un DataFrame pandas
-        contenant les prix de clôture des actifs correspondants, indexés par date.
+        contenant les bougies typées (Open, High, Low, Close, Volume, Quote_volume en float64, Nb_trades en
+        int64) des actifs correspondants, indexées par date (datetime64).
 
         Processus :
-            Construit une URL de requête pour accéder à l'API externe.
             Convertit les dates de début et de fin en timestamps UNIX (en millisecondes) compatibles avec l'API.
-            Pour chaque ticker dans tickers_list, effectue une requête GET à l'API avec les paramètres appropriés
-            pour récupérer les données historiques.
-            Transforme les données reçues en un DataFrame pandas, sélectionne les colonnes pertinentes
-            (ici, uniquement le prix de clôture et les dates), et les index par date.
+            Pour chaque ticker dans tickers_list, détermine les sous-plages de dates absentes du CandleStore
+            local et les découpe en pages d'au plus KLINES_LIMIT bougies.
+            Télécharge toutes les pages de tous les tickers en parallèle (concurrence bornée par max_workers,
+            connexions HTTP partagées), puis les enregistre dans le store.
+            Lit l'ensemble de la plage demandée depuis le store et la transforme en un DataFrame pandas typé
+            contenant les colonnes OHLCV, le volume en devise de cotation et le nombre de trades, indexé par date.
             Stocke le DataFrame résultant dans le dictionnaire data.
 
         """
-        url = "https://data-api.binance.vision/api/v3/klines"
+        with Instrumentation.span("fetch"):
+            return self._collect()
+
+    def date_range(self):
+        """
+        Description : Convertit les dates de début et de fin de dates_list en timestamps UNIX (en millisecondes).
+        """
         start_date = datetime.strptime(self.dates_list[0], '%Y-%m-%d').replace(tzinfo=timezone.utc)
-        start_date = int(start_date.timestamp() * 1000)
         end_date = datetime.strptime(self.dates_list[1], '%Y-%m-%d').replace(tzinfo=timezone.utc)
-        end_date = int(end_date.timestamp() * 1000)
+        return int(start_date.timestamp() * 1000), int(end_date.timestamp() * 1000)
+
+    @staticmethod
+    def to_frame(rows):
+        """
+        Description : Transforme des bougies au format de l'API Binance en DataFrame typé (CANDLE_DTYPES) indexé
+        par date.
+        """
+        df = pd.DataFrame.from_records(rows, columns=KLINE_COLUMNS)
+        dates = pd.DatetimeIndex(pd.to_datetime(df['Open_time'].astype('int64'), unit='ms'), name='Dates')
+        return df[list(CANDLE_DTYPES)].astype(CANDLE_DTYPES).set_index(dates)
+
+    def _collect(self):
+        start_date, end_date = self.date_range()
+        self.download(start_date, end_date)
         for symbol in self.tickers_list:
-            params = {
-                'symbol': symbol,
-                'interval': self.interval,
-                'startTime': start_date,
-                'endTime': end_date
-            }
-            response = requests.get(url, params=params)
-            data = response.json()
-            df = pd.DataFrame(data, columns=['Open_time', 'Open', 'High', 'Low', 'Close', 'Volume', 'Close_time',
-                                             'Quote_volume', 'Nb_trades', 'ignore1', 'ignore2', 'ignore3'])
-            df['Dates'] = pd.to_datetime(df['Open_time'], unit='ms')
-            df = df[['Close']].set_index(df['Dates'])
+            df = DataCollector.to_frame(self.store.load(symbol, self.interval, start_date, end_date))
             self.data[symbol] = df
+            Instrumentation.count("candles", len(df))
         return self.data
 
+    def download(self, start_date: int, end_date: int):
+        """
+        Description : Télécharge et enregistre dans le store les sous-plages de [start_date, end_date] qui en sont
+        absentes, pour tous les tickers (voir collect_APIdata).
+        """
+        missing = [(symbol, missing_start, missing_end) for symbol in self.tickers_list
+                   for missing_start, missing_end in self.store.missing_ranges(symbol, self.interval,
+                                                                               start_date, end_date)]
+        # Une tâche par page ; les intervalles de durée variable sont parcourus séquentiellement par plage
+        tasks = []
+        for symbol, missing_start, missing_end in missing:
+            windows = self.page_windows(missing_start, missing_end)
+            if windows is None:
+                tasks.append((symbol, missing_start, missing_end, self.fetch_klines))
+            else:
+                tasks.extend((symbol, window_start, window_end, self.get_page) for window_start, window_end in windows)
+        Instrumentation.cache_lookup("candle_store", hit=not tasks)
+        if tasks:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(tasks))) as executor:
+                # Chaque tâche s'exécute dans une copie du contexte pour être rattachée à la trace du job
+                futures = [executor.submit(contextvars.copy_context().run, fetch, symbol, task_start, task_end)
+                           for symbol, task_start, task_end, fetch in tasks]
+                pages = []
+                # Avancement publié au plus une centaine de fois, quel que soit le nombre de pages
+                step = max(len(tasks) // 100, 1)
+                for future in futures:
+                    pages.append(future.result())
+                    if len(pages) % step == 0 or len(pages) == len(tasks):
+                        Instrumentation.emit("fetch_progress", pages_done=len(pages), pages=len(tasks))
+            for (symbol, task_start, task_end, _), rows in zip(tasks, pages):
+                self.store.insert(symbol, self.interval, rows, task_start, task_end)
+
+    @contextmanager
+    def collect_panel(self, root_dir: str = None):
+        """
+        Description : Collecte les mêmes bougies que collect_APIdata, mais les écrit directement dans un panel
+        sur disque (format de DataTransport.write_panel) au lieu de les charger en mémoire : utilisé par
+        l'exécution par blocs, dont les données peuvent dépasser la mémoire disponible.
+
+        Paramètres :
+            root_dir : Répertoire où créer le panel (par défaut PanelRegistry.disk_root, sur disque).
+        Renvoie : Gestionnaire de contexte fournissant le chemin du manifeste du panel, supprimé à la sortie.
+
+        Processus :
+            Télécharge les sous-plages manquantes dans le CandleStore, comme collect_APIdata.
+            Pour chaque ticker, compte les bougies de la plage puis les relit par lots (CandleStore.load_batches),
+            chaque lot étant converti en DataFrame typé et copié dans les colonnes .npy du panel : la mémoire
+            utilisée ne dépend que de la taille des lots.
+        """
+        if root_dir is None:
+            from PanelRegistry import disk_root
+            root_dir = disk_root()
+        with Instrumentation.span("fetch"):
+            start_date, end_date = self.date_range()
+            self.download(start_date, end_date)
+        directory = tempfile.mkdtemp(prefix="panel_", dir=root_dir)
+        try:
+            sources = {}
+            for symbol in self.tickers_list:
+                n_rows, last_open = self.store.extent(symbol, self.interval, start_date, end_date)
+                batches = self.store.load_batches(symbol, self.interval, start_date, last_open) if n_rows else []
+                sources[symbol] = (n_rows, map(DataCollector.to_frame, batches))
+                Instrumentation.count("candles", n_rows)
+            with Instrumentation.span("serialize_panel"):
+                manifest_path = DataTransport.write_panel_batches(sources, CANDLE_DTYPES, directory,
+                                                                  index_name='Dates')
+            Instrumentation.count("bytes", sum(os.path.getsize(os.path.join(directory, name))
+                                               for name in os.listdir(directory)), kind="panel")
+            yield manifest_path
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def to_panel(self, fields: list = None):
+        """
+        Description : Regroupe les données collectées dans un unique tableau à trois dimensions
+        (dates x tickers x champs), aligné sur un index temporel commun.
+
+        Paramètres :
+            fields : Champs à conserver (par défaut Open, High, Low, Close, Volume).
+        Renvoie : Une instance d'OHLCVPanel.
+        """
+        return OHLCVPanel.from_frames(self.data, fields)
+
 #######################################       TEST       ##############################################################
 
 if __name__ == '__main__':
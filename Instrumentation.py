@@ -0,0 +1,227 @@
+import contextvars
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Bornes des histogrammes de durée, en secondes
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+HELP = {
+    "backtest_stage_seconds": ("histogram", "Durée de chaque étape du pipeline de backtest"),
+    "backtest_bytes_total": ("counter", "Octets échangés par type de transfert"),
+    "backtest_cache_requests_total": ("counter", "Consultations des caches, par cache et par résultat (hit/miss)"),
+    "backtest_jobs_total": ("counter", "Jobs terminés, par état final"),
+    "backtest_candles_total": ("counter", "Bougies chargées pour les backtests"),
+    "backtest_worker_cpu_seconds": ("histogram", "Temps CPU consommé par job dans les workers de stratégie"),
+    "backtest_worker_max_rss_bytes": ("gauge", "Pic de mémoire résidente du dernier worker ayant terminé un job"),
+}
+
+
+def _labels_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = [(key, value.replace("\\", "\\\\").replace('"', '\\"')) for key, value in pairs]
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+class MetricsRegistry:
+    """
+    La classe MetricsRegistry agrège les métriques du serveur (compteurs, jauges et histogrammes) et les rend au
+    format texte de Prometheus pour la route /metrics.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._gauges = {}
+        self._histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            self._counters[(name, _labels_key(labels))] += value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, _labels_key(labels))] = value
+
+    def observe(self, name, value, **labels):
+        with self._lock:
+            key = (name, _labels_key(labels))
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+            for position, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram["buckets"][position] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def render(self):
+        """
+        Description : Renvoie toutes les métriques au format d'exposition texte de Prometheus.
+        """
+        with self._lock:
+            series = defaultdict(list)
+            for (name, labels), value in self._counters.items():
+                series[name].append(f"{name}{_format_labels(labels)} {value}")
+            for (name, labels), value in self._gauges.items():
+                series[name].append(f"{name}{_format_labels(labels)} {value}")
+            for (name, labels), histogram in self._histograms.items():
+                for bound, count in zip(BUCKETS, histogram["buckets"]):
+                    series[name].append(f"{name}_bucket{_format_labels(labels, [('le', str(bound))])} {count}")
+                series[name].append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram['count']}")
+                series[name].append(f"{name}_sum{_format_labels(labels)} {histogram['sum']}")
+                series[name].append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+        lines = []
+        for name in sorted(series):
+            kind, description = HELP.get(name, ("untyped", name))
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(series[name])
+        return "\n".join(lines) + "\n"
+
+
+class Trace:
+    """
+    La classe Trace collecte les mesures d'un job (durée de chaque étape, octets transférés, consultations des
+    caches, ressources du worker), pour qu'elles soient jointes à son résultat. Elle tient aussi le journal des
+    évènements de progression du job (début et fin des étapes, pages téléchargées, statistiques partielles),
+    qui peut être suivi pendant l'exécution (voir events_since).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.spans = []
+        self.counters = defaultdict(float)
+        self.values = {}
+        self.events = []
+
+    def add_span(self, name, offset, duration):
+        with self._lock:
+            self.spans.append({"stage": name, "start_s": round(offset, 6), "duration_s": round(duration, 6)})
+
+    def add(self, name, value):
+        with self._lock:
+            self.counters[name] += value
+
+    def set(self, name, value):
+        with self._lock:
+            self.values[name] = value
+
+    def add_event(self, event):
+        with self._lock:
+            self.events.append(event)
+
+    def events_since(self, cursor):
+        """
+        Description : Renvoie la liste des évènements publiés à partir de la position cursor du journal.
+        """
+        with self._lock:
+            return self.events[cursor:]
+
+    def to_dict(self):
+        with self._lock:
+            return {"spans": list(self.spans), "counters": dict(self.counters), **self.values}
+
+
+registry = MetricsRegistry()
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+@contextmanager
+def trace(current=None):
+    """
+    Description : Ouvre la trace du job en cours : les mesures effectuées dans ce contexte (y compris dans les
+    threads lancés avec contextvars.copy_context) y sont enregistrées.
+
+    Paramètres :
+        current : Trace à utiliser, créée à l'avance pour pouvoir être suivie avant le début du job (une
+                  nouvelle trace par défaut). Ses durées sont mesurées à partir de l'ouverture du contexte.
+    """
+    if current is None:
+        current = Trace()
+    current.started = time.perf_counter()
+    token = _current_trace.set(current)
+    try:
+        yield current
+    finally:
+        _current_trace.reset(token)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def span(stage):
+    """
+    Description : Mesure la durée d'une étape du pipeline, dans l'histogramme backtest_stage_seconds et dans la
+    trace du job en cours.
+    """
+    start = time.perf_counter()
+    emit("stage_start", stage=stage)
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        registry.observe("backtest_stage_seconds", duration, stage=stage)
+        current = _current_trace.get()
+        if current is not None:
+            current.add_span(stage, start - current.started, duration)
+        emit("stage_end", stage=stage, duration_s=round(duration, 6))
+
+
+def emit(event, **fields):
+    """
+    Description : Publie un évènement de progression dans le journal de la trace du job en cours (sans effet
+    hors d'un job).
+
+    Paramètres :
+        event : Type de l'évènement (stage_start, stage_end, fetch_progress, strategy_progress, partial_stats, ...).
+        fields : Champs de l'évènement, sérialisables en JSON.
+    """
+    current = _current_trace.get()
+    if current is not None:
+        current.add_event({"event": event, "t_s": round(time.perf_counter() - current.started, 6), **fields})
+
+
+def count(name, value=1, **labels):
+    """
+    Description : Incrémente un compteur du registre et, pour la trace du job en cours, le compteur portant
+    le nom de la métrique suivi de ses labels (par exemple bytes_fetch).
+    """
+    registry.inc(f"backtest_{name}_total", value, **labels)
+    current = _current_trace.get()
+    if current is not None:
+        current.add("_".join([name] + [str(label) for label in labels.values()]), value)
+
+
+def cache_lookup(cache, hit):
+    """
+    Description : Enregistre une consultation de cache (hit ou miss) ; le taux de succès de chaque cache se
+    déduit de backtest_cache_requests_total.
+    """
+    result = "hit" if hit else "miss"
+    registry.inc("backtest_cache_requests_total", cache=cache, result=result)
+    current = _current_trace.get()
+    if current is not None:
+        current.set(f"cache_{cache}", result)
+
+
+def worker_usage(cpu_seconds, max_rss_bytes):
+    """
+    Description : Enregistre le temps CPU et le pic de mémoire d'un job exécuté dans un worker de stratégie.
+    """
+    if cpu_seconds is not None:
+        registry.observe("backtest_worker_cpu_seconds", cpu_seconds)
+    if max_rss_bytes is not None:
+        registry.set("backtest_worker_max_rss_bytes", max_rss_bytes)
+    current = _current_trace.get()
+    if current is not None:
+        current.add("worker_cpu_seconds", cpu_seconds or 0)
+        current.set("worker_max_rss_bytes", max(max_rss_bytes or 0, current.values.get("worker_max_rss_bytes", 0)))
@@ -0,0 +1,176 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import Instrumentation
+
+EN_ATTENTE = "en_attente"
+EN_COURS = "en_cours"
+TERMINE = "termine"
+ECHOUE = "echoue"
+ANNULE = "annule"
+
+
+class JobCancelled(Exception):
+    """
+    Exception levée dans un job lorsque son annulation a été demandée.
+    """
+
+
+class QueueFullError(Exception):
+    """
+    Exception levée lorsque la file d'attente a atteint sa profondeur maximale.
+    """
+
+
+class DuplicateJobError(Exception):
+    """
+    Exception levée lorsqu'un job en attente ou en cours porte déjà le même identifiant.
+    """
+
+
+class Job:
+    """
+    La classe Job représente un backtest soumis à la file d'attente : son état, son résultat ou son erreur,
+    l'évènement permettant de demander son annulation et la trace où sont publiés ses évènements de progression.
+    """
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.status = EN_ATTENTE
+        self.result = None
+        self.error = None
+        self.exception = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self.future = None
+        self.cache_hit = False
+        self.metrics = None
+        self.trace = Instrumentation.Trace()
+
+    @property
+    def finished(self):
+        return self.status in (TERMINE, ECHOUE, ANNULE)
+
+    def raise_if_cancelled(self):
+        """
+        Description : Interrompt le job entre deux étapes si son annulation a été demandée.
+        """
+        if self.cancel_event.is_set():
+            raise JobCancelled(f"Le job {self.job_id} a été annulé")
+
+    def to_dict(self):
+        """
+        Description : Renvoie l'état du job sous forme de dictionnaire, tel qu'exposé par l'API.
+        """
+        job_dict = {"job_id": self.job_id, "status": self.status, "submitted_at": self.submitted_at,
+                    "started_at": self.started_at, "finished_at": self.finished_at}
+        if self.metrics is not None:
+            job_dict["metrics"] = self.metrics
+        if self.status == TERMINE:
+            job_dict["cache_hit"] = self.cache_hit
+            job_dict["result"] = self.result
+        elif self.status in (ECHOUE, ANNULE):
+            job_dict["error"] = self.error
+        return job_dict
+
+
+class JobQueue:
+    """
+    La classe JobQueue exécute les backtests en arrière-plan sur un nombre borné de threads, afin que les
+    appels bloquants (téléchargement des données, workers de stratégie) ne bloquent pas la boucle d'évènements
+    du serveur. Les jobs sont identifiés par le request_id de la requête et peuvent être consultés ou annulés.
+    """
+    def __init__(self, max_workers: int = 2, max_pending: int = 20, retention: float = 3600):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="backtest")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _prune(self):
+        # Les jobs terminés sont conservés pendant retention secondes pour pouvoir être consultés
+        limit = time.time() - self.retention
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished and job.finished_at < limit]:
+            del self._jobs[job_id]
+
+    def submit(self, job_id: str, fn, *args, **kwargs) -> Job:
+        """
+        Description : Soumet un job à la file d'attente.
+
+        Paramètres :
+            job_id : Identifiant du job (request_id de la requête).
+            fn : Fonction à exécuter ; elle reçoit le Job en argument nommé job, pour pouvoir vérifier son annulation.
+        Renvoie : Le Job créé.
+        Exceptions : DuplicateJobError si un job actif porte le même identifiant, QueueFullError si la file est pleine.
+        """
+        with self._lock:
+            self._prune()
+            existing = self._jobs.get(job_id)
+            if existing is not None and not existing.finished:
+                raise DuplicateJobError(f"Une requête avec l'identifiant {job_id} est déjà en cours")
+            pending = sum(1 for job in self._jobs.values() if job.status == EN_ATTENTE)
+            if pending >= self.max_pending:
+                raise QueueFullError("La file d'attente des backtests est pleine, réessayez plus tard")
+            job = Job(job_id)
+            self._jobs[job_id] = job
+            job.future = self._executor.submit(self._run, job, fn, *args, **kwargs)
+        return job
+
+    def _run(self, job: Job, fn, *args, **kwargs):
+        if job.cancel_event.is_set():
+            job.error = f"Le job {job.job_id} a été annulé"
+            job.status = ANNULE
+            job.finished_at = time.time()
+            return None
+        job.status = EN_COURS
+        job.started_at = time.time()
+        # Les mesures effectuées pendant le job (étapes, octets, caches, worker) sont jointes à son résultat
+        with Instrumentation.trace(job.trace) as trace:
+            try:
+                job.result = fn(*args, job=job, **kwargs)
+                job.status = TERMINE
+            except JobCancelled as e:
+                job.error = str(e)
+                job.status = ANNULE
+            except Exception as e:
+                job.exception = e
+                job.error = str(e)
+                job.status = ECHOUE
+            finally:
+                job.metrics = trace.to_dict()
+                job.finished_at = time.time()
+                Instrumentation.count("jobs", status=job.status)
+        return job.result
+
+    def get(self, job_id: str):
+        """
+        Description : Renvoie le job correspondant à un identifiant, ou None s'il est inconnu.
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Description : Demande l'annulation d'un job. Un job en attente n'est jamais exécuté ; un job en cours
+        est interrompu à la prochaine étape, et son worker de stratégie est arrêté.
+
+        Renvoie : True si l'annulation a été prise en compte, False si le job est inconnu ou déjà terminé.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return False
+            job.cancel_event.set()
+            if job.future.cancel():
+                job.status = ANNULE
+                job.error = f"Le job {job_id} a été annulé"
+                job.finished_at = time.time()
+        return True
+
+
+job_queue = JobQueue(max_workers=int(os.environ.get("JOB_WORKERS", 2)),
+                     max_pending=int(os.environ.get("JOB_MAX_PENDING", 20)),
+                     retention=float(os.environ.get("JOB_RETENTION", 3600)))
@@ -0,0 +1,270 @@
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from Cloudscheduler import CloudScheduler
+
+
+class CronSchedule:
+    """
+    La classe CronSchedule interprète une expression cron à cinq champs (minute, heure, jour du mois, mois, jour de
+    la semaine) et calcule sa prochaine occurrence. Chaque champ accepte '*', une valeur, une liste (1,15), un
+    intervalle (1-5) et un pas (*/15). Comme dans cron, si le jour du mois et le jour de la semaine sont tous deux
+    restreints, une date correspondant à l'un des deux suffit.
+    """
+    BOUNDS = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+    def __init__(self, expression: str, time_zone: str = "Europe/Paris"):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Expression cron invalide : {expression}")
+        self.expression = expression
+        self.time_zone = ZoneInfo(time_zone)
+        self.minutes, self.hours, self.days, self.months, weekdays = [
+            self._parse_field(field, low, high) for field, (low, high) in zip(fields, self.BOUNDS)]
+        # Le dimanche peut s'écrire 0 ou 7
+        self.weekdays = {weekday % 7 for weekday in weekdays}
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    @staticmethod
+    def _parse_field(field, low, high):
+        values = set()
+        for part in field.split(","):
+            step = 1
+            if "/" in part:
+                part, step = part.split("/")
+                step = int(step)
+            if part == "*":
+                start, end = low, high
+            elif "-" in part:
+                start, end = (int(value) for value in part.split("-"))
+            else:
+                start = end = int(part)
+            if start < low or end > high or step < 1:
+                raise ValueError(f"Champ cron invalide : {field}")
+            values.update(range(start, end + 1, step))
+        return sorted(values)
+
+    def _day_matches(self, day):
+        # isoweekday : lundi = 1, ..., dimanche = 7 ; cron : dimanche = 0
+        day_ok = day.day in self.days
+        weekday_ok = day.isoweekday() % 7 in self.weekdays
+        if self.any_day:
+            return weekday_ok
+        if self.any_weekday:
+            return day_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, moment: datetime) -> datetime:
+        """
+        Description : Calcule la première occurrence strictement postérieure à moment.
+
+        Paramètres :
+            moment : Date de référence (avec fuseau horaire).
+        Renvoie : La prochaine occurrence, dans le fuseau horaire de la planification.
+        """
+        local = moment.astimezone(self.time_zone).replace(tzinfo=None, second=0, microsecond=0)
+        start = local + timedelta(minutes=1)
+        day = start.replace(hour=0, minute=0)
+        for _ in range(366 * 5):
+            if day.month in self.months and self._day_matches(day):
+                for hour in self.hours:
+                    for minute in self.minutes:
+                        candidate = day.replace(hour=hour, minute=minute)
+                        if candidate >= start:
+                            return candidate.replace(tzinfo=self.time_zone)
+            day += timedelta(days=1)
+        raise ValueError(f"L'expression cron {self.expression} n'a pas d'occurrence")
+
+
+class LocalCron:
+    """
+    La classe LocalCron exécute dans le processus du serveur les réexécutions programmées des backtests récurrents,
+    en remplacement de Google Cloud Scheduler et de la fonction Cloud trigger_api. Les tâches sont conservées sur
+    le disque local (un fichier JSON par requête) et survivent donc à un redémarrage du serveur. À chaque
+    échéance, la requête est soumise directement à la file d'attente des backtests, sans aller-retour HTTP.
+    """
+    def __init__(self, state_dir: str = "scheduled_jobs", poll_interval: float = 30, time_zone: str = "Europe/Paris"):
+        self.state_dir = state_dir
+        self.poll_interval = poll_interval
+        self.time_zone = time_zone
+        self.submit = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def _path(self, request_id):
+        if not request_id or os.path.basename(request_id) != request_id or request_id in (".", ".."):
+            raise ValueError(f"Identifiant de requête invalide : {request_id}")
+        return os.path.join(self.state_dir, f"{request_id}.json")
+
+    def _save(self, job):
+        os.makedirs(self.state_dir, exist_ok=True)
+        path = self._path(job["request"]["request_id"])
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(job, file)
+        os.replace(tmp_path, path)
+
+    def _load(self):
+        if not os.path.isdir(self.state_dir):
+            return
+        for file_name in os.listdir(self.state_dir):
+            if file_name.endswith(".json"):
+                with open(os.path.join(self.state_dir, file_name), encoding="utf-8") as file:
+                    job = json.load(file)
+                self._jobs[job["request"]["request_id"]] = job
+
+    def start(self, submit):
+        """
+        Description : Recharge les tâches enregistrées et démarre la boucle de planification.
+
+        Paramètres :
+            submit : Fonction recevant le dictionnaire d'une requête à exécuter ; elle la soumet à la file d'attente
+                     et lève une exception si la soumission est impossible (la tâche est alors retentée).
+        """
+        self.submit = submit
+        with self._lock:
+            self._load()
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name="local-cron", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        thread = self._thread
+        self._thread = None
+        self._wake.set()
+        if thread is not None:
+            thread.join()
+        self._wake.clear()
+
+    def add(self, request: dict, cron: str):
+        """
+        Description : Enregistre la planification d'une requête.
+
+        Renvoie : False si une tâche existe déjà pour cette requête, True sinon.
+        """
+        schedule = CronSchedule(cron, self.time_zone)
+        with self._lock:
+            if request["request_id"] in self._jobs:
+                return False
+            job = {"request": request, "cron": cron,
+                   "next_run": schedule.next_after(datetime.now(schedule.time_zone)).isoformat()}
+            self._save(job)
+            self._jobs[request["request_id"]] = job
+        self._wake.set()
+        return True
+
+    def remove(self, request_id: str):
+        with self._lock:
+            if self._jobs.pop(request_id, None) is None:
+                return False
+            os.remove(self._path(request_id))
+        return True
+
+    def get(self, request_id: str):
+        with self._lock:
+            return self._jobs.get(request_id)
+
+    def run_pending(self, now: datetime = None):
+        """
+        Description : Exécute les tâches arrivées à échéance.
+
+        Processus :
+            Incrémente current_execution_count et soumet la requête. En cas d'échec de la soumission (file pleine,
+            requête déjà en cours), la tâche est retentée au tour suivant.
+            Avance ensuite la date de fin de la requête de repeat_frequency jours pour la réexécution suivante,
+            et supprime la tâche une fois nb_execution réexécutions effectuées.
+            Une échéance manquée pendant un arrêt du serveur donne lieu à une seule exécution de rattrapage.
+        """
+        with self._lock:
+            due = [job for job in self._jobs.values()
+                   if datetime.fromisoformat(job["next_run"]) <= (now or datetime.now(ZoneInfo(self.time_zone)))]
+        for job in due:
+            request = dict(job["request"])
+            request["current_execution_count"] = request.get("current_execution_count", 0) + 1
+            try:
+                self.submit(request)
+            except Exception as e:
+                print(f"Réexécution de {request['request_id']} reportée : {e}")
+                continue
+            if request["current_execution_count"] >= request.get("nb_execution", 1):
+                self.remove(request["request_id"])
+                continue
+            date_fin = datetime.strptime(request["dates"][1], "%Y-%m-%d")
+            request["dates"] = [request["dates"][0],
+                                (date_fin + timedelta(days=request["repeat_frequency"])).strftime("%Y-%m-%d")]
+            schedule = CronSchedule(job["cron"], self.time_zone)
+            with self._lock:
+                job["request"] = request
+                job["next_run"] = schedule.next_after(now or datetime.now(schedule.time_zone)).isoformat()
+                self._save(job)
+
+    def _seconds_until_next(self):
+        with self._lock:
+            if not self._jobs:
+                return self.poll_interval
+            next_run = min(datetime.fromisoformat(job["next_run"]) for job in self._jobs.values())
+        delay = (next_run - datetime.now(ZoneInfo(self.time_zone))).total_seconds()
+        return min(max(delay, 0), self.poll_interval)
+
+    def _loop(self):
+        while self._thread is not None:
+            try:
+                self.run_pending()
+            except Exception as e:
+                print(f"Erreur du planificateur local : {e}")
+            self._wake.wait(self._seconds_until_next())
+            self._wake.clear()
+
+
+local_cron = LocalCron(state_dir=os.environ.get("SCHEDULER_STATE_DIR", "scheduled_jobs"),
+                       poll_interval=float(os.environ.get("SCHEDULER_POLL_INTERVAL", 30)))
+
+
+class LocalScheduler(CloudScheduler):
+    """
+    La classe LocalScheduler offre la même interface que CloudScheduler, mais planifie les réexécutions dans le
+    planificateur local (LocalCron) au lieu de Google Cloud Scheduler. Elle ne nécessite ni accès réseau ni
+    identifiants GCP.
+    """
+    def __init__(self, user_input, cron: LocalCron = None):
+        super().__init__(user_input)
+        self.cron = cron if cron is not None else local_cron
+
+    def save_request_to_storage(self, bucket_name=None):
+        """
+        Description : Sans objet pour le planificateur local : la requête est enregistrée sur le disque avec la
+        tâche par create_scheduler_job.
+        """
+        return None
+
+    def create_scheduler_job(self, bucket_name=None):
+        """
+        Description : Enregistre la tâche de réexécution de la requête dans le planificateur local, avec la même
+        expression cron que pour Google Cloud Scheduler. Comme pour la fonction Cloud, la première réexécution
+        porte sur une date de fin avancée de repeat_frequency jours.
+        """
+        request = self.scheduled_request()
+        if not self.cron.add(request, self.frequency_to_cron()):
+            print(f"Erreur : La tâche existe déjà - {self.user_input.request_id}")
+            return None
+        print("Tâche créée : ", self.user_input.request_id)
+        return self.cron.get(self.user_input.request_id)
+
+
+def create_scheduler(user_input):
+    """
+    Description : Renvoie le planificateur choisi par la variable d'environnement SCHEDULER_BACKEND
+    ('cloud' par défaut pour Google Cloud Scheduler, ou 'local').
+    """
+    backend = os.environ.get("SCHEDULER_BACKEND", "cloud")
+    if backend == "local":
+        return LocalScheduler(user_input)
+    if backend == "cloud":
+        return CloudScheduler(user_input)
+    raise ValueError(f"Planificateur inconnu : {backend}")
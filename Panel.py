@@ -0,0 +1,161 @@
+import numpy as np
+import pandas as pd
+
+OHLCV_FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# Politiques d'alignement des séries sur le calendrier commun
+# fill : traitement des prix manquants d'un actif ('ffill' : dernier prix connu, 'none' : aucun remplissage)
+# missing : traitement des rendements non définis ('zero' : rendement nul, 'drop' : date retirée du calendrier)
+FILL_POLICIES = ('ffill', 'none')
+MISSING_POLICIES = ('zero', 'drop')
+
+
+def check_policies(fill: str, missing: str):
+    if fill not in FILL_POLICIES:
+        raise ValueError(f"Politique de remplissage inconnue : {fill} (valeurs possibles : {FILL_POLICIES})")
+    if missing not in MISSING_POLICIES:
+        raise ValueError(f"Politique de données manquantes inconnue : {missing} "
+                         f"(valeurs possibles : {MISSING_POLICIES})")
+
+
+def shared_index(frames) -> pd.DatetimeIndex:
+    """
+    Description : Construit le calendrier commun à plusieurs séries : l'union triée de leurs dates.
+    """
+    index = pd.DatetimeIndex([], name='Dates')
+    for frame in frames:
+        index = index.union(frame.index)
+    return index
+
+
+def forward_fill(values: np.ndarray) -> np.ndarray:
+    """
+    Description : Propage, colonne par colonne, la dernière valeur connue d'un tableau à deux dimensions
+    (dates x séries). Les valeurs précédant la première valeur connue restent NaN.
+    """
+    last_valid = np.where(np.isnan(values), 0, np.arange(values.shape[0])[:, None])
+    np.maximum.accumulate(last_valid, axis=0, out=last_valid)
+    return values[last_valid, np.arange(values.shape[1])]
+
+
+def period_returns(closes: np.ndarray, previous: np.ndarray = None, fill: str = 'ffill'):
+    """
+    Description : Calcule les rendements simples d'un tableau de prix (dates x tickers) aligné sur le calendrier
+    commun, en prolongeant les derniers prix du bloc précédent.
+
+    Paramètres :
+        closes : Tableau numpy des prix (NaN pour les prix manquants).
+        previous : Derniers prix à la fin du bloc précédent (None pour le premier bloc).
+        fill : Politique de remplissage des prix manquants ('ffill' ou 'none').
+    Renvoie : Un couple (rendements, derniers prix du bloc). Les rendements non définis (avant la cotation d'un
+    actif, ou autour d'un prix manquant non rempli) valent NaN.
+    """
+    if previous is None:
+        previous = np.full(closes.shape[1], np.nan)
+    closes = np.vstack([previous, closes])
+    if fill == 'ffill':
+        closes = forward_fill(closes)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = closes[1:] / closes[:-1] - 1
+    return returns, closes[-1]
+
+
+def apply_missing(returns: np.ndarray, missing: str = 'zero'):
+    """
+    Description : Applique la politique de données manquantes à des rendements (dates x tickers).
+
+    Renvoie : Un couple (rendements sans NaN, masque booléen des dates conservées).
+    """
+    undefined = np.isnan(returns)
+    if missing == 'drop':
+        keep = ~undefined.any(axis=1)
+        return returns[keep], keep
+    returns = np.where(undefined, 0.0, returns)
+    return returns, np.ones(returns.shape[0], dtype=bool)
+
+
+def align_frame(frame: pd.DataFrame, index: pd.Index, columns: list) -> np.ndarray:
+    """
+    Description : Joint un DataFrame (par exemple les poids d'une stratégie) sur un calendrier et une liste de
+    colonnes, en un tableau numpy (dates x colonnes).
+
+    Paramètres :
+        frame : DataFrame à aligner.
+        index : Calendrier cible.
+        columns : Colonnes cibles.
+    Renvoie : Le tableau aligné. Les colonnes sont associées par nom ; les lignes par date si le DataFrame est
+    indexé par des dates, par position sinon. Les valeurs absentes valent 0.
+    """
+    values = frame.reindex(columns=columns).to_numpy(dtype=float)
+    aligned = np.zeros((len(index), len(columns)))
+    frame_index = frame.index
+    if isinstance(frame_index, pd.DatetimeIndex) and isinstance(index, pd.DatetimeIndex):
+        if (frame_index.tz is None) != (index.tz is None):
+            frame_index = (frame_index.tz_convert('UTC').tz_localize(None) if frame_index.tz is not None
+                           else frame_index.tz_localize('UTC').tz_convert(index.tz))
+        if frame_index.has_duplicates:
+            # En cas de doublons, la dernière ligne de chaque date est retenue
+            last = ~frame_index.duplicated(keep='last')
+            frame_index, values = frame_index[last], values[last]
+        rows = index.get_indexer(frame_index)
+        matched = rows >= 0
+        aligned[rows[matched]] = values[matched]
+    else:
+        n_rows = min(len(index), values.shape[0])
+        aligned[:n_rows] = values[:n_rows]
+    return np.nan_to_num(aligned, nan=0.0)
+
+
+class OHLCVPanel:
+    """
+    La classe OHLCVPanel regroupe les bougies de plusieurs tickers dans un unique tableau numpy à trois dimensions
+    (dates x tickers x champs), aligné sur un index temporel commun. Les dates absentes pour un ticker valent NaN.
+    """
+    def __init__(self, index: pd.DatetimeIndex, tickers: list, fields: list, values: np.ndarray):
+        self.index = index
+        self.tickers = list(tickers)
+        self.fields = list(fields)
+        self.values = values
+
+    @classmethod
+    def from_frames(cls, dfs_dict: dict, fields: list = None):
+        """
+        Description : Construit un panel à partir d'un dictionnaire de DataFrames (un par ticker).
+
+        Paramètres :
+            dfs_dict : Dictionnaire {ticker: DataFrame indexé par date}.
+            fields : Colonnes à conserver (par défaut, les colonnes OHLCV présentes dans tous les DataFrames).
+        Renvoie : Une instance d'OHLCVPanel.
+        """
+        tickers = list(dfs_dict.keys())
+        if fields is None:
+            fields = [field for field in OHLCV_FIELDS if all(field in df.columns for df in dfs_dict.values())]
+        index = shared_index(dfs_dict.values())
+        values = np.full((len(index), len(tickers), len(fields)), np.nan)
+        for position, ticker in enumerate(tickers):
+            df = dfs_dict[ticker]
+            rows = index.get_indexer(df.index)
+            values[rows, position, :] = df[fields].to_numpy(dtype=float)
+        return cls(index, tickers, fields, values)
+
+    def field(self, name: str) -> pd.DataFrame:
+        """
+        Description : Renvoie un champ du panel (par exemple 'Close') sous forme de DataFrame dates x tickers.
+        """
+        return pd.DataFrame(self.values[:, :, self.fields.index(name)], index=self.index, columns=self.tickers)
+
+    def returns(self, field: str = 'Close', fill: str = 'ffill', missing: str = 'zero'):
+        """
+        Description : Calcule les rendements d'un champ du panel sur le calendrier commun, selon les politiques
+        d'alignement choisies.
+
+        Renvoie : Un couple (calendrier des rendements, tableau numpy dates x tickers des rendements). Avec
+        missing='drop', le calendrier ne contient que les dates où le rendement de chaque actif est défini.
+        """
+        check_policies(fill, missing)
+        returns, _ = period_returns(self.values[:, :, self.fields.index(field)], fill=fill)
+        returns, keep = apply_missing(returns, missing)
+        if len(self.index) > 1 and not keep.any():
+            raise ValueError("Aucune date où le rendement de chaque actif est défini : "
+                             "utilisez la politique de données manquantes 'zero'")
+        return self.index[keep], returns
@@ -0,0 +1,241 @@
+import atexit
+import hashlib
+import json
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+import DataTransport
+import Instrumentation
+from ResultCache import data_fingerprint
+
+# Système de fichiers en mémoire (tmpfs) où écrire les données des workers, si la place disponible le permet
+SHARED_MEMORY_DIR = os.environ.get("SHARED_MEMORY_DIR", "/dev/shm")
+# Répertoire sur disque des panels des exécutions par blocs, dont les données peuvent dépasser la mémoire (par
+# défaut le répertoire temporaire du système, qui ne doit alors pas être un tmpfs)
+DISK_PANEL_DIR = os.environ.get("DISK_PANEL_DIR") or None
+# Préfixe des répertoires propres à chaque processus serveur : backtest_<pid>_<jeton>
+PROCESS_DIR_PREFIX = "backtest_"
+# Distingue ce processus d'un processus précédent ayant eu le même pid (redémarrage d'un conteneur)
+PROCESS_TOKEN = uuid.uuid4().hex[:12]
+_process_dirs = set()
+
+
+def process_dir(base_dir: str) -> str:
+    """
+    Description : Renvoie (en le créant) le répertoire de ce processus serveur dans base_dir. Les panels et les
+    répertoires de travail des requêtes y sont créés : ceux laissés par un processus arrêté brutalement sont
+    identifiables et supprimés au démarrage suivant (voir remove_stale_dirs). À l'arrêt normal du processus, le
+    répertoire est supprimé.
+    """
+    path = os.path.join(base_dir, f"{PROCESS_DIR_PREFIX}{os.getpid()}_{PROCESS_TOKEN}")
+    os.makedirs(path, exist_ok=True)
+    if path not in _process_dirs:
+        _process_dirs.add(path)
+        atexit.register(shutil.rmtree, path, ignore_errors=True)
+    return path
+
+
+def shared_memory_root(dfs_dict: dict):
+    """
+    Description : Choisit le répertoire où écrire des données destinées aux workers.
+
+    Renvoie : Le répertoire de ce processus (voir process_dir) dans SHARED_MEMORY_DIR s'il existe, est accessible
+    en écriture et dispose d'au moins deux fois la taille des données en mémoire ; dans le répertoire temporaire
+    du système sinon. Dans un tmpfs, les colonnes .npy projetées en mémoire par les workers partagent les pages
+    écrites par le serveur, sans aucune lecture sur disque.
+    """
+    if not SHARED_MEMORY_DIR or not os.path.isdir(SHARED_MEMORY_DIR) or not os.access(SHARED_MEMORY_DIR, os.W_OK):
+        return process_dir(tempfile.gettempdir())
+    needed = 2 * sum(int(df.memory_usage(deep=True).sum()) for df in dfs_dict.values())
+    if shutil.disk_usage(SHARED_MEMORY_DIR).free > needed:
+        return process_dir(SHARED_MEMORY_DIR)
+    return process_dir(tempfile.gettempdir())
+
+
+def disk_root() -> str:
+    """
+    Description : Renvoie le répertoire de ce processus (voir process_dir) dans DISK_PANEL_DIR, ou à défaut dans
+    le répertoire temporaire du système : les données des exécutions par blocs y sont écrites sur disque plutôt
+    qu'en mémoire partagée, et ne sont lues que par les pages de la fenêtre en cours.
+    """
+    return process_dir(DISK_PANEL_DIR or tempfile.gettempdir())
+
+
+def _process_alive(pid: int) -> bool:
+    if os.name != "posix":
+        return True  # Sans signal 0, les répertoires des autres processus sont conservés
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def remove_stale_dirs(base_dirs=None):
+    """
+    Description : Supprime les répertoires de processus serveur arrêtés (panels et répertoires de travail qu'un
+    arrêt brutal n'a pas permis de libérer). Appelée au démarrage de l'application (voir main.create_app).
+
+    Paramètres :
+        base_dirs : Répertoires à examiner (par défaut SHARED_MEMORY_DIR, PANEL_REGISTRY_DIR, DISK_PANEL_DIR et
+                    le répertoire temporaire du système).
+    Renvoie : La liste des répertoires supprimés.
+
+    Processus :
+        Un répertoire backtest_<pid>_<jeton> est obsolète si le processus <pid> n'existe plus, ou si c'est le pid
+        de ce processus avec un autre jeton (processus précédent dont le pid a été réattribué). Les répertoires
+        des autres processus en cours d'exécution (plusieurs serveurs sur la même machine) sont conservés.
+    """
+    if base_dirs is None:
+        base_dirs = [SHARED_MEMORY_DIR, panel_registry.root_dir, DISK_PANEL_DIR, tempfile.gettempdir()]
+    removed = []
+    for base_dir in {os.path.abspath(base_dir) for base_dir in base_dirs if base_dir}:
+        try:
+            names = os.listdir(base_dir)
+        except OSError:
+            continue
+        for name in names:
+            pid, _, token = name[len(PROCESS_DIR_PREFIX):].partition("_")
+            if not name.startswith(PROCESS_DIR_PREFIX) or not pid.isdigit() or not token:
+                continue
+            if int(pid) == os.getpid():
+                stale = token != PROCESS_TOKEN
+            else:
+                stale = not _process_alive(int(pid))
+            path = os.path.join(base_dir, name)
+            if stale and os.path.isdir(path):
+                # Les fichiers des panels sont en lecture seule : seul le droit d'écriture du répertoire compte
+                shutil.rmtree(path, ignore_errors=True)
+                removed.append(path)
+    if removed:
+        print(f"Répertoires de processus arrêtés supprimés : {removed}")
+    return removed
+
+
+class PanelRegistry:
+    """
+    La classe PanelRegistry partage entre les backtests simultanés les données qu'ils transmettent aux workers.
+    Un panel (un .npy par colonne + manifeste, voir DataTransport.write_panel) est écrit une seule fois par
+    contenu, en lecture seule, puis référencé par toutes les requêtes portant sur les mêmes données : leurs
+    workers projettent en mémoire les mêmes fichiers, donc les mêmes pages. Chaque panel compte ses références
+    et est supprimé dès que la dernière requête qui l'utilise l'a libéré.
+    """
+    def __init__(self, root_dir: str = None):
+        self.root_dir = root_dir
+        self._lock = threading.Lock()
+        # Clé -> {"refs", "lock", "directory", "manifest"}
+        self._panels = {}
+        self._keys = {}
+
+    @staticmethod
+    def panel_key(dfs_dict: dict) -> str:
+        """
+        Description : Calcule la clé d'un panel : ordre des tickers, types des colonnes et empreinte du contenu
+        (voir ResultCache.data_fingerprint). Deux requêtes sur le même univers ne partagent un panel que si
+        leurs bougies sont identiques.
+        """
+        layout = [[ticker, str(df.index.dtype), [str(dtype) for dtype in df.dtypes]]
+                  for ticker, df in dfs_dict.items()]
+        key = {"layout": layout, "data": data_fingerprint(dfs_dict)}
+        return hashlib.sha256(json.dumps(key).encode()).hexdigest()
+
+    def _write(self, key, dfs_dict):
+        root = process_dir(self.root_dir) if self.root_dir else shared_memory_root(dfs_dict)
+        directory = tempfile.mkdtemp(prefix=f"panel_{key[:16]}_", dir=root)
+        try:
+            with Instrumentation.span("serialize_panel"):
+                manifest_path = DataTransport.write_panel(dfs_dict, directory)
+            size = 0
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                size += os.path.getsize(path)
+                # Le panel est immuable : les workers et les autres requêtes le lisent sans copie
+                os.chmod(path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        except Exception:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+        Instrumentation.count("bytes", size, kind="panel")
+        return directory, manifest_path
+
+    def acquire(self, dfs_dict: dict) -> str:
+        """
+        Description : Renvoie le manifeste d'un panel contenant les données, en l'écrivant uniquement si aucune
+        requête en cours n'utilise déjà les mêmes données.
+
+        Paramètres :
+            dfs_dict : Dictionnaire des DataFrames (un par ticker), dont toutes les colonnes sont numériques
+                       (voir DataTransport.can_write_frame).
+        Renvoie : Le chemin du manifeste. Il doit être libéré avec release().
+        """
+        key = PanelRegistry.panel_key(dfs_dict)
+        with self._lock:
+            entry = self._panels.setdefault(key, {"refs": 0, "lock": threading.Lock(), "directory": None,
+                                                  "manifest": None})
+            entry["refs"] += 1
+            self._publish()
+        try:
+            # Les requêtes simultanées sur les mêmes données attendent une écriture unique
+            with entry["lock"]:
+                hit = entry["manifest"] is not None
+                Instrumentation.cache_lookup("panel", hit=hit)
+                if not hit:
+                    directory, manifest_path = self._write(key, dfs_dict)
+                    with self._lock:
+                        entry["directory"], entry["manifest"] = directory, manifest_path
+                        self._keys[manifest_path] = key
+        except Exception:
+            self._unref(key)
+            raise
+        return entry["manifest"]
+
+    def _unref(self, key):
+        with self._lock:
+            entry = self._panels.get(key)
+            if entry is None:
+                return
+            entry["refs"] -= 1
+            if entry["refs"] > 0:
+                self._publish()
+                return
+            del self._panels[key]
+            self._keys.pop(entry["manifest"], None)
+            self._publish()
+            directory = entry["directory"]
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def release(self, manifest_path: str):
+        """
+        Description : Libère un panel obtenu avec acquire() ; il est supprimé lorsque plus aucune requête ne
+        l'utilise.
+        """
+        with self._lock:
+            key = self._keys.get(manifest_path)
+        if key is not None:
+            self._unref(key)
+
+    @contextmanager
+    def lease(self, dfs_dict: dict):
+        """
+        Description : Gestionnaire de contexte combinant acquire() et release().
+        """
+        manifest_path = self.acquire(dfs_dict)
+        try:
+            yield manifest_path
+        finally:
+            self.release(manifest_path)
+
+    def _publish(self):
+        # Appelée sous self._lock : panels partagés et requêtes qui les utilisent, exposés par /metrics
+        Instrumentation.registry.set("backtest_shared_panels", len(self._panels))
+        Instrumentation.registry.set("backtest_shared_panel_references",
+                                     sum(entry["refs"] for entry in self._panels.values()))
+
+
+panel_registry = PanelRegistry(root_dir=os.environ.get("PANEL_REGISTRY_DIR") or None)
@@ -0,0 +1,122 @@
+import ast
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+from VenvPool import VenvPool
+
+
+def strategy_fingerprint(source: str) -> str:
+    """
+    Description : Calcule l'empreinte d'une stratégie à partir de son arbre syntaxique, afin que deux sources ne
+    différant que par leur mise en forme (espaces, lignes vides, commentaires) aient la même empreinte.
+
+    Renvoie : Une empreinte hexadécimale. Si la source n'est pas du Python valide, l'empreinte porte sur le texte.
+    """
+    try:
+        normalized = ast.dump(ast.parse(source))
+    except SyntaxError:
+        normalized = source
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def data_fingerprint(dfs_dict: dict) -> str:
+    """
+    Description : Calcule l'empreinte des données d'entrée (tickers, dates, colonnes et valeurs de chaque DataFrame).
+
+    Renvoie : Une empreinte hexadécimale, identique tant qu'aucune bougie n'a été ajoutée ou modifiée.
+    """
+    digest = hashlib.sha256()
+    for ticker in sorted(dfs_dict):
+        df = dfs_dict[ticker]
+        digest.update(ticker.encode())
+        digest.update(json.dumps([str(column) for column in df.columns]).encode())
+        digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def panel_fingerprint(manifest_path: str, block_size: int = 1 << 20) -> str:
+    """
+    Description : Calcule l'empreinte des données d'un panel écrit sur disque (voir DataTransport.write_panel) en
+    lisant ses fichiers par blocs de block_size octets : l'équivalent de data_fingerprint pour des données qui ne
+    sont pas chargées en mémoire.
+    """
+    with open(manifest_path, "r") as file:
+        manifest = json.load(file)
+    directory = os.path.dirname(manifest_path)
+    digest = hashlib.sha256()
+    for ticker in sorted(manifest["frames"]):
+        meta = manifest["frames"][ticker]
+        digest.update(ticker.encode())
+        digest.update(json.dumps([column["name"] for column in meta["columns"]]).encode())
+        for name in [meta["index"]] + [column["file"] for column in meta["columns"]]:
+            with open(os.path.join(directory, name), "rb") as file:
+                for block in iter(lambda: file.read(block_size), b""):
+                    digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(func_strat: str, requirements: list, dfs_dict: dict, params: dict = None,
+              fingerprint: str = None) -> str:
+    """
+    Description : Construit la clé de cache d'un backtest à partir de la stratégie normalisée, des packages requis
+    normalisés, de l'empreinte des données et des éventuels paramètres passés à func_strat.
+
+    Paramètres :
+        fingerprint : Empreinte des données déjà calculée (voir panel_fingerprint), utilisée à la place de
+                      data_fingerprint(dfs_dict).
+    """
+    key = {
+        "strategy": strategy_fingerprint(func_strat),
+        "requirements": VenvPool.normalize_requirements(requirements),
+        "data": fingerprint or data_fingerprint(dfs_dict),
+        "params": params or {},
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    La classe ResultCache mémorise les résultats complets des backtests, adressés par le contenu de la requête
+    (voir cache_key). Une requête identique à une requête déjà calculée, par exemple une soumission en double ou une
+    réexécution programmée sans nouvelle bougie, est ainsi servie sans exécuter la stratégie.
+    Les entrées expirent après ttl secondes et les moins récemment utilisées sont évincées au-delà de max_entries.
+    """
+    def __init__(self, max_entries: int = 512, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        """
+        Description : Renvoie le résultat mémorisé pour une clé, ou None s'il est absent ou expiré.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, result = entry
+            if time.monotonic() - stored_at >= self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return result
+
+    def put(self, key: str, result):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+result_cache = ResultCache(max_entries=int(os.environ.get("BACKTEST_CACHE_SIZE", 512)),
+                           ttl=float(os.environ.get("BACKTEST_CACHE_TTL", 3600)))
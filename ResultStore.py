@@ -0,0 +1,150 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+import Instrumentation
+from CloudClients import cloud_clients
+
+
+class ResultNotFound(Exception):
+    """
+    Exception levée lorsqu'aucun résultat n'est enregistré pour un identifiant de requête.
+    """
+
+
+class LocalResultBackend:
+    """
+    Backend de stockage des résultats sur le disque local : un fichier JSON par requête dans root_dir.
+    Utilisable hors ligne, il lit également les fichiers sans extension du répertoire results/.
+    """
+    def __init__(self, root_dir: str = "results"):
+        self.root_dir = root_dir
+
+    def _path(self, request_id: str, extension: str = ".json"):
+        # Le request_id provient de l'utilisateur : il ne doit pas permettre de sortir de root_dir
+        if not request_id or os.path.basename(request_id) != request_id or request_id in (".", ".."):
+            raise ResultNotFound(f"Identifiant de requête invalide : {request_id}")
+        return os.path.join(self.root_dir, request_id + extension)
+
+    def download(self, request_id: str) -> str:
+        for extension in (".json", ""):
+            path = self._path(request_id, extension)
+            if os.path.isfile(path):
+                with open(path, encoding="utf-8") as file:
+                    return file.read()
+        raise ResultNotFound(request_id)
+
+    def upload(self, request_id: str, text: str):
+        path = self._path(request_id)
+        os.makedirs(self.root_dir, exist_ok=True)
+        # Écriture atomique : un lecteur concurrent ne voit jamais un fichier partiel
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            file.write(text)
+        os.replace(tmp_path, path)
+
+
+class GCSResultBackend:
+    """
+    Backend de stockage des résultats dans un bucket Google Cloud Storage ({request_id}.json).
+    Le client, partagé avec le reste du serveur (voir CloudClients), n'est créé qu'au premier accès.
+    """
+    def __init__(self, bucket_name: str = "results_api"):
+        self.bucket_name = bucket_name
+        self._bucket = None
+        self._lock = threading.Lock()
+
+    @property
+    def bucket(self):
+        with self._lock:
+            if self._bucket is None:
+                self._bucket = cloud_clients.storage().bucket(self.bucket_name)
+            return self._bucket
+
+    def download(self, request_id: str) -> str:
+        import google.cloud.exceptions
+        try:
+            return self.bucket.blob(f"{request_id}.json").download_as_text()
+        except google.cloud.exceptions.NotFound:
+            raise ResultNotFound(request_id)
+
+    def upload(self, request_id: str, text: str):
+        self.bucket.blob(f"{request_id}.json").upload_from_string(text, content_type="application/json")
+
+
+class ResultStore:
+    """
+    La classe ResultStore donne accès aux résultats des backtests, quel que soit le backend de stockage
+    (disque local ou Google Cloud Storage), derrière un cache LRU en mémoire. Les consultations répétées d'un même
+    request_id sont ainsi servies sans accès disque ni aller-retour réseau.
+    """
+    def __init__(self, backend, cache_size: int = 256, cache_ttl: float = 60):
+        self.backend = backend
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, request_id, result):
+        with self._lock:
+            self._cache[request_id] = (time.monotonic(), result)
+            self._cache.move_to_end(request_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def get(self, request_id: str):
+        """
+        Description : Renvoie le résultat enregistré pour une requête.
+
+        Processus :
+            Le résultat est lu dans le cache s'il y a été placé il y a moins de cache_ttl secondes ; passé ce délai,
+            il est relu dans le backend, les réexécutions programmées pouvant l'avoir mis à jour.
+        Renvoie : Le résultat désérialisé.
+        Exceptions : ResultNotFound si aucun résultat n'est enregistré pour cette requête.
+        """
+        with self._lock:
+            cached = self._cache.get(request_id)
+            if cached is not None and time.monotonic() - cached[0] < self.cache_ttl:
+                self._cache.move_to_end(request_id)
+                Instrumentation.cache_lookup("result_store", hit=True)
+                return cached[1]
+        Instrumentation.cache_lookup("result_store", hit=False)
+        result = json.loads(self.backend.download(request_id))
+        self._remember(request_id, result)
+        return result
+
+    def put(self, request_id: str, result):
+        """
+        Description : Enregistre le résultat d'une requête dans le backend et dans le cache.
+
+        Paramètres :
+            result : Résultat renvoyé par l'API (sérialisable en JSON).
+        """
+        self.backend.upload(request_id, json.dumps(result))
+        self._remember(request_id, result)
+
+    def invalidate(self, request_id: str):
+        with self._lock:
+            self._cache.pop(request_id, None)
+
+
+def backend_from_env():
+    """
+    Description : Construit le backend de stockage choisi par la variable d'environnement RESULT_STORE_BACKEND
+    ('gcs' par défaut, ou 'local').
+    """
+    backend = os.environ.get("RESULT_STORE_BACKEND", "gcs")
+    if backend == "local":
+        return LocalResultBackend(os.environ.get("RESULT_STORE_DIR", "results"))
+    if backend == "gcs":
+        return GCSResultBackend(os.environ.get("RESULT_STORE_BUCKET", "results_api"))
+    raise ValueError(f"Backend de stockage des résultats inconnu : {backend}")
+
+
+result_store = ResultStore(backend_from_env(),
+                           cache_size=int(os.environ.get("RESULT_CACHE_SIZE", 256)),
+                           cache_ttl=float(os.environ.get("RESULT_CACHE_TTL", 60)))
+
+# État des backtests récurrents (agrégats et date de la dernière bougie traitée), conservé entre deux exécutions
+recurring_state_store = ResultStore(LocalResultBackend(os.environ.get("RECURRING_STATE_DIR", "recurring_state")))
@@ -0,0 +1,128 @@
+import numpy as np
+
+# Séries calculées pour chaque fenêtre par rolling_metrics
+ROLLING_SERIES = ['return', 'volatility', 'sharpe', 'drawdown']
+
+
+def rolling_sum(x, window):
+    """
+    Description : Somme glissante sur window valeurs, par différence de sommes cumulées (O(n)).
+
+    Renvoie : Un tableau de même longueur que x ; les window - 1 premières valeurs (fenêtre incomplète) valent NaN.
+    """
+    x = np.asarray(x, dtype=float)
+    out = np.full(x.shape[0], np.nan)
+    if window > x.shape[0]:
+        return out
+    cumulative = np.concatenate([[0.0], np.cumsum(x)])
+    out[window - 1:] = cumulative[window:] - cumulative[:-window]
+    return out
+
+
+def rolling_max(x, window):
+    """
+    Description : Maximum glissant sur window valeurs en O(n), quelle que soit la taille de la fenêtre.
+
+    Processus :
+        Découpe la série en blocs de window valeurs et calcule, dans chaque bloc, le maximum cumulé depuis le début
+        du bloc (préfixe) et depuis la fin du bloc (suffixe). Une fenêtre couvre au plus deux blocs consécutifs :
+        son maximum est le maximum entre le suffixe de sa première valeur et le préfixe de sa dernière valeur
+        (algorithme de van Herk / Gil-Werman, équivalent vectorisé de la file monotone).
+    Renvoie : Un tableau de même longueur que x ; les window - 1 premières valeurs valent NaN.
+    """
+    x = np.asarray(x, dtype=float)
+    n = x.shape[0]
+    out = np.full(n, np.nan)
+    if window > n:
+        return out
+    blocks = np.concatenate([x, np.full((-n) % window, -np.inf)]).reshape(-1, window)
+    prefix = np.maximum.accumulate(blocks, axis=1).ravel()
+    suffix = np.maximum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+    out[window - 1:] = np.maximum(suffix[:n - window + 1], prefix[window - 1:n])
+    return out
+
+
+def drawdown_series(r):
+    """
+    Description : Calcule la courbe de drawdown (courbe « underwater ») d'une série de rendements.
+
+    Renvoie : Un couple (drawdown à chaque date, nombre de bougies écoulées depuis le dernier plus haut). Le
+    drawdown est l'écart relatif entre la valeur du portefeuille et son plus haut historique, le capital initial
+    comptant comme premier plus haut.
+    """
+    r = np.asarray(r, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        wealth = np.exp(np.cumsum(np.log1p(r)))
+        peak = np.maximum.accumulate(np.maximum(wealth, 1.0))
+        drawdown = wealth / peak - 1
+    positions = np.arange(r.shape[0])
+    last_peak = np.maximum.accumulate(np.where(wealth >= peak, positions, -1))
+    return drawdown, positions - last_peak
+
+
+def rolling_metrics(r, windows, rf_rate=0.2, scale=9):
+    """
+    Description : Calcule des métriques glissantes pour chaque taille de fenêtre, en O(n) par fenêtre à partir de
+    sommes cumulées, au lieu de recalculer Stats sur chaque tranche (O(n²)).
+
+    Paramètres :
+        r : Rendements de l'indice, dans l'ordre chronologique.
+        windows : Tailles des fenêtres, en nombre de bougies.
+        rf_rate : Taux sans risque annuel.
+        scale : Nombre de périodes par an utilisé pour l'annualisation.
+    Renvoie : Un dictionnaire {fenêtre: {série: tableau}} avec, pour chaque date, sur les window dernières bougies :
+        return : le rendement annualisé (même définition que le rendement annuel de Stats) ;
+        volatility : la volatilité annualisée (écart-type d'échantillon) ;
+        sharpe : le ratio de Sharpe (même définition que Stats) ;
+        drawdown : l'écart relatif entre la valeur du portefeuille et son plus haut de la fenêtre.
+    Les dates dont la fenêtre est incomplète valent NaN.
+    """
+    r = np.asarray(r, dtype=float)
+    rf_per_period = (1 + rf_rate) ** (1 / scale) - 1
+    # Les données sont centrées sur leur moyenne pour limiter les erreurs d'annulation de la variance
+    centered = r - r.mean() if r.shape[0] else r
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_growth = np.log1p(r)
+        log_excess = np.log1p(r - rf_per_period)
+        log_wealth = np.cumsum(log_growth)
+        series = {}
+        for window in windows:
+            if window < 2:
+                raise ValueError(f"Une fenêtre glissante doit contenir au moins 2 bougies : {window}")
+            sum_r = rolling_sum(centered, window)
+            sum_sq = rolling_sum(centered * centered, window)
+            volatility = np.sqrt(np.maximum(sum_sq - sum_r * sum_r / window, 0) / (window - 1)) * np.sqrt(scale)
+            annual = np.exp(rolling_sum(log_growth, window) * scale / window) - 1
+            excess = np.exp(rolling_sum(log_excess, window) * scale / window) - 1
+            series[window] = {
+                'return': annual,
+                'volatility': volatility,
+                'sharpe': excess / volatility,
+                'drawdown': np.exp(log_wealth - rolling_max(log_wealth, window)) - 1,
+            }
+    return series
+
+
+def series_to_dict(r, windows, index=None, rf_rate=0.2, scale=9):
+    """
+    Description : Rassemble les séries de suivi d'une série de rendements sous une forme sérialisable en JSON :
+    dates, rendements, courbe de drawdown, durée sous l'eau et métriques glissantes de chaque fenêtre. Les
+    valeurs non définies sont remplacées par None.
+    """
+    r = np.asarray(r, dtype=float)
+    drawdown, underwater = drawdown_series(r)
+
+    def as_list(values):
+        values = np.asarray(values, dtype=float).astype(object)
+        values[~np.isfinite(values.astype(float))] = None
+        return values.tolist()
+
+    return {
+        'index': [str(date) for date in index] if index is not None else list(range(r.shape[0])),
+        'returns': as_list(r),
+        'drawdown': as_list(drawdown),
+        'underwater_bars': underwater.tolist(),
+        'windows': {str(window): {name: as_list(values) for name, values in metrics.items()}
+                    for window, metrics in rolling_metrics(r, windows, rf_rate, scale).items()},
+    }
+
@@ -0,0 +1,142 @@
+import numpy as np
+
+
+class PortfolioSimulator:
+    """
+    La classe PortfolioSimulator s'intercale entre les poids renvoyés par la stratégie et le calcul des statistiques :
+    elle calcule la rotation du portefeuille (turnover) à chaque bougie, en déduit les frais et le glissement
+    (slippage) et, si demandé, simule la dérive des poids entre deux rééquilibrages.
+    Tous les calculs sont vectorisés sur les bougies et sur les actifs (aucune boucle Python par bougie), et
+    acceptent un lot de jeux de poids (dimensions ..., dates x tickers). L'état renvoyé par run permet d'enchaîner
+    les blocs d'une exécution par blocs ou les exécutions d'un backtest récurrent.
+    """
+    def __init__(self, fee_bps: float = 0.0, slippage_bps: float = 0.0, drift: bool = False,
+                 rebalance_every: int = None):
+        if fee_bps < 0 or slippage_bps < 0:
+            raise ValueError("Les frais et le glissement doivent être positifs")
+        if rebalance_every is not None and rebalance_every < 1:
+            raise ValueError("rebalance_every doit être un entier strictement positif")
+        self.fee_bps = fee_bps
+        self.slippage_bps = slippage_bps
+        self.drift = drift
+        self.rebalance_every = rebalance_every
+
+    @classmethod
+    def from_user_input(cls, user_input):
+        """
+        Description : Construit le simulateur décrit par une requête.
+
+        Renvoie : Une instance de PortfolioSimulator, ou None si la requête ne demande ni frais, ni glissement,
+        ni dérive des poids (les poids sont alors appliqués sans friction, comme auparavant).
+        """
+        simulator = cls(user_input.fee_bps or 0.0, user_input.slippage_bps or 0.0, bool(user_input.drift),
+                        user_input.rebalance_every)
+        return simulator if simulator.active else None
+
+    @property
+    def active(self):
+        return bool(self.fee_bps or self.slippage_bps or self.drift or self.rebalance_every)
+
+    @property
+    def cost_rate(self):
+        # Coût par unité de notionnel échangé
+        return (self.fee_bps + self.slippage_bps) / 1e4
+
+    def config(self):
+        return {"fee_bps": self.fee_bps, "slippage_bps": self.slippage_bps, "drift": self.drift,
+                "rebalance_every": self.rebalance_every}
+
+    @staticmethod
+    def initial_state(shape):
+        """
+        Description : Renvoie l'état d'un portefeuille vide (aucune position), pour des poids de dimensions
+        shape (..., tickers).
+        """
+        return {"holdings": np.zeros(shape), "target": np.zeros(shape), "bar": 0}
+
+    def run(self, returns, targets, state=None):
+        """
+        Description : Simule le portefeuille sur un bloc de bougies.
+
+        Paramètres :
+            returns : Rendements des actifs (dates x tickers), éventuellement avec des dimensions de lot en tête.
+            targets : Poids cibles renvoyés par la stratégie, alignés sur returns (..., dates x tickers).
+            state : État à la fin du bloc précédent (None pour un portefeuille vide).
+        Renvoie : Un quadruplet (rendements nets de l'indice, turnover, coûts, nouvel état), les trois premiers
+        de dimensions (..., dates).
+
+        Processus :
+            Sans dérive, les poids détenus sont les poids cibles et le turnover d'une bougie est la somme des
+            variations absolues des poids.
+            Avec dérive, le portefeuille n'est rééquilibré qu'aux bougies où les poids cibles changent, ainsi que
+            toutes les rebalance_every bougies si ce paramètre est renseigné ; entre deux rééquilibrages, la valeur
+            de chaque position évolue avec son rendement (la part non investie, 1 - somme des poids, étant
+            rémunérée à 0). Les poids détenus sont obtenus en forme close, à partir de la somme cumulée des
+            log-rendements remise à zéro à chaque rééquilibrage. Le turnover d'un rééquilibrage est l'écart
+            entre les poids cibles et les poids ayant dérivé.
+            Les coûts valent turnover x (fee_bps + slippage_bps) / 10000 et sont déduits du rendement brut.
+        """
+        returns = np.asarray(returns, dtype=float)
+        targets = np.asarray(targets, dtype=float)
+        n_bars = targets.shape[-2]
+        if state is None:
+            state = self.initial_state(targets.shape[:-2] + targets.shape[-1:])
+        holdings = np.asarray(state["holdings"], dtype=float)
+        previous_target = np.asarray(state["target"], dtype=float)
+        if n_bars == 0:
+            empty = np.zeros(targets.shape[:-1])
+            return empty, empty, empty, state
+
+        if not self.drift:
+            previous = np.concatenate([previous_target[..., None, :], targets[..., :-1, :]], axis=-2)
+            turnover = np.abs(targets - previous).sum(axis=-1)
+            gross = np.einsum('...tn,...tn->...t', targets, np.broadcast_to(returns, targets.shape))
+            new_holdings = targets[..., -1, :]
+        else:
+            gross, turnover, new_holdings = self._run_drift(returns, targets, holdings, previous_target,
+                                                            state["bar"])
+
+        costs = turnover * self.cost_rate
+        new_state = {"holdings": new_holdings, "target": targets[..., -1, :], "bar": state["bar"] + n_bars}
+        return gross - costs, turnover, costs, new_state
+
+    def _run_drift(self, returns, targets, holdings, previous_target, first_bar):
+        n_bars = targets.shape[-2]
+        returns = np.broadcast_to(returns, targets.shape)
+        bars = np.arange(n_bars)
+
+        # Bougies de rééquilibrage : changement des poids cibles, ou échéance périodique
+        previous = np.concatenate([previous_target[..., None, :], targets[..., :-1, :]], axis=-2)
+        rebalance = np.any(targets != previous, axis=-1)
+        if self.rebalance_every:
+            rebalance |= (first_bar + bars) % self.rebalance_every == 0
+
+        # Poids au début de chaque segment : poids cibles s'il y a rééquilibrage, poids détenus sinon (la
+        # première bougie du bloc ouvre toujours un segment)
+        start_weights = np.where(rebalance[..., None], targets, np.nan)
+        start_weights[..., 0, :] = np.where(rebalance[..., :1], targets[..., 0, :], holdings)
+        segment_start = np.where(rebalance, bars, 0)
+        np.maximum.accumulate(segment_start, axis=-1, out=segment_start)
+        segment_start = segment_start[..., None]
+        start_weights = np.take_along_axis(start_weights, segment_start, axis=-2)
+
+        # Croissance de chaque position depuis le début de son segment, jusqu'à la bougie précédente incluse
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_growth = np.cumsum(np.log1p(returns), axis=-2)
+            log_growth = np.concatenate([np.zeros_like(log_growth[..., :1, :]), log_growth[..., :-1, :]], axis=-2)
+            growth = np.exp(log_growth - np.take_along_axis(log_growth, segment_start, axis=-2))
+            values = start_weights * growth
+            portfolio = 1 - start_weights.sum(axis=-1) + values.sum(axis=-1)
+            weights = np.nan_to_num(values / portfolio[..., None])
+            gross = np.einsum('...tn,...tn->...t', weights, returns)
+            # Poids ayant dérivé à l'issue de chaque bougie, avant un éventuel rééquilibrage à la suivante
+            drifted = np.nan_to_num(weights * (1 + returns) / (1 + gross[..., None]))
+
+        before = np.concatenate([holdings[..., None, :], drifted[..., :-1, :]], axis=-2)
+        turnover = np.where(rebalance, np.abs(targets - before).sum(axis=-1), 0.0)
+        return gross, turnover, drifted[..., -1, :]
+
+    @staticmethod
+    def state_to_json(state):
+        return {"holdings": np.asarray(state["holdings"]).tolist(), "target": np.asarray(state["target"]).tolist(),
+                "bar": int(state["bar"])}
@@ -0,0 +1,267 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from importlib import metadata
+import Instrumentation
+
+# Packages déjà installés avec l'interpréteur du serveur, utilisables sans environnement virtuel
+DEFAULT_HOST_PACKAGES = "numpy,pandas,scipy"
+
+
+class VenvPool:
+    """
+    La classe VenvPool maintient un ensemble d'environnements virtuels Python pré-construits et réutilisables,
+    indexés par l'ensemble normalisé des packages requis par la stratégie de l'utilisateur. Un environnement
+    est construit une seule fois puis partagé entre les requêtes ; les environnements les moins récemment
+    utilisés sont supprimés lorsque le nombre maximal d'environnements ou le budget disque est dépassé.
+    Une stratégie qui ne requiert que des packages de host_packages, déjà installés avec le serveur, s'exécute
+    directement avec l'interpréteur du serveur, dans un worker isolé (voir interpreter), sauf si le serveur
+    s'exécute en tant que root.
+    """
+    MANIFEST = "pool_manifest.json"
+
+    def __init__(self, root_dir: str = "venvs", max_envs: int = 8, max_disk_bytes: int = 5 * 1024 ** 3,
+                 host_packages=None):
+        self.root_dir = os.path.abspath(root_dir)
+        self.host_packages = set(VenvPool.normalize_requirements(host_packages or []))
+        self._host_versions = {}
+        self.max_envs = max_envs
+        self.max_disk_bytes = max_disk_bytes
+        self._lock = threading.Lock()
+        self._build_locks = {}
+        self._in_use = {}
+        # Clé -> taille sur disque, dans l'ordre LRU (le plus ancien en premier)
+        self._envs = OrderedDict()
+        self._loaded = False
+
+    @staticmethod
+    def normalize_requirements(requirements):
+        """
+        Description : Normalise une liste de packages (casse, séparateurs, doublons, ordre) afin que deux listes
+        équivalentes produisent la même clé d'environnement.
+
+        Paramètres :
+            requirements : Liste des packages requis, éventuellement avec un spécificateur de version.
+        Renvoie : Une liste triée de packages normalisés.
+        """
+        normalized = set()
+        for requirement in requirements:
+            requirement = requirement.strip()
+            if not requirement:
+                continue
+            match = re.match(r"^([A-Za-z0-9][A-Za-z0-9._-]*)(.*)$", requirement)
+            if match is None:
+                normalized.add(requirement)
+                continue
+            name = re.sub(r"[-_.]+", "-", match.group(1)).lower()
+            specifier = re.sub(r"\s+", "", match.group(2))
+            normalized.add(name + specifier)
+        return sorted(normalized)
+
+    @staticmethod
+    def env_key(requirements):
+        """
+        Description : Calcule la clé d'un environnement à partir de l'ensemble normalisé des packages requis.
+
+        Renvoie : Une empreinte hexadécimale courte identifiant l'environnement.
+        """
+        normalized = VenvPool.normalize_requirements(requirements)
+        return hashlib.sha256(json.dumps(normalized).encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def python_path(env_dir):
+        """
+        Description : Renvoie le chemin de l'interpréteur Python d'un environnement virtuel.
+        """
+        return os.path.join(env_dir, "Scripts" if os.name == "nt" else "bin", "python")
+
+    @staticmethod
+    def _run(*args):
+        try:
+            subprocess.run(args, check=True, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(f"Subprocess failed: {e.stderr}") from e
+
+    @staticmethod
+    def _disk_usage(path):
+        total = 0
+        for dirpath, _, filenames in os.walk(path):
+            for filename in filenames:
+                file_path = os.path.join(dirpath, filename)
+                if not os.path.islink(file_path):
+                    total += os.path.getsize(file_path)
+        return total
+
+    def _env_dir(self, key):
+        return os.path.join(self.root_dir, key)
+
+    def _load_existing(self):
+        """
+        Description : Recharge les environnements déjà présents sur disque (après un redémarrage du serveur),
+        ordonnés selon leur date de dernière utilisation.
+        """
+        self._loaded = True
+        if not os.path.isdir(self.root_dir):
+            return
+        found = []
+        for key in os.listdir(self.root_dir):
+            manifest_path = os.path.join(self._env_dir(key), VenvPool.MANIFEST)
+            if key.startswith(".") or not os.path.isfile(manifest_path):
+                continue
+            with open(manifest_path, "r") as file:
+                manifest = json.load(file)
+            found.append((os.path.getmtime(manifest_path), key, manifest.get("size", 0)))
+        for _, key, size in sorted(found):
+            self._envs[key] = size
+
+    def _build(self, key, requirements):
+        """
+        Description : Construit un nouvel environnement et installe les packages requis. Le manifeste n'est
+        écrit qu'une fois l'installation terminée : un environnement sans manifeste est considéré comme
+        incomplet et n'est jamais réutilisé.
+
+        Renvoie : La taille sur disque de l'environnement construit.
+        """
+        env_dir = self._env_dir(key)
+        shutil.rmtree(env_dir, ignore_errors=True)
+        os.makedirs(self.root_dir, exist_ok=True)
+        packages = VenvPool.normalize_requirements(requirements)
+        try:
+            VenvPool._run(sys.executable, "-m", "venv", env_dir)
+            if packages:
+                # Une seule invocation de pip pour l'ensemble des packages
+                VenvPool._run(VenvPool.python_path(env_dir), "-m", "pip", "install",
+                              "--disable-pip-version-check", "-q", *packages)
+            size = VenvPool._disk_usage(env_dir)
+            with open(os.path.join(env_dir, VenvPool.MANIFEST), "w") as file:
+                json.dump({"requirements": packages, "size": size, "created": time.time()}, file)
+        except Exception:
+            shutil.rmtree(env_dir, ignore_errors=True)
+            raise
+        return size
+
+    def _evict(self):
+        """
+        Description : Supprime les environnements les moins récemment utilisés tant que le nombre maximal
+        d'environnements ou le budget disque est dépassé. Les environnements en cours d'utilisation sont conservés.
+        """
+        for key in list(self._envs.keys()):
+            total_size = sum(self._envs.values())
+            if len(self._envs) <= self.max_envs and total_size <= self.max_disk_bytes:
+                break
+            if self._in_use.get(key, 0) > 0:
+                continue
+            del self._envs[key]
+            shutil.rmtree(self._env_dir(key), ignore_errors=True)
+            print(f"Environnement {key} supprimé du pool.")
+
+    def acquire(self, requirements):
+        """
+        Description : Renvoie le répertoire d'un environnement virtuel contenant les packages requis, en le
+        construisant uniquement s'il n'existe pas encore dans le pool.
+
+        Paramètres :
+            requirements : Liste des packages requis par la stratégie de l'utilisateur.
+        Renvoie : Le chemin absolu de l'environnement virtuel. Il doit être libéré avec release().
+        """
+        key = VenvPool.env_key(requirements)
+        with self._lock:
+            if not self._loaded:
+                self._load_existing()
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+            self._in_use[key] = self._in_use.get(key, 0) + 1
+        try:
+            # Les requêtes concurrentes sur le même ensemble de packages attendent une construction unique
+            with build_lock:
+                with self._lock:
+                    ready = key in self._envs and os.path.exists(VenvPool.python_path(self._env_dir(key)))
+                Instrumentation.cache_lookup("venv", hit=ready)
+                if not ready:
+                    with Instrumentation.span("venv_build"):
+                        size = self._build(key, requirements)
+                    with self._lock:
+                        self._envs[key] = size
+                Instrumentation.emit("venv_ready", cached=ready)
+        except Exception:
+            with self._lock:
+                self._in_use[key] -= 1
+            raise
+        with self._lock:
+            self._envs.move_to_end(key)
+            os.utime(os.path.join(self._env_dir(key), VenvPool.MANIFEST))
+            self._evict()
+        return self._env_dir(key)
+
+    def release(self, env_dir):
+        """
+        Description : Libère un environnement obtenu avec acquire() pour qu'il puisse de nouveau être évincé.
+        """
+        key = os.path.basename(env_dir)
+        with self._lock:
+            self._in_use[key] = max(self._in_use.get(key, 0) - 1, 0)
+            self._evict()
+
+    @contextmanager
+    def lease(self, requirements):
+        """
+        Description : Gestionnaire de contexte combinant acquire() et release().
+        """
+        env_dir = self.acquire(requirements)
+        try:
+            yield env_dir
+        finally:
+            self.release(env_dir)
+
+    def host_compatible(self, requirements):
+        """
+        Description : Indique si une stratégie peut s'exécuter avec l'interpréteur du serveur : chaque package
+        requis fait partie de host_packages, sans spécificateur de version, et est installé sur le serveur.
+        Toujours faux en tant que root : les limites du noyau du worker isolé (RLIMIT_NPROC) sont alors sans
+        effet, la stratégie s'exécute dans un environnement virtuel.
+        """
+        if hasattr(os, "geteuid") and os.geteuid() == 0:
+            return False
+        for requirement in VenvPool.normalize_requirements(requirements):
+            if requirement not in self.host_packages:
+                return False
+            if requirement not in self._host_versions:
+                try:
+                    self._host_versions[requirement] = metadata.version(requirement)
+                except metadata.PackageNotFoundError:
+                    self._host_versions[requirement] = None
+            if self._host_versions[requirement] is None:
+                return False
+        return True
+
+    @contextmanager
+    def interpreter(self, requirements):
+        """
+        Description : Gestionnaire de contexte fournissant l'interpréteur Python avec lequel exécuter une stratégie.
+
+        Processus :
+            Si tous les packages requis sont déjà installés avec le serveur (voir host_compatible), renvoie
+            l'interpréteur du serveur : aucun environnement n'est construit ni verrouillé, et WorkerPool exécute
+            alors la stratégie dans un worker isolé. Sinon, obtient un environnement du pool avec lease().
+        Renvoie : Le chemin de l'interpréteur Python.
+        """
+        if self.host_compatible(requirements):
+            Instrumentation.cache_lookup("venv", hit=True)
+            Instrumentation.emit("venv_ready", cached=True, host=True)
+            yield sys.executable
+            return
+        with self.lease(requirements) as env_dir:
+            yield VenvPool.python_path(env_dir)
+
+
+venv_pool = VenvPool(root_dir=os.environ.get("VENV_POOL_DIR", "venvs"),
+                     max_envs=int(os.environ.get("VENV_POOL_MAX_ENVS", 8)),
+                     max_disk_bytes=int(os.environ.get("VENV_POOL_MAX_BYTES", 5 * 1024 ** 3)),
+                     host_packages=os.environ.get("HOST_PACKAGES", DEFAULT_HOST_PACKAGES).split(","))
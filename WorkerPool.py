@@ -0,0 +1,251 @@
+import json
+import os
+import queue
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from JobQueue import JobCancelled
+import Instrumentation
+
+
+class StrategyWorker:
+    """
+    La classe StrategyWorker représente un processus Python de longue durée exécutant script_wrapper.py en mode
+    worker dans un environnement virtuel donné. Le processus garde pandas et numpy importés entre les jobs et
+    communique avec le serveur par des lignes JSON sur ses entrées/sorties standard. Chaque job s'exécute dans un
+    processus enfant créé par fork depuis le worker (voir script_wrapper.run_forked) : un job ne peut pas modifier
+    l'état vu par les jobs suivants.
+    """
+    def __init__(self, python_executable, wrapper_path, max_jobs, memory_limit=None, work_dir=None, sandbox=False):
+        self.python_executable = python_executable
+        self.wrapper_path = os.path.abspath(wrapper_path)
+        self.max_jobs = max_jobs
+        self.memory_limit = memory_limit
+        self.work_dir = work_dir
+        # Worker exécuté avec l'interpréteur du serveur : isolé par script_wrapper.Sandbox
+        self.sandbox = sandbox
+        self.jobs_done = 0
+        self.process = None
+        self._messages = None
+
+    def start(self, timeout):
+        """
+        Description : Démarre le processus worker et attend qu'il signale avoir terminé ses imports.
+        """
+        args = [self.python_executable, self.wrapper_path, "--worker", str(self.max_jobs)]
+        if self.memory_limit:
+            args.append(str(self.memory_limit))
+        if self.sandbox:
+            args.append("--sandbox")
+        # Groupe de processus propre au worker : close() arrête aussi le processus du job en cours
+        self.process = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE, text=True, bufsize=1, cwd=self.work_dir,
+                                        start_new_session=os.name == "posix")
+        # Le code utilisateur écrit sur stderr : il est vidé en continu pour ne pas bloquer le worker
+        threading.Thread(target=self._drain_stderr, daemon=True).start()
+        # Les lignes du protocole sont lues par un thread dédié : une ligne déjà lue dans le tampon du pipe
+        # est ainsi toujours disponible, même si aucune nouvelle donnée n'arrive sur le descripteur
+        self._messages = queue.Queue()
+        threading.Thread(target=self._read_stdout, args=(self.process.stdout, self._messages), daemon=True).start()
+        self._read_message(timeout)
+
+    def _drain_stderr(self):
+        for line in self.process.stderr:
+            print(f"Worker {self.process.pid} stderr: {line.rstrip()}")
+
+    @staticmethod
+    def _read_stdout(stdout, messages):
+        for line in stdout:
+            messages.put(line)
+        # Fin du flux : le worker s'est arrêté
+        messages.put(None)
+
+    def _read_message(self, timeout, cancel_event=None):
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.close()
+                raise RuntimeError(f"Le worker n'a pas répondu dans le délai imparti ({timeout} s)")
+            # Attente par tranches courtes pour réagir rapidement à une annulation
+            try:
+                line = self._messages.get(timeout=min(remaining, 0.2))
+                break
+            except queue.Empty:
+                pass
+            if cancel_event is not None and cancel_event.is_set():
+                self.close()
+                raise JobCancelled("Le job a été annulé pendant l'exécution de la stratégie")
+        if line is None:
+            return_code = self.process.wait()
+            raise RuntimeError(f"Le worker s'est arrêté de manière inattendue (code {return_code}), "
+                               f"limite de ressources probablement dépassée")
+        return json.loads(line)
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.poll() is None and self.jobs_done < self.max_jobs
+
+    def run_job(self, job, timeout, cancel_event=None):
+        """
+        Description : Envoie un job au worker et attend son résultat.
+
+        Paramètres :
+            job : Dictionnaire décrivant le job (chemins des données et de la stratégie, limite CPU).
+            timeout : Durée maximale d'attente en secondes ; au-delà, le worker est tué.
+            cancel_event : Évènement dont l'activation tue le worker et interrompt le job (optionnel).
+        Renvoie : La sortie de la stratégie (chaîne JSON des poids).
+
+        Processus :
+            Les lignes d'avancement envoyées par le worker avant sa réponse (exécution par blocs) sont publiées
+            comme évènements strategy_progress de la trace du job.
+        """
+        self.process.stdin.write(json.dumps(job) + "\n")
+        self.process.stdin.flush()
+        deadline = time.monotonic() + timeout
+        response = self._read_message(timeout, cancel_event)
+        while "progress" in response:
+            Instrumentation.emit("strategy_progress", **response["progress"])
+            response = self._read_message(deadline - time.monotonic(), cancel_event)
+        self.jobs_done += 1
+        Instrumentation.worker_usage(response.get("cpu"), response.get("max_rss"))
+        if not response["ok"]:
+            raise RuntimeError(f"Subprocess failed: {response['error']}")
+        return response["result"]
+
+    def close(self):
+        if self.process is None:
+            return
+        if os.name == "posix":
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        elif self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+
+
+class WorkerPool:
+    """
+    La classe WorkerPool gère des workers de stratégie pré-démarrés pour chaque environnement virtuel. Les workers
+    sont réutilisés d'un backtest à l'autre, ce qui évite de payer à chaque requête le démarrage de l'interpréteur
+    et l'import de pandas, et sont recyclés après un nombre fixe de jobs. Le pool est partagé par toutes les
+    requêtes : au plus workers_per_env jobs s'exécutent simultanément par environnement, et une requête qui
+    répartit plusieurs tâches (balayage, comparaison, walk-forward) en exécute au plus max_parallel_per_request
+    à la fois (voir parallelism).
+    """
+    def __init__(self, workers_per_env: int = 2, max_jobs_per_worker: int = 50, job_timeout: float = 600,
+                 cpu_limit: int = 600, memory_limit: int = None, wrapper_path: str = None,
+                 max_parallel_per_request: int = None):
+        self.workers_per_env = workers_per_env
+        self.max_parallel_per_request = max_parallel_per_request or workers_per_env
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.job_timeout = job_timeout
+        self.cpu_limit = cpu_limit
+        self.memory_limit = memory_limit
+        # Par défaut, le script_wrapper.py situé à côté de ce module, quel que soit le répertoire courant
+        self.wrapper_path = os.path.abspath(wrapper_path or os.path.join(os.path.dirname(__file__),
+                                                                         "script_wrapper.py"))
+        self._lock = threading.Lock()
+        self._idle = defaultdict(list)
+        self._slots = {}
+
+    def _slot(self, python_executable):
+        with self._lock:
+            if python_executable not in self._slots:
+                self._slots[python_executable] = threading.BoundedSemaphore(self.workers_per_env)
+            return self._slots[python_executable]
+
+    def _spawn(self, python_executable):
+        # Sans environnement virtuel propre, la stratégie partage l'installation du serveur : le worker est isolé.
+        # Les chemins ne sont pas résolus : l'interpréteur d'un venv est un lien vers celui du système.
+        sandbox = os.path.abspath(python_executable) == os.path.abspath(sys.executable)
+        worker = StrategyWorker(python_executable, self.wrapper_path, self.max_jobs_per_worker,
+                                memory_limit=self.memory_limit, sandbox=sandbox)
+        worker.start(self.job_timeout)
+        return worker
+
+    def prestart(self, python_executable):
+        """
+        Description : Démarre à l'avance les workers d'un environnement pour que la première requête
+        n'attende pas leur initialisation.
+        """
+        with self._lock:
+            missing = self.workers_per_env - len(self._idle[python_executable])
+        for _ in range(max(missing, 0)):
+            worker = self._spawn(python_executable)
+            with self._lock:
+                self._idle[python_executable].append(worker)
+
+    def run(self, python_executable, data_path, function_path, output_dir=None, params=None, timeout=None,
+            cancel_event=None, chunks=None):
+        """
+        Description : Exécute une stratégie dans un worker de l'environnement donné, en réutilisant un worker
+        inactif ou en en démarrant un nouveau si nécessaire.
+
+        Paramètres :
+            python_executable : Interpréteur de l'environnement virtuel de la stratégie.
+            data_path : Chemin vers le fichier de données.
+            function_path : Chemin vers le script de la stratégie de l'utilisateur.
+            output_dir : Répertoire où la stratégie écrit ses poids au format binaire (optionnel).
+            params : Arguments nommés supplémentaires passés à func_strat (optionnel).
+            timeout : Durée maximale du job en secondes (par défaut job_timeout).
+            cancel_event : Évènement dont l'activation interrompt le job (optionnel).
+            chunks : Blocs temporels d'une exécution par blocs (optionnel, voir Wrapper.fonction_run_chunks).
+        Renvoie : La sortie de la stratégie (poids en JSON ou référence vers leur manifeste binaire).
+        """
+        job = {"data_path": os.path.abspath(data_path), "function_path": os.path.abspath(function_path),
+               "output_dir": os.path.abspath(output_dir) if output_dir else None, "params": params,
+               "cpu_limit": self.cpu_limit, "chunks": chunks}
+        with self._slot(python_executable):
+            with self._lock:
+                idle = self._idle[python_executable]
+                worker = idle.pop() if idle else None
+            if worker is None or not worker.alive:
+                if worker is not None:
+                    worker.close()
+                with Instrumentation.span("worker_start"):
+                    worker = self._spawn(python_executable)
+            try:
+                with Instrumentation.span("strategy"):
+                    result = worker.run_job(job, timeout or self.job_timeout, cancel_event)
+            except Exception:
+                worker.close()
+                raise
+            if worker.alive:
+                with self._lock:
+                    self._idle[python_executable].append(worker)
+            else:
+                # Le worker a atteint son nombre maximal de jobs : il est recyclé
+                worker.close()
+            return result
+
+    def parallelism(self, n_tasks):
+        """
+        Description : Nombre de tâches d'une même requête à soumettre simultanément au pool.
+
+        Renvoie : n_tasks borné par max_parallel_per_request et par workers_per_env (au moins 1). Les tâches
+        prennent leurs workers dans le pool partagé : les requêtes simultanées se partagent les mêmes workers
+        déjà démarrés, sans jamais dépasser workers_per_env jobs par environnement.
+        """
+        return max(min(n_tasks, self.max_parallel_per_request, self.workers_per_env), 1)
+
+    def shutdown(self):
+        with self._lock:
+            workers = [worker for idle in self._idle.values() for worker in idle]
+            self._idle.clear()
+        for worker in workers:
+            worker.close()
+
+
+worker_pool = WorkerPool(workers_per_env=int(os.environ.get("WORKERS_PER_ENV", 2)),
+                         max_jobs_per_worker=int(os.environ.get("WORKER_MAX_JOBS", 50)),
+                         job_timeout=float(os.environ.get("WORKER_JOB_TIMEOUT", 600)),
+                         cpu_limit=int(os.environ.get("WORKER_CPU_LIMIT", 600)),
+                         memory_limit=int(os.environ["WORKER_MEMORY_LIMIT"]) if "WORKER_MEMORY_LIMIT" in os.environ
+                         else None,
+                         max_parallel_per_request=int(os.environ.get("WORKER_PARALLELISM_PER_REQUEST", 0)) or None)
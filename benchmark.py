@@ -0,0 +1,320 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+import DataTransport
+from CandleStore import INTERVAL_MS, CandleStore
+from Data_collector import DataCollector
+from BacktestHandler import BacktestHandler
+from ResultCache import result_cache
+from VenvPool import venv_pool
+from WorkerPool import worker_pool
+
+# Stratégie de référence : croisement de moyennes mobiles, en pandas uniquement
+STRATEGY = """
+import pandas as pd
+
+def func_strat(dfs_dict):
+    closes = pd.DataFrame({ticker: df["Close"] for ticker, df in dfs_dict.items()})
+    signal = (closes.rolling(10).mean() > closes.rolling(50).mean()).astype(float)
+    return signal.div(signal.sum(axis=1).replace(0, 1), axis=0)
+"""
+
+# Mesure du démarrage, exécutée dans un nouvel interpréteur : import de main, puis démarrage de l'application et
+# première réponse (le client de test est importé hors des mesures)
+STARTUP_PROBE = """
+import json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+ready = time.perf_counter()
+with TestClient(main.app) as client:
+    status = client.get("/metrics").status_code
+answered = time.perf_counter()
+print(json.dumps({"import_s": imported - start, "first_response_s": answered - ready, "status": status}))
+"""
+
+
+class FakeBinanceHandler(BaseHTTPRequestHandler):
+    """
+    Serveur de bougies synthétiques reproduisant la route /api/v3/klines de Binance. Les prix sont une fonction
+    déterministe du symbole et de la date d'ouverture : deux exécutions du benchmark reçoivent les mêmes données.
+    """
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        query = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+        step = INTERVAL_MS[query["interval"]]
+        start_ms, end_ms = int(query["startTime"]), int(query["endTime"])
+        limit = int(query.get("limit", 500))
+        first = start_ms + (-start_ms) % step
+        open_times = np.arange(first, end_ms + 1, step, dtype=np.int64)[:limit]
+        seed = sum(ord(char) for char in query["symbol"])
+        # Marche pseudo-aléatoire déterministe : tendance lente plus bruit haché
+        noise = np.modf(np.sin(open_times / step * 12.9898 + seed) * 43758.5453)[0]
+        close = 100 + seed % 50 + 10 * np.sin(open_times / (step * 500.0) + seed) + noise
+        rows = [[int(t), f"{c - 0.1:.4f}", f"{c + 0.5:.4f}", f"{c - 0.5:.4f}", f"{c:.4f}", "10.0", int(t) + step - 1,
+                 f"{c * 10:.4f}", 100, "5.0", f"{c * 5:.4f}", "0"] for t, c in zip(open_times, close)]
+        body = json.dumps(rows).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_fake_exchange():
+    """
+    Description : Démarre le faux serveur Binance sur un port libre.
+
+    Renvoie : Le serveur et son URL de base.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeBinanceHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def _status_kib(pid, field):
+    try:
+        with open(f"/proc/{pid}/status") as file:
+            for line in file:
+                if line.startswith(field):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def _reset_peak_rss(pid):
+    # Sous Linux, écrire 5 dans clear_refs remet à zéro le pic de mémoire résidente (VmHWM)
+    try:
+        with open(f"/proc/{pid}/clear_refs", "w") as file:
+            file.write("5")
+    except OSError:
+        pass
+
+
+def worker_pids():
+    return [worker.process.pid for workers in worker_pool._idle.values() for worker in workers
+            if worker.process is not None and worker.process.poll() is None]
+
+
+def reset_peaks():
+    for pid in [os.getpid()] + worker_pids():
+        _reset_peak_rss(pid)
+
+
+def peak_rss_mb():
+    """
+    Description : Renvoie le pic de mémoire résidente (en Mo) du serveur et le plus élevé des workers depuis la
+    dernière remise à zéro. Hors Linux, le pic du serveur est celui de toute la durée du processus.
+    """
+    server = _status_kib(os.getpid(), "VmHWM")
+    if server is None:
+        import resource
+        server = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    workers = [peak for peak in (_status_kib(pid, "VmHWM") for pid in worker_pids()) if peak is not None]
+    return round(server / 1024, 1), round(max(workers) / 1024, 1) if workers else None
+
+
+class StageTimer:
+    """
+    Chronomètre les étapes successives d'un cas du benchmark.
+    """
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = round(time.perf_counter() - start, 6)
+
+
+def run_case(base_url, n_tickers, interval, days, end_date, requirements):
+    """
+    Description : Exécute un cas du benchmark et mesure chaque étape du pipeline.
+
+    Processus :
+        fetch_cold : téléchargement des bougies depuis le faux serveur vers un CandleStore vide.
+        fetch_warm : même requête servie par le CandleStore.
+        serialize : écriture de la stratégie et des données pour le worker (BacktestHandler.write_inputs).
+        venv : obtention de l'environnement virtuel (construction lors du premier cas uniquement).
+        worker_start : démarrage des workers de l'environnement (nul si des workers sont déjà inactifs).
+        worker : exécution de la stratégie dans un worker.
+        read_result : relecture des poids renvoyés par le worker.
+        stats : calcul des statistiques (Backtest.Stats).
+        end_to_end : BacktestHandler.run_backtest complet, cache des résultats vidé.
+    Renvoie : Un dictionnaire décrivant le cas, ses temps par étape, son débit et ses pics de mémoire.
+    """
+    tickers = [f"BENCH{position}USDT" for position in range(n_tickers)]
+    start_date = (datetime.strptime(end_date, "%Y-%m-%d") - timedelta(days=days)).strftime("%Y-%m-%d")
+    dates = [start_date, end_date]
+    user_input = SimpleNamespace(func_strat=STRATEGY, requirements=requirements, tickers=tickers, dates=dates,
+                                 interval=interval, request_id=f"bench_{n_tickers}_{interval}_{days}",
+                                 chunk_size=None, warmup_bars=0, fill_policy="ffill", missing_policy="zero",
+                                 fee_bps=0, slippage_bps=0, drift=False, rebalance_every=None,
+                                 rolling_windows=None, walk_forward=None)
+    timer = StageTimer()
+    reset_peaks()
+    with tempfile.TemporaryDirectory() as store_dir:
+        store = CandleStore(os.path.join(store_dir, "candles.sqlite"))
+        with timer.stage("fetch_cold"):
+            data = DataCollector(tickers, dates, interval, store=store, base_url=base_url).collect_APIdata()
+        with timer.stage("fetch_warm"):
+            data = DataCollector(tickers, dates, interval, store=store, base_url=base_url).collect_APIdata()
+
+    handler = BacktestHandler(user_input, data)
+    with timer.stage("serialize"):
+        handler.write_inputs()
+    try:
+        with ExitStack() as stack:
+            with timer.stage("venv"):
+                python_executable = stack.enter_context(venv_pool.interpreter(requirements))
+            with timer.stage("worker_start"):
+                worker_pool.prestart(python_executable)
+            with timer.stage("worker"):
+                response = worker_pool.run(python_executable, handler.data_path, handler.function_path,
+                                           output_dir=os.path.join(handler.work_dir, "output"))
+        with timer.stage("read_result"):
+            weights = DataTransport.read_result(response)
+    finally:
+        handler.cleanup_inputs()
+    with timer.stage("stats"):
+        handler.backtesting(weights, data)
+
+    result_cache.clear()
+    with timer.stage("end_to_end"):
+        BacktestHandler(user_input, data).run_backtest()
+
+    n_candles = sum(len(df) for df in data.values())
+    server_peak, worker_peak = peak_rss_mb()
+    return {
+        "tickers": n_tickers, "interval": interval, "days": days, "candles": n_candles,
+        "stages_s": timer.stages,
+        "throughput_candles_per_s": {
+            "fetch_cold": round(n_candles / timer.stages["fetch_cold"], 1) if timer.stages["fetch_cold"] else None,
+            "end_to_end": round(n_candles / timer.stages["end_to_end"], 1) if timer.stages["end_to_end"] else None,
+        },
+        "peak_rss_mb": {"server": server_peak, "worker": worker_peak},
+    }
+
+
+def measure_startup(runs):
+    """
+    Description : Mesure le démarrage à froid du serveur dans runs nouveaux interpréteurs.
+
+    Processus :
+        import_s : import du module main (routes, modèles, singletons).
+        first_response_s : démarrage de l'application (évènements startup) et réponse à une première requête.
+        time_to_first_response_s : somme des deux.
+        process_s : durée totale du processus, démarrage et arrêt de l'interpréteur compris.
+    Renvoie : La médiane de chaque mesure sur les runs exécutions.
+    """
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", STARTUP_PROBE], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        sample = json.loads(output.strip().splitlines()[-1])
+        if sample.pop("status") != 200:
+            raise RuntimeError("La première requête du serveur a échoué")
+        sample["time_to_first_response_s"] = sample["import_s"] + sample["first_response_s"]
+        sample["process_s"] = time.perf_counter() - start
+        samples.append(sample)
+    return {name: round(float(np.median([sample[name] for sample in samples])), 4) for name in samples[0]}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous_path, report):
+    """
+    Description : Affiche, pour chaque cas commun à deux rapports, le rapport des temps par étape
+    (nouveau / ancien). Un rapport supérieur à 1 indique une régression.
+    """
+    with open(previous_path) as file:
+        previous = json.load(file)
+    key = lambda case: (case["tickers"], case["interval"], case["days"])
+    previous_cases = {key(case): case for case in previous["cases"]}
+    print(f"Comparaison avec {previous_path} (commit {previous.get('commit')}) :")
+    if previous.get("startup") and report.get("startup"):
+        ratios = {name: round(seconds / previous["startup"][name], 2)
+                  for name, seconds in report["startup"].items() if previous["startup"].get(name)}
+        print(f"  démarrage : {ratios}")
+    for case in report["cases"]:
+        old = previous_cases.get(key(case))
+        if old is None:
+            continue
+        ratios = {stage: round(seconds / old["stages_s"][stage], 2)
+                  for stage, seconds in case["stages_s"].items() if old["stages_s"].get(stage)}
+        print(f"  {key(case)} : {ratios}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark du pipeline de backtest sur un faux serveur Binance.")
+    parser.add_argument("--tickers", type=int, nargs="+", default=[1, 5])
+    parser.add_argument("--intervals", nargs="+", default=["1h", "1m"])
+    parser.add_argument("--days", type=int, nargs="+", default=[7, 30])
+    parser.add_argument("--end-date", default="2024-01-01")
+    parser.add_argument("--requirements", nargs="*", default=["pandas"])
+    parser.add_argument("--output", default=None, help="Fichier JSON du rapport (défaut : benchmark_<commit>.json)")
+    parser.add_argument("--compare", default=None, help="Rapport JSON précédent à comparer")
+    parser.add_argument("--startup-runs", type=int, default=5, help="Nombre de mesures du démarrage (0 : aucune)")
+    parser.add_argument("--startup-only", action="store_true", help="Mesure uniquement le démarrage du serveur")
+    parser.add_argument("--no-host", action="store_true",
+                        help="Exécute toujours les stratégies dans un environnement virtuel du pool")
+    args = parser.parse_args(argv)
+    if args.no_host:
+        venv_pool.host_packages = set()
+
+    report = {"commit": git_commit(), "date": datetime.now(timezone.utc).isoformat(),
+              "python": sys.version.split()[0], "platform": platform.platform(), "cpu_count": os.cpu_count(),
+              "host_packages": sorted(venv_pool.host_packages), "cases": []}
+    if args.startup_runs > 0:
+        report["startup"] = measure_startup(args.startup_runs)
+        print(json.dumps({"startup": report["startup"]}))
+
+    server, base_url = start_fake_exchange()
+    try:
+        for interval in ([] if args.startup_only else args.intervals):
+            for days in args.days:
+                for n_tickers in args.tickers:
+                    case = run_case(base_url, n_tickers, interval, days, args.end_date, args.requirements)
+                    report["cases"].append(case)
+                    print(json.dumps(case))
+    finally:
+        server.shutdown()
+        worker_pool.shutdown()
+
+    output = args.output or f"benchmark_{report['commit'] or 'local'}.json"
+    with open(output, "w") as file:
+        json.dump(report, file, indent=4)
+    print(f"Rapport écrit dans {output}")
+    if args.compare:
+        compare(args.compare, report)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+import json
+import time
 import requests
 
 url = "https://backtestapi.onrender.com/backtesting/"
@@ -48,9 +50,31 @@ params = {
     "nb_execution": 4,
 }
 
+# La requête est mise en file d'attente : la route renvoie immédiatement l'identifiant du job
 response = requests.post(url, json=params)
-response = response.json()
-print("Data received from response:", response)
+job = response.json()
+print("Job soumis :", job)
+
+# Suivi du job jusqu'à la fin du backtest
+url_result = "https://backtestapi.onrender.com/get_result"
+while job.get("status") in ("en_attente", "en_cours"):
+    time.sleep(2)
+    job = requests.get(url_result, params={"request_id": params["request_id"]}).json()
+print("Data received from response:", job)
+
+# Pour attendre directement le résultat dans la réponse : requests.post(url, params={"wait": True}, json=params)
+
+# Suivi de la progression en streaming : une ligne JSON par évènement, la dernière (end) contenant le résultat.
+# Fermer la connexion avant la fin (par exemple après des statistiques partielles décevantes) annule le backtest.
+url_stream = "https://backtestapi.onrender.com/backtesting/stream"
+with requests.post(url_stream, json=dict(params, request_id="random_request_3", is_recurring=False),
+                   stream=True) as response:
+    for line in response.iter_lines():
+        if line:
+            event = json.loads(line)
+            print(event["event"], {key: value for key, value in event.items() if key not in ("event", "result")})
+            if event["event"] == "end":
+                print("Résultat :", event.get("result"))
 
 ################################################ /get_result ##########################################################
 
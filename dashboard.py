@@ -4,6 +4,7 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import streamlit as st
+import Rolling
 
 
 def generate_fake_data(start_date, end_date):
@@ -25,6 +26,33 @@ def plot_data(df):
     st.pyplot()
 
 
+def plot_series(series, window):
+    """
+    Description : Affiche la courbe de drawdown (underwater) et les métriques glissantes de la fenêtre choisie,
+    recalculées localement à partir des rendements de l'indice renvoyés par l'API (clé Series).
+    """
+    returns = np.array([np.nan if value is None else value for value in series['returns']], dtype=float)
+    index = pd.to_datetime(series['index']) if series['index'] and isinstance(series['index'][0], str) \
+        else series['index']
+    drawdown, underwater = Rolling.drawdown_series(returns)
+    rolling = Rolling.rolling_metrics(returns, [window])[window]
+
+    st.subheader('Courbe de drawdown')
+    plt.figure(figsize=(10, 3))
+    plt.fill_between(index, drawdown, 0, color='tab:red', alpha=0.4)
+    plt.ylabel('Drawdown')
+    st.pyplot(plt.gcf())
+    st.write(f"**Durée sous l'eau actuelle :** {int(underwater[-1])} bougies")
+
+    st.subheader(f'Métriques glissantes ({window} bougies)')
+    fig, axes = plt.subplots(len(Rolling.ROLLING_SERIES), 1, figsize=(10, 2.5 * len(Rolling.ROLLING_SERIES)),
+                             sharex=True)
+    for axis, name in zip(axes, Rolling.ROLLING_SERIES):
+        axis.plot(index, rolling[name])
+        axis.set_ylabel(name)
+    st.pyplot(fig)
+
+
 def main():
     st.title('Analyse des indicateurs financiers')
 
@@ -37,13 +65,19 @@ def main():
     with open(data_path) as json_file:
         stats_dict = json.load(json_file)
 
+    series = stats_dict.pop('Series', None)
     for indicator, value in stats_dict.items():
         st.write(f"**{indicator}:** {value}")
 
     # Affichage des graphiques si les données sont disponibles
     if st.checkbox('Afficher les graphiques'):
-        df = generate_fake_data(start_date, end_date)
-        plot_data(df)
+        if series is not None and len(series['returns']) > 2:
+            window = st.slider('Fenêtre glissante (bougies)', min_value=2, max_value=len(series['returns']),
+                               value=min(30, len(series['returns'])))
+            plot_series(series, window)
+        else:
+            df = generate_fake_data(start_date, end_date)
+            plot_data(df)
 
 
 if __name__ == "__main__":
@@ -1,24 +1,65 @@
-import json
-import google.cloud.exceptions
-import pandas as pd
-from fastapi import FastAPI, HTTPException, Depends
+import asyncio
+import importlib
+import threading
+from fastapi import APIRouter, FastAPI, HTTPException, Depends, Query
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
-from pydantic import BaseModel, Field
-from Data_collector import DataCollector
-from BacktestHandler import BacktestHandler
-from Cloudscheduler import CloudScheduler
-from typing import Optional
-from google.cloud import storage
+from pydantic import BaseModel, Field, conint, root_validator
+from LocalScheduler import create_scheduler, local_cron
+from JobQueue import ANNULE, TERMINE, DuplicateJobError, Job, QueueFullError, job_queue
+import Instrumentation
+from ResultStore import ResultNotFound, recurring_state_store, result_store
+from typing import Literal, Optional
 from datetime import datetime, timedelta
 import os
 import re
+import json
+import math
+
+# Les modules de calcul (pandas, numpy, client HTTP) ne sont pas importés avec main : ils le sont en arrière-plan
+# au démarrage du serveur (voir create_app), ou à défaut par la première requête qui en a besoin.
+PRELOADED_MODULES = ("BacktestHandler", "Data_collector", "Rolling")
+
+# Intervalle (en secondes) entre deux lectures du journal d'évènements d'un job suivi en streaming
+STREAM_POLL_INTERVAL = float(os.environ.get("STREAM_POLL_INTERVAL", 0.25))
+
+# Nombre maximal de combinaisons évaluées par un balayage de paramètres (chacune est un job de stratégie)
+MAX_SWEEP_VARIANTS = int(os.environ.get("MAX_SWEEP_VARIANTS", 1000))
 
+router = APIRouter()
 
 
-app = FastAPI()
+class WalkForward(BaseModel):
+
+    n_folds: int = Field(5, ge=1, title="Nombre de plis",
+                         description="""Nombre de périodes de test consécutives, qui se terminent à la fin de la
+                                     période du backtest.""",
+                         example=5)
+    train_bars: Optional[int] = Field(None, ge=1, title="Bougies d'entraînement",
+                                      description="""Nombre de bougies d'entraînement précédant chaque période de
+                                                  test. Par défaut, la fenêtre d'entraînement est croissante et
+                                                  commence au début de la période du backtest.""",
+                                      example=1000)
+    test_bars: Optional[int] = Field(None, ge=1, title="Bougies de test",
+                                     description="""Nombre de bougies de chaque période de test (par défaut, la
+                                                 période est divisée en n_folds + 1 parts égales).""",
+                                     example=500)
+    gap_bars: int = Field(0, ge=0, title="Écart",
+                          description="""Nombre de bougies écartées entre l'entraînement et le test de chaque
+                                      pli.""",
+                          example=0)
+
+
+def reject_options(values: dict, options, mode: str):
+    """
+    Description : Lève une ValueError (erreur 422 de l'API) si l'une des options est renseignée alors que le
+    mode d'exécution ne l'utilise pas.
+    """
+    for option in options:
+        if values.get(option) not in (None, False):
+            raise ValueError(f"{option} n'est pas disponible pour {mode}")
 
 
 class UserInput(BaseModel):
@@ -70,6 +111,189 @@ class UserInput(BaseModel):
                                           précédents. Ce nombre doit être précisé comme un entier int.""",
                               example=4)
     current_execution_count: Optional[int] = 0
+    chunk_size: Optional[int] = Field(None, title="Exécution par blocs",
+                                      description="""Nombre de bougies par bloc temporel. Si ce champ est renseigné,
+                                                  la stratégie est exécutée bloc par bloc (fonction on_chunk si elle
+                                                  est définie, func_strat sinon), chaque bloc étant précédé de
+                                                  warmup_bars bougies de préchauffage, et les statistiques sont
+                                                  cumulées bloc par bloc. La mémoire utilisée ne dépend alors plus
+                                                  de la longueur de la période.""",
+                                      example=100000)
+    warmup_bars: Optional[int] = Field(200, title="Fenêtre de préchauffage des backtests récurrents",
+                                       description="""Nombre de bougies précédentes nécessaires à la fonction de
+                                                   trading pour calculer les poids d'une bougie (par exemple la
+                                                   longueur d'une moyenne mobile). Ces bougies précèdent chaque bloc
+                                                   de l'exécution par blocs ; lors des réexécutions des backtests
+                                                   récurrents, seules ces bougies et les nouvelles bougies sont
+                                                   chargées et traitées.""",
+                                       example=200)
+    fill_policy: Literal['ffill', 'none'] = Field('ffill', title="Remplissage des prix manquants",
+                                                  description="""Traitement des dates où un actif n'a pas de bougie
+                                                  alors que d'autres actifs en ont : 'ffill' reprend le dernier prix
+                                                  connu (rendement nul sur la période manquante), 'none' laisse le
+                                                  prix manquant (les rendements qui l'encadrent ne sont pas
+                                                  définis).""",
+                                                  example='ffill')
+    missing_policy: Literal['zero', 'drop'] = Field('zero', title="Traitement des rendements non définis",
+                                                    description="""Traitement des rendements non définis (avant la
+                                                    première cotation d'un actif, ou autour d'un prix manquant non
+                                                    rempli) : 'zero' les compte comme nuls, 'drop' retire ces dates
+                                                    du calendrier commun.""",
+                                                    example='zero')
+    fee_bps: float = Field(0, ge=0, title="Frais de transaction",
+                           description="""Frais payés sur le notionnel échangé, en points de base (10 = 0,1 %).
+                                       Ils sont déduits du rendement de chaque bougie en proportion de la rotation
+                                       du portefeuille (turnover).""",
+                           example=10)
+    slippage_bps: float = Field(0, ge=0, title="Glissement",
+                                description="""Écart moyen entre le prix de clôture et le prix d'exécution, en points
+                                            de base du notionnel échangé, déduit comme les frais.""",
+                                example=2)
+    drift: bool = Field(False, title="Dérive des poids",
+                        description="""Si true, le portefeuille n'est rééquilibré que lorsque les poids renvoyés
+                                    par la fonction changent (ou toutes les rebalance_every bougies) ; entre deux
+                                    rééquilibrages, les poids dérivent avec les rendements des actifs.""",
+                        example=False)
+    rebalance_every: Optional[int] = Field(None, ge=1, title="Période de rééquilibrage",
+                                           description="""Nombre de bougies entre deux rééquilibrages périodiques
+                                                       vers les poids renvoyés par la fonction (avec drift).""",
+                                           example=24)
+    rolling_windows: Optional[list[conint(ge=2)]] = Field(None, title="Fenêtres des métriques glissantes",
+                                                          description="""Tailles de fenêtres, en nombre de bougies.
+                                                          Si ce champ est renseigné, le résultat contient en plus
+                                                          des statistiques les séries de suivi (clé Series) :
+                                                          rendements de l'indice, courbe de drawdown, durée sous
+                                                          l'eau et, pour chaque fenêtre, rendement, volatilité,
+                                                          ratio de Sharpe et drawdown glissants.""",
+                                                          example=[24, 168])
+    walk_forward: Optional[WalkForward] = Field(None, title="Validation walk-forward",
+                                                description="""Si ce champ est renseigné, la période est découpée en
+                                                plis (entraînement puis test) exécutés en parallèle, et le
+                                                résultat contient les statistiques hors échantillon de chaque pli
+                                                et les statistiques agrégées sur l'ensemble des périodes de test.
+                                                Ce mode n'est pas disponible pour les backtests récurrents.""")
+
+    @root_validator(skip_on_failure=True)
+    def check_recurring_options(cls, values):
+        """
+        Description : Refuse (erreur 422) les options sans effet sur un backtest récurrent : ses réexécutions
+        mettent à jour des statistiques cumulées (voir recurring_pipeline), sans exécution par blocs ni
+        validation walk-forward.
+        """
+        if values.get("is_recurring") or values.get("current_execution_count"):
+            reject_options(values, ("chunk_size", "walk_forward"), "les backtests récurrents")
+        return values
+
+
+class SweepInput(UserInput):
+
+    param_grid: dict[str, list] = Field(..., title="Grille de paramètres",
+                                        description="""Dictionnaire associant à chaque paramètre de func_strat la liste
+                                                    des valeurs à tester. Toutes les combinaisons sont évaluées, chaque
+                                                    combinaison étant passée à func_strat en arguments nommés. Le
+                                                    nombre de combinaisons est limité par MAX_SWEEP_VARIANTS.""",
+                                        example={"fenetre": [5, 10, 20], "seuil": [0.01, 0.02]})
+
+    @root_validator(skip_on_failure=True)
+    def check_sweep_options(cls, values):
+        """
+        Description : Refuse (erreur 422) les options que le balayage n'utilise pas (chaque combinaison est
+        exécutée une seule fois, sur toute la période), une grille sans paramètre ou dont un paramètre n'a aucune
+        valeur, et une grille de plus de MAX_SWEEP_VARIANTS combinaisons.
+        """
+        reject_options(values, ("is_recurring", "chunk_size", "walk_forward"), "/backtesting/sweep")
+        param_grid = values["param_grid"]
+        if not param_grid:
+            raise ValueError("param_grid doit contenir au moins un paramètre")
+        empty = sorted(name for name, grid_values in param_grid.items() if not grid_values)
+        if empty:
+            raise ValueError(f"param_grid : aucune valeur pour {', '.join(empty)}")
+        n_variants = math.prod(len(grid_values) for grid_values in param_grid.values())
+        if n_variants > MAX_SWEEP_VARIANTS:
+            raise ValueError(f"param_grid compte {n_variants} combinaisons, au plus {MAX_SWEEP_VARIANTS} sont "
+                             f"acceptées")
+        return values
+
+
+class CompareInput(UserInput):
+
+    func_strat: Optional[str] = Field(None, title="Non disponible",
+                                      description="Remplacé par strategies : une requête qui le renseigne est refusée.")
+    strategies: dict[str, str] = Field(..., title="Stratégies à comparer",
+                                       description="""Dictionnaire associant à un nom chaque fonction de trading à
+                                                   comparer (même format que func_strat). Toutes les stratégies sont
+                                                   évaluées sur les mêmes données et doivent s'exécuter avec les
+                                                   mêmes packages (requirements).""",
+                                       example={"momentum": "import pandas as pd\ndef func_strat(dfs_dict): ...",
+                                                "equipondere": "import pandas as pd\ndef func_strat(dfs_dict): ..."})
+    allocation: Optional[dict[str, float]] = Field(None, title="Allocation du portefeuille de stratégies",
+                                                   description="""Part du capital attribuée à chaque stratégie dans
+                                                   le portefeuille qui les combine (rééquilibré à chaque bougie). Par
+                                                   défaut, le capital est réparti à parts égales.""",
+                                                   example={"momentum": 0.6, "equipondere": 0.4})
+
+    @root_validator(skip_on_failure=True)
+    def check_compare_options(cls, values):
+        """
+        Description : Refuse (erreur 422) les options que la comparaison n'utilise pas (func_strat est remplacé
+        par strategies, chaque stratégie est exécutée une seule fois sur toute la période), une comparaison sans
+        stratégie, ou une allocation portant sur une stratégie inconnue, contenant une part négative ou dont la
+        somme des parts n'est pas strictement positive.
+        """
+        reject_options(values, ("func_strat", "is_recurring", "chunk_size", "walk_forward"), "/backtesting/compare")
+        strategies, allocation = values.get("strategies"), values.get("allocation")
+        if not strategies:
+            raise ValueError("Aucune stratégie à comparer")
+        if allocation is not None:
+            unknown = set(allocation) - set(strategies)
+            if unknown:
+                raise ValueError(f"Stratégies inconnues dans l'allocation : {sorted(unknown)}")
+            negative = sorted(name for name, share in allocation.items() if share < 0)
+            if negative:
+                raise ValueError(f"Parts négatives dans l'allocation : {negative}")
+            if not sum(allocation.values()) > 0:
+                raise ValueError("La somme des parts de l'allocation doit être strictement positive")
+        return values
+
+
+def submit_scheduled(request: dict):
+    """
+    Soumet à la file d'attente une réexécution programmée par le planificateur local.
+    """
+    job_queue.submit(request["request_id"], backtest_pipeline, UserInput(**request))
+
+
+def start_scheduler():
+    # Le planificateur local recharge ses tâches depuis le disque au démarrage du serveur
+    if os.environ.get("SCHEDULER_BACKEND", "cloud") == "local":
+        local_cron.start(submit_scheduled)
+
+
+def preload_modules():
+    for module in PRELOADED_MODULES:
+        try:
+            importlib.import_module(module)
+        except Exception as e:
+            print(f"Échec du préchargement du module {module} : {e}")
+
+
+def start_preload():
+    if os.environ.get("PRELOAD_MODULES", "1") != "0":
+        threading.Thread(target=preload_modules, name="preload-modules", daemon=True).start()
+
+
+def cleanup_shared_memory():
+    from PanelRegistry import remove_stale_dirs
+
+    try:
+        remove_stale_dirs()
+    except Exception as e:
+        print(f"Échec du nettoyage des répertoires de processus arrêtés : {e}")
+
+
+def start_cleanup():
+    # En arrière-plan, comme le préchargement : seuls les répertoires des processus arrêtés sont supprimés
+    threading.Thread(target=cleanup_shared_memory, name="remove-stale-dirs", daemon=True).start()
 
 
 async def check_security(request: Request):
@@ -78,61 +302,373 @@ async def check_security(request: Request):
         re.compile(r"subprocess\.[a-zA-Z0-9_]"),
     ]
     response_check = await request.json()
-    func_strat_text = response_check.get("func_strat", "")
-    if any(pattern.search(func_strat_text) for pattern in disallowed_patterns):
+    sources = [response_check.get("func_strat") or ""]
+    if isinstance(response_check.get("strategies"), dict):
+        sources += [source for source in response_check["strategies"].values() if isinstance(source, str)]
+    if any(pattern.search(source) for source in sources for pattern in disallowed_patterns):
         raise HTTPException(status_code=400, detail="La requête contient des éléments dangereux.")
     return
 
 
-# Création de la route
-@app.post('/backtesting/', description="""Réalise le backtest d'une fonction de stratégie de trading propre à
-                                       l'utilisateur sur données de bougies de crypto-actifs.""")
-async def main(input: UserInput, security_check: None=Depends(check_security)):
+def backtest_pipeline(input: UserInput, job: Job):
     """
-    Endpoint du pour le backtesting de fonction de trading personnalisée.
-    La requête doit respectée le modèle décrit dans la documentation.
+    Exécution d'un backtest dans un thread de la file d'attente.
     Processus :
         - Modification de la requête si is_recurring=True en False pour
         éviter les boucles infinies de programmation de réexécution.
-        - Loading des données avec Data_collector
+        - Loading des données avec Data_collector (pour une exécution par blocs, écriture directe dans un panel
+        sur disque, sans chargement en mémoire, voir DataCollector.collect_panel)
         - Instanciation de BacktestHandler
-        - Run du backtest
+        - Run du backtest (incrémental pour les backtests récurrents, voir recurring_pipeline)
+        - Enregistrement du résultat dans le ResultStore
     Renvoie : dictionnaire de stats calculées par la classe Stats de Backtest
-
     """
+    from Data_collector import DataCollector
+    from BacktestHandler import BacktestHandler
+
     if input.is_recurring:
         modified_input = input.copy(update={"is_recurring": False})
-        scheduler = CloudScheduler(modified_input)
+        scheduler = create_scheduler(modified_input)
         scheduler.save_request_to_storage()
         scheduler.create_scheduler_job()
 
+    job.raise_if_cancelled()
+    if input.is_recurring or input.current_execution_count > 0:
+        result = recurring_pipeline(input, job)
+        save_result(input.request_id, result)
+        return result
+
     data_collector = DataCollector(input.tickers, input.dates, input.interval)
-    try:
+    if input.chunk_size and input.walk_forward is None:
+        with data_collector.collect_panel() as panel_path:
+            job.raise_if_cancelled()
+            backtest_handler = BacktestHandler(input, None, cancel_event=job.cancel_event, panel_path=panel_path)
+            result = backtest_handler.run_backtest()
+    else:
         user_data = data_collector.collect_APIdata()
-    except HTTPException as e:
-        raise HTTPException(status_code=400, detail=f'erreur : {str(e)}')
 
-    backtest_handler = BacktestHandler(input, user_data)
-    stats_backtest = backtest_handler.run_backtest()
+        job.raise_if_cancelled()
+        backtest_handler = BacktestHandler(input, user_data, cancel_event=job.cancel_event)
+        result = backtest_handler.run_backtest()
+    job.cache_hit = backtest_handler.cache_hit
+    save_result(input.request_id, result)
+    return result
+
+
+def recurring_pipeline(input: UserInput, job: Job):
+    """
+    Exécution incrémentale d'un backtest récurrent (requête initiale ou réexécution programmée).
+    Processus :
+        - Lecture de l'état conservé à l'issue de l'exécution précédente
+        - Loading des seules bougies nécessaires (fenêtre de préchauffage + nouvelles bougies)
+        - Mise à jour des statistiques avec les nouveaux rendements (et des séries de suivi, relues dans le
+        résultat précédent, voir previous_series), puis sauvegarde du nouvel état
+    Renvoie : dictionnaire de stats sur l'ensemble de l'historique
+    """
+    from Data_collector import DataCollector
+    from BacktestHandler import BacktestHandler
+
+    try:
+        state = recurring_state_store.get(input.request_id)
+    except ResultNotFound:
+        state = None
+    dates = BacktestHandler.incremental_dates(input, state)
+    data_collector = DataCollector(input.tickers, dates, input.interval)
+    user_data = data_collector.collect_APIdata()
+
+    job.raise_if_cancelled()
+    backtest_handler = BacktestHandler(input, user_data, cancel_event=job.cancel_event)
+    result, state = backtest_handler.run_incremental(state, previous_series(input))
+    recurring_state_store.put(input.request_id, state)
+    return result
+
+
+def previous_series(input: UserInput):
+    """
+    Séries de suivi du résultat précédent d'un backtest récurrent (clé Series), lues dans le ResultStore : l'état
+    conservé entre deux exécutions ne contient pas la série des rendements. None si la requête ne demande pas de
+    fenêtres glissantes ou si le résultat n'est pas disponible.
+    """
+    if not input.rolling_windows:
+        return None
+    try:
+        result = result_store.get(input.request_id)
+    except ResultNotFound:
+        return None
+    result = json.loads(result) if isinstance(result, str) else result
+    return result.get("Series") if isinstance(result, dict) else None
+
+
+def sweep_pipeline(input: SweepInput, job: Job):
+    """
+    Exécution d'un balayage de paramètres dans un thread de la file d'attente.
+    Processus :
+        - Loading des données avec Data_collector (une seule fois)
+        - Instanciation de BacktestHandler
+        - Évaluation de toutes les combinaisons de param_grid dans un même environnement
+    Renvoie : tableau des paramètres et des stats calculées pour chaque variante
+    """
+    from Data_collector import DataCollector
+    from BacktestHandler import BacktestHandler
+
+    data_collector = DataCollector(input.tickers, input.dates, input.interval)
+    user_data = data_collector.collect_APIdata()
+
+    job.raise_if_cancelled()
+    backtest_handler = BacktestHandler(input, user_data, cancel_event=job.cancel_event)
+    result = backtest_handler.run_sweep(input.param_grid)
+    save_result(input.request_id, result)
+    return result
+
+
+def compare_pipeline(input: CompareInput, job: Job):
+    """
+    Exécution d'une comparaison de stratégies dans un thread de la file d'attente.
+    Processus :
+        - Loading des données avec Data_collector (une seule fois pour toutes les stratégies)
+        - Instanciation de BacktestHandler
+        - Exécution concurrente des stratégies, puis statistiques, corrélations et portefeuille de stratégies
+    Renvoie : statistiques de chaque stratégie, matrice de corrélation et statistiques du portefeuille
+    """
+    from Data_collector import DataCollector
+    from BacktestHandler import BacktestHandler
+
+    data_collector = DataCollector(input.tickers, input.dates, input.interval)
+    user_data = data_collector.collect_APIdata()
+
+    job.raise_if_cancelled()
+    backtest_handler = BacktestHandler(input, user_data, cancel_event=job.cancel_event)
+    result = backtest_handler.run_compare(input.strategies, input.allocation)
+    save_result(input.request_id, result)
+    return result
+
+
+def save_result(request_id: str, result):
+    """
+    Enregistre le résultat d'un job dans le ResultStore pour qu'il reste consultable par /get_result
+    au-delà de la durée de conservation de la file d'attente. Un échec d'enregistrement ne fait pas échouer le job.
+    """
+    try:
+        result_store.put(request_id, result)
+    except Exception as e:
+        print(f"Échec de l'enregistrement du résultat {request_id} : {e}")
+
+
+def enqueue(input: UserInput, pipeline):
+    """
+    Soumet une requête à la file d'attente des backtests.
+    Renvoie : le Job créé (409 si un job actif porte le même identifiant, 429 si la file est pleine)
+    """
+    try:
+        return job_queue.submit(input.request_id, pipeline, input)
+    except DuplicateJobError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+
+async def submit_job(input: UserInput, pipeline, wait: bool):
+    """
+    Soumet une requête à la file d'attente des backtests.
+    Renvoie : l'identifiant et l'état du job (202), ou directement le résultat si wait=True.
+    """
+    job = enqueue(input, pipeline)
+
+    if not wait:
+        return JSONResponse(status_code=202, content={"job_id": job.job_id, "status": job.status})
+
+    # Attente du résultat sans bloquer la boucle d'évènements
+    await asyncio.wait([asyncio.wrap_future(job.future)])
+    if job.status == TERMINE:
+        return JSONResponse(content=job.result, headers={"X-Cache": "hit" if job.cache_hit else "miss"})
+    if job.status == ANNULE:
+        raise HTTPException(status_code=409, detail=job.error)
+    if isinstance(job.exception, ValueError):
+        raise HTTPException(status_code=400, detail=f'erreur : {job.error}')
+    raise HTTPException(status_code=500, detail=f'Erreur : {job.error}')
+
+
+async def stream_job(job: Job, cancel_on_disconnect: bool):
+    """
+    Suit l'exécution d'un job et renvoie ses évènements de progression au format NDJSON (une ligne JSON par
+    évènement) : début et fin de chaque étape, pages téléchargées, environnement prêt, blocs ou plis terminés,
+    statistiques partielles. La dernière ligne (évènement end) donne l'état final du job, avec son résultat
+    ou son erreur, comme /get_result.
+    Si cancel_on_disconnect=True, le job est annulé lorsque le client ferme la connexion avant la fin.
+    """
+    def line(event):
+        return json.dumps(event, default=str) + "\n"
+
+    cursor = 0
+    try:
+        yield line({"event": "submitted", "job_id": job.job_id, "status": job.status})
+        while True:
+            finished = job.future.done()
+            events = job.trace.events_since(cursor)
+            cursor += len(events)
+            for event in events:
+                yield line(event)
+            if finished:
+                break
+            await asyncio.sleep(STREAM_POLL_INTERVAL)
+        yield line({"event": "end", **job.to_dict()})
+    finally:
+        # Connexion fermée par le client avant la fin du job : la capacité du serveur est libérée
+        if cancel_on_disconnect and not job.future.done():
+            job_queue.cancel(job.job_id)
+
+
+# Création de la route
+@router.post('/backtesting/', description="""Réalise le backtest d'une fonction de stratégie de trading propre à
+                                       l'utilisateur sur données de bougies de crypto-actifs.""")
+async def main(input: UserInput, wait: bool = False, security_check: None=Depends(check_security)):
+    """
+    Endpoint du pour le backtesting de fonction de trading personnalisée.
+    La requête doit respectée le modèle décrit dans la documentation.
+    Processus :
+        - Soumission du backtest à la file d'attente (voir backtest_pipeline)
+        - Si wait=True, attente du résultat
+    Renvoie : identifiant du job à suivre avec /get_result, ou dictionnaire de stats calculées
+    par la classe Stats de Backtest si wait=True
+
+    """
+    return await submit_job(input, backtest_pipeline, wait)
+
+
+@router.post('/backtesting/sweep', description="""Évalue une même fonction de stratégie pour toutes les combinaisons
+                                             d'une grille de paramètres, sur un unique chargement des données.""")
+async def main_sweep(input: SweepInput, wait: bool = False, security_check: None=Depends(check_security)):
+    """
+    Endpoint de balayage de paramètres d'une fonction de trading personnalisée.
+    Processus :
+        - Soumission du balayage à la file d'attente (voir sweep_pipeline)
+        - Si wait=True, attente du résultat
+    Renvoie : identifiant du job, ou tableau des paramètres et des stats calculées pour chaque variante si wait=True
+
+    """
+    return await submit_job(input, sweep_pipeline, wait)
+
 
-    return stats_backtest
+@router.post('/backtesting/compare', description="""Compare plusieurs fonctions de stratégie sur un même univers
+                                               (données chargées une seule fois) et évalue le portefeuille qui
+                                               les combine.""")
+async def main_compare(input: CompareInput, wait: bool = False, security_check: None=Depends(check_security)):
+    """
+    Endpoint de comparaison de fonctions de trading.
+    Processus :
+        - Validation des stratégies et de l'allocation (voir CompareInput.check_compare_options)
+        - Soumission de la comparaison à la file d'attente (voir compare_pipeline)
+        - Si wait=True, attente du résultat
+    Renvoie : identifiant du job, ou tableau des stats de chaque stratégie, matrice de corrélation de leurs
+    rendements et stats du portefeuille de stratégies si wait=True
+
+    """
+    return await submit_job(input, compare_pipeline, wait)
 
-storage = storage.Client()
-bucket_name = "results_api"
-bucket = storage.bucket(bucket_name)
+
+@router.post('/backtesting/stream', description="""Réalise le backtest comme /backtesting/, en renvoyant au fil
+                                              de l'exécution ses évènements de progression et ses statistiques
+                                              partielles (NDJSON). Fermer la connexion annule le backtest.""")
+async def main_stream(input: UserInput, security_check: None=Depends(check_security)):
+    """
+    Endpoint de backtesting avec suivi de la progression.
+    Processus :
+        - Soumission du backtest à la file d'attente (voir backtest_pipeline)
+        - Streaming des évènements du job jusqu'à son résultat (voir stream_job)
+    Renvoie : flux NDJSON d'évènements, terminé par l'évènement end contenant le résultat
+    """
+    job = enqueue(input, backtest_pipeline)
+    return StreamingResponse(stream_job(job, cancel_on_disconnect=True), media_type="application/x-ndjson")
 
 
-@app.get('/get_result')
+@router.delete('/backtesting/{job_id}', description="""Annule un backtest en attente ou en cours.""")
+async def main_cancel(job_id: str):
+    if not job_queue.cancel(job_id):
+        raise HTTPException(status_code=404, detail='Aucun job en attente ou en cours avec cet identifiant')
+    return {"job_id": job_id, "status": job_queue.get(job_id).status}
+
+
+@router.get('/get_result')
 async def main_get_results(request_id: str):
-    blob = bucket.blob(f"{request_id}.json")
+    # Job soumis à ce serveur : son état (et son résultat s'il est terminé) est servi depuis la file d'attente
+    job = job_queue.get(request_id)
+    if job is not None:
+        return job.to_dict()
 
+    # Sinon, le résultat est lu dans le ResultStore (cache en mémoire, puis disque local ou bucket)
     try:
-        results = blob.download_as_text()
-    except google.cloud.exceptions.NotFound:
+        return result_store.get(request_id)
+    except ResultNotFound:
         raise HTTPException(status_code=404, detail='Résultats non trouvés')
     except Exception as e:
         raise HTTPException(status_code=500, detail=f'Erreur : {str(e)}')
 
-    results_to_return = json.loads(results)
-    return results_to_return
 
+
+@router.get('/get_result/stream', description="""Suit la progression d'un job en attente ou en cours (NDJSON),
+                                           sans l'annuler si la connexion est fermée.""")
+async def main_get_stream(request_id: str):
+    job = job_queue.get(request_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail='Aucun job connu avec cet identifiant')
+    return StreamingResponse(stream_job(job, cancel_on_disconnect=False), media_type="application/x-ndjson")
+
+
+@router.get('/get_result/rolling', description="""Recalcule les métriques glissantes d'un backtest terminé pour
+                                            d'autres tailles de fenêtres, sans réexécuter la stratégie. Le backtest
+                                            doit avoir été soumis avec rolling_windows, son résultat contenant alors
+                                            la série des rendements de l'indice.""")
+async def main_get_rolling(request_id: str, windows: list[int] = Query(...)):
+    import pandas as pd
+    import Rolling
+
+    if any(window < 2 for window in windows):
+        raise HTTPException(status_code=422, detail='Une fenêtre glissante doit contenir au moins 2 bougies')
+    job = job_queue.get(request_id)
+    try:
+        if job is not None:
+            if job.status != TERMINE:
+                raise HTTPException(status_code=409, detail=f'Le backtest est à l\'état {job.status}')
+            result = job.result
+        else:
+            result = result_store.get(request_id)
+    except ResultNotFound:
+        raise HTTPException(status_code=404, detail='Résultats non trouvés')
+    result = json.loads(result) if isinstance(result, str) else result
+    series = result.get("Series") if isinstance(result, dict) else None
+    if series is None:
+        raise HTTPException(status_code=404, detail='Séries non disponibles : soumettez le backtest avec rolling_windows')
+    returns = [float('nan') if value is None else value for value in series["returns"]]
+    index = pd.to_datetime(series["index"]) if series["index"] and isinstance(series["index"][0], str) else None
+    return Rolling.series_to_dict(returns, windows, index)
+
+
+@router.get('/metrics', description="""Expose les métriques du serveur au format texte de Prometheus : durée de chaque
+                                    étape du pipeline, octets transférés, taux de succès des caches, jobs par état
+                                    final, ressources consommées par les workers.""")
+async def main_metrics():
+    return PlainTextResponse(Instrumentation.registry.render(), media_type="text/plain; version=0.0.4")
+
+
+def create_app() -> FastAPI:
+    """
+    Fabrique de l'application (uvicorn main:app, ou uvicorn --factory main:create_app).
+    Processus :
+        - Création de l'application FastAPI et enregistrement des routes
+        - Au démarrage : lancement du planificateur local si SCHEDULER_BACKEND=local, import en arrière-plan
+        des modules de calcul (désactivé si PRELOAD_MODULES=0), et suppression des panels et répertoires de
+        travail laissés dans la mémoire partagée par un processus arrêté brutalement (voir
+        PanelRegistry.remove_stale_dirs)
+    Aucun client Google Cloud n'est créé au démarrage (voir CloudClients) : le serveur répond à sa première
+    requête sans attendre ni ces imports ni le réseau.
+    Renvoie : l'application FastAPI
+    """
+    application = FastAPI()
+    application.include_router(router)
+    application.add_event_handler("startup", start_scheduler)
+    application.add_event_handler("startup", start_preload)
+    application.add_event_handler("startup", start_cleanup)
+    return application
+
+
+app = create_app()
@@ -1,9 +1,47 @@
 import importlib.util
+import inspect
+import io
 import json
+import linecache
+import os
+import signal
+import stat
 import sys
+import time
+import traceback
+import uuid
 import pandas as pd
+import DataTransport
 from typing import Dict
 
+try:
+    import resource
+except ImportError:  # Windows : pas de limites de ressources
+    resource = None
+
+# Évènements d'audit refusés dans un worker isolé : réseau, création de processus, code natif arbitraire,
+# parcours du ramasse-miettes (qui donnerait accès au hook lui-même)
+SANDBOX_BLOCKED_EVENTS = frozenset({
+    "socket.connect", "socket.bind", "socket.sendto", "socket.sendmsg", "socket.getaddrinfo",
+    "subprocess.Popen", "os.system", "os.exec", "os.posix_spawn", "os.spawn", "os.fork", "os.forkpty", "os.kill",
+    "pty.spawn", "ctypes.dlopen", "ctypes.dlsym", "ctypes.cdata", "ctypes.call_function", "sys.addaudithook",
+    "gc.get_objects", "gc.get_referrers", "gc.get_referents",
+})
+# Modules dont l'import est refusé dans un worker isolé : création de processus sans évènement d'audit
+# (_posixsubprocess.fork_exec), code natif, sous-interpréteurs (sans le hook d'audit) et accès direct à posix
+SANDBOX_BLOCKED_MODULES = frozenset({"_posixsubprocess", "_ctypes", "ctypes", "_xxsubinterpreters", "posix"})
+# Évènements d'audit modifiant des fichiers (positions des chemins concernés dans leurs arguments)
+SANDBOX_FILE_EVENTS = (("os.remove", (0,)), ("os.rmdir", (0,)), ("os.mkdir", (0,)), ("os.rename", (0, 1)),
+                       ("os.link", (0, 1)), ("os.symlink", (0, 1)), ("os.truncate", (0,)), ("os.chmod", (0,)),
+                       ("os.chown", (0,)), ("os.utime", (0,)), ("shutil.rmtree", (0,)))
+# Fonctions de os créant un fichier sans évènement d'audit (FIFO, fichier spécial) : remplacées dans un job isolé
+SANDBOX_REFUSED_FUNCTIONS = ("mkfifo", "mknod")
+# Attributs de fonction dont la modification remplacerait le code d'une fonction existante
+SANDBOX_FROZEN_ATTRIBUTES = frozenset({"__code__", "__defaults__", "__kwdefaults__"})
+# Taille maximale d'un fichier écrit par un worker isolé
+SANDBOX_MAX_FILE_BYTES = 4 * 1024 ** 3
+
+
 class Wrapper:
     """
     La classe Wrapper est conçue pour encapsuler le processus de chargement des données financières et
@@ -11,27 +49,37 @@ class Wrapper:
     Elle permet d'isoler et d'exécuter de manière sécurisée le code utilisateur en fournissant une interface
     standardisée pour l'interaction avec les données.
     """
-    def __init__(self, file_path: str, function_path: str):
+    def __init__(self, file_path: str, function_path: str, output_dir: str = None, params: dict = None,
+                 chunks: list = None, progress=None):
         self.file_path = file_path
         self.function_path = function_path
+        self.output_dir = output_dir
+        self.params = params or {}
+        self.chunks = chunks
+        # Fonction appelée avec un dictionnaire d'avancement à la fin de chaque bloc (optionnelle)
+        self.progress = progress
         self.data_result = None
         self.function_result = None
 
     def load_data(self):
         """
-        Description : Charge les données financières à partir du fichier JSON spécifié lors de l'initialisation.
+        Description : Charge les données financières à partir du fichier spécifié lors de l'initialisation : soit
+        un manifeste du transport binaire (DataTransport), soit le fichier JSON historique.
 
         Renvoie : Un dictionnaire où chaque clé correspond à un identifiant d'actif et chaque valeur
         est un DataFrame pandas contenant les données financières pour cet actif.
 
         Processus :
-            Ouvre et lit le contenu du fichier JSON spécifié par file_path.
-            Convertit les données JSON en dictionnaire de DataFrames pandas, où chaque DataFrame représente les données
-            financières d'un actif spécifique.
+            Si file_path est un manifeste binaire, projette en mémoire les fichiers .npy de chaque actif.
+            Sinon, ouvre et lit le contenu du fichier JSON spécifié par file_path et convertit les données JSON en
+            dictionnaire de DataFrames pandas, où chaque DataFrame représente les données financières d'un actif.
         """
+        if os.path.basename(self.file_path) == DataTransport.MANIFEST_NAME:
+            self.data_result = DataTransport.read_panel(self.file_path)
+            return self.data_result
         with open(self.file_path, "r") as file:
             dico_df_json = json.load(file)
-        self.data_result = {key: pd.read_json(df_json) for key, df_json in dico_df_json.items()}
+        self.data_result = {key: pd.read_json(io.StringIO(df_json)) for key, df_json in dico_df_json.items()}
         return self.data_result
 
     def fonction_run(self):
@@ -46,25 +94,449 @@ class Wrapper:
             Utilise importlib pour charger dynamiquement le script de la fonction de trading de
             l'utilisateur spécifié par function_path.
             Exécute la fonction de stratégie de trading sur les données chargées et stocke le résultat.
-            Convertit le résultat (un DataFrame pandas) en JSON.
+            Convertit le résultat (un DataFrame pandas) au format binaire si un répertoire de sortie est fourni et
+            que le DataFrame s'y prête, en JSON sinon.
+            Si des blocs temporels ont été fournis, délègue l'exécution à fonction_run_chunks.
         """
+        if self.chunks is not None:
+            return self.fonction_run_chunks()
         self.data_result = self.load_data()
+        function_module = self.load_function_module()
+        # Les paramètres éventuels (balayage de paramètres) sont passés en arguments nommés
+        results = function_module.func_strat(self.data_result, **self.params)
+        self.function_result = self.serialize_result(results, self.output_dir)
+        return self.function_result
+
+    def load_function_module(self):
+        """
+        Description : Charge dynamiquement le script de la stratégie de l'utilisateur avec importlib.
+        """
         # Création des spécifications du module à partir du path de la fonction enregistrée en json
-        spec = importlib.util.spec_from_file_location("function_module", self.function_path)
+        # Nom de module unique : un worker réutilisé ne doit pas conserver la stratégie d'un job précédent
+        module_name = f"function_module_{uuid.uuid4().hex}"
+        spec = importlib.util.spec_from_file_location(module_name, self.function_path)
         # Création du module à partir des specs
         function_module = importlib.util.module_from_spec(spec)
         # Chargement du module
         spec.loader.exec_module(function_module)
-        results = function_module.func_strat(self.data_result)
-        self.function_result = results.to_json(orient="index")
+        return function_module
+
+    @staticmethod
+    def serialize_result(results, output_dir):
+        if output_dir is not None and DataTransport.can_write_frame(results):
+            return DataTransport.write_result(results, output_dir)
+        return results.to_json(orient="index")
+
+    def fonction_run_chunks(self):
+        """
+        Description : Exécute la stratégie bloc temporel par bloc temporel, pour que la mémoire utilisée ne dépende
+        que de la taille des blocs et non de la longueur de la période.
+
+        Renvoie : Une chaîne JSON listant les résultats (poids) de chaque bloc.
+
+        Processus :
+            Pour chaque bloc, ne lit que les lignes de sa fenêtre (bougies de préchauffage + bougies du bloc),
+            appelle on_chunk(dfs_dict, **params) si le script la définit, func_strat sinon, et ne conserve que
+            les poids des bougies du bloc (sélectionnées par date si les poids sont indexés par des dates, par
+            position sinon, comme pour un backtest complet).
+            Les poids de chaque bloc sont écrits sur disque avant de passer au bloc suivant. Le module de la
+            stratégie est chargé une seule fois : on_chunk peut conserver un état entre les blocs.
+            Pour un pli de validation walk-forward, le bloc décrit aussi les bornes du pli (clé fold), passées
+            à la stratégie en argument nommé fold si elle accepte cet argument.
+            L'avancement (nombre de blocs terminés) est signalé à la fin de chaque bloc par la fonction progress.
+        """
+        function_module = self.load_function_module()
+        strategy = getattr(function_module, "on_chunk", None) or function_module.func_strat
+        from_manifest = os.path.basename(self.file_path) == DataTransport.MANIFEST_NAME
+        if not from_manifest:
+            # Transport JSON : les données sont chargées une fois puis découpées en mémoire
+            data = self.load_data()
+        results = []
+        for position, chunk in enumerate(self.chunks):
+            if from_manifest:
+                window = DataTransport.read_panel(self.file_path, start=chunk["window_start"], stop=chunk["stop"])
+            else:
+                window = {key: df.loc[pd.Timestamp(chunk["window_start"]):pd.Timestamp(chunk["stop"])]
+                          for key, df in data.items()}
+            params = self.params
+            if "fold" in chunk and accepts_argument(strategy, "fold"):
+                params = dict(params, fold=chunk["fold"])
+            weights = strategy(window, **params)
+            if isinstance(weights.index, pd.DatetimeIndex) and weights.index.tz is None:
+                dates = weights.index.as_unit("ns").asi8
+                weights = weights[(dates >= chunk["start"]) & (dates <= chunk["stop"])]
+            else:
+                weights = weights.iloc[chunk["n_warmup"]:chunk["n_warmup"] + chunk["n_rows"]]
+            output_dir = os.path.join(self.output_dir, f"chunk{position}") if self.output_dir else None
+            results.append(self.serialize_result(weights, output_dir))
+            del window, weights
+            if self.progress is not None:
+                self.progress({"chunks_done": position + 1, "chunks": len(self.chunks)})
+        self.function_result = json.dumps({"format": "chunks", "results": results})
         return self.function_result
 
+
+def accepts_argument(function, name):
+    """
+    Description : Indique si une fonction accepte un argument nommé (explicitement ou par **kwargs).
+    """
+    try:
+        parameters = inspect.signature(function).parameters
+    except (TypeError, ValueError):
+        return False
+    return name in parameters or any(parameter.kind == parameter.VAR_KEYWORD for parameter in parameters.values())
+
+
+def sandbox_hook(read_roots, write_roots):
+    """
+    Description : Construit le hook d'audit d'un job isolé.
+
+    Paramètres :
+        read_roots : Répertoires et fichiers lisibles (chemins réels).
+        write_roots : Répertoires où le job peut écrire (chemins réels).
+    Renvoie : La fonction à passer à sys.addaudithook.
+
+    Processus :
+        Tout ce que le hook utilise est figé dans sa fermeture au moment de sa création : ensembles et tuples
+        immuables, fonctions natives (os.lstat, os.readlink...) et types intégrés. Le hook ne lit aucune variable
+        globale ni aucun attribut de module ou de classe, et n'appelle aucune fonction Python : une stratégie qui
+        modifie script_wrapper, os, os.path ou builtins ne change pas ses décisions. Les chemins sont copiés en
+        chaînes exactes avant d'être résolus (liens symboliques compris), pour qu'une sous-classe de str ne
+        puisse pas fausser la comparaison.
+    """
+    blocked_events = frozenset(SANDBOX_BLOCKED_EVENTS)
+    blocked_modules = frozenset(SANDBOX_BLOCKED_MODULES)
+    file_events = tuple((event, tuple(positions)) for event, positions in SANDBOX_FILE_EVENTS)
+    frozen_attributes = frozenset(SANDBOX_FROZEN_ATTRIBUTES)
+    sep = os.sep
+    read_roots = tuple((root, root.rstrip(sep) + sep) for root in read_roots)
+    write_roots = tuple((root, root.rstrip(sep) + sep) for root in write_roots)
+    write_flags = os.O_WRONLY | os.O_RDWR | os.O_CREAT | os.O_APPEND | os.O_TRUNC
+    encoding, errors = sys.getfilesystemencoding(), sys.getfilesystemencodeerrors()
+    getcwd, lstat, readlink, is_link = os.getcwd, os.lstat, os.readlink, stat.S_ISLNK
+    copy, decode, instance, length = "".__add__, bytes.decode, isinstance, len
+    is_str, is_bytes, is_int, denied, failed = str, bytes, int, PermissionError, OSError
+
+    def audit(event, args):
+        if event in blocked_events:
+            raise denied(f"Opération interdite dans le worker : {event}")
+        if event == "import":
+            module = args[0]
+            if instance(module, is_str) and copy(module).partition(".")[0] in blocked_modules:
+                raise denied(f"Import interdit dans le worker : {copy(module)}")
+            return
+        if event == "object.__setattr__":
+            if args[1] in frozen_attributes:
+                raise denied(f"Modification interdite dans le worker : {args[1]}")
+            return
+        if event == "open":
+            path, mode, flags = args
+            if path is None:
+                return
+            if instance(mode, is_str):
+                mode = copy(mode)
+                writing = "w" in mode or "a" in mode or "x" in mode or "+" in mode
+            else:
+                writing = (flags & write_flags) != 0
+            paths, roots = [path], write_roots if writing else read_roots
+            message = "Accès au fichier interdit dans le worker"
+        else:
+            positions = None
+            for name, indices in file_events:
+                if name == event:
+                    positions = indices
+            if positions is None:
+                return
+            paths, roots = [], write_roots
+            for position in positions:
+                if position < length(args) and args[position] is not None:
+                    paths.append(args[position])
+            message = "Modification de fichier interdite dans le worker"
+
+        for path in paths:
+            if instance(path, is_int):
+                continue  # descripteur déjà ouvert
+            if instance(path, is_bytes):
+                path = decode(path, encoding, errors)
+            elif instance(path, is_str):
+                path = copy(path)
+            else:
+                raise denied(message)
+            # Résolution du chemin réel (équivalent de os.path.realpath)
+            pending = (path if path.startswith(sep) else getcwd() + sep + path).split(sep)[::-1]
+            parts, hops = [], 0
+            while pending:
+                name = pending.pop()
+                if name == "" or name == ".":
+                    continue
+                if name == "..":
+                    if parts:
+                        parts.pop()
+                    continue
+                current = sep + sep.join(parts) + sep + name if parts else sep + name
+                try:
+                    link = is_link(lstat(current).st_mode)
+                except failed:
+                    link = False
+                if not link:
+                    parts.append(name)
+                    continue
+                hops += 1
+                if hops > 40:
+                    raise denied(f"{message} : {path}")
+                target = readlink(current)
+                if target.startswith(sep):
+                    parts = []
+                pending.extend(target.split(sep)[::-1])
+            resolved = sep + sep.join(parts)
+            allowed = False
+            for root, prefix in roots:
+                if resolved == root or resolved.startswith(prefix):
+                    allowed = True
+            if not allowed:
+                raise denied(f"{message} : {path}")
+
+    return audit
+
+
+def refused_function(event):
+    """
+    Description : Construit la fonction remplaçant dans un worker isolé une fonction native sans évènement
+    d'audit (voir SANDBOX_REFUSED_FUNCTIONS). Elle ne garde aucune référence à la fonction native.
+    """
+    def refused(*args, **kwargs):
+        raise PermissionError(f"Opération interdite dans le worker : {event}")
+
+    return refused
+
+
+class Sandbox:
+    """
+    La classe Sandbox restreint le processus d'un job exécuté avec l'interpréteur du serveur (voir
+    VenvPool.interpreter) : limites du noyau (aucun nouveau processus, pas de fichier core, taille des fichiers
+    écrits) et hook d'audit (voir sandbox_hook) refusant le réseau, la création de processus, l'import des modules
+    natifs de SANDBOX_BLOCKED_MODULES (ctypes, _posixsubprocess...), l'écriture hors du répertoire de sortie du job
+    et la lecture hors de l'installation Python et des fichiers du job.
+    Le hook d'audit limite ce que le code Python peut faire par les API standard ; il ne remplace pas un
+    isolement par le noyau (seccomp, espaces de noms), que la bibliothèque standard ne fournit pas.
+    Les limites du noyau ne s'appliquent pas à root (RLIMIT_NPROC est ignoré pour lui) : l'isolement n'est
+    complet que si le serveur s'exécute sous un utilisateur non privilégié.
+    """
+    def __init__(self):
+        import site
+        prefixes = {sys.prefix, sys.base_prefix, sys.exec_prefix, sys.base_exec_prefix}
+        prefixes.update(site.getsitepackages())
+        user_site = site.getusersitepackages()
+        if isinstance(user_site, str):
+            prefixes.add(user_site)
+        # Installation Python, fuseaux horaires et pseudo-fichiers utilisés par numpy et pandas. Les chemins sont
+        # résolus comme ceux que vérifie le hook : /proc/self devient /proc/<pid> du processus du job
+        paths = sorted(prefixes) + ["/usr/share/zoneinfo", "/etc/localtime", "/dev/null", "/dev/urandom", "/proc/self",
+                                    "/sys/devices/system/cpu"]
+        self.base_read_roots = tuple(os.path.realpath(path) for path in paths)
+        self.read_roots = self.base_read_roots
+        self.write_roots = ()
+
+    def install(self):
+        """
+        Description : Applique les limites du noyau et installe le hook d'audit. Le hook reçoit une copie des
+        chemins autorisés : modifier ensuite l'instance ou la classe n'a aucun effet.
+        """
+        if resource is not None:
+            for limit, value in (("RLIMIT_NPROC", 0), ("RLIMIT_CORE", 0), ("RLIMIT_FSIZE", SANDBOX_MAX_FILE_BYTES)):
+                if hasattr(resource, limit):
+                    try:
+                        resource.setrlimit(getattr(resource, limit), (value, value))
+                    except (ValueError, OSError):
+                        pass
+        # Fonctions natives sans évènement d'audit remplacées dans os et posix, et retirées de os.supports_dir_fd :
+        # elles ne restent accessibles depuis aucun module
+        posix = sys.modules.get(os.name)
+        for name in SANDBOX_REFUSED_FUNCTIONS:
+            native = getattr(os, name, None)
+            if native is None:
+                continue
+            os.supports_dir_fd.discard(native)
+            refused = refused_function(f"os.{name}")
+            for module in (os, posix):
+                if getattr(module, name, None) is native:
+                    setattr(module, name, refused)
+        # Modules interdits retirés du cache des imports : un nouvel import passe par le hook et est refusé.
+        # subprocess garde sa propre référence à fork_exec, utilisée sans évènement d'audit
+        for name in [name for name in sys.modules if name.partition(".")[0] in SANDBOX_BLOCKED_MODULES]:
+            del sys.modules[name]
+        if "subprocess" in sys.modules:
+            sys.modules["subprocess"]._fork_exec = None
+        # Source du wrapper mise en cache avant le hook, pour que les tracebacks renvoyés au serveur restent lisibles
+        linecache.updatecache(os.path.abspath(__file__))
+        # Le bytecode des stratégies n'est pas écrit à côté de leur source (hors du répertoire de sortie)
+        sys.dont_write_bytecode = True
+        sys.addaudithook(sandbox_hook(self.read_roots, self.write_roots))
+
+    def allow(self, read_paths, write_paths):
+        """
+        Description : Définit les fichiers du job accessibles : lecture des entrées (données, stratégie) et
+        écriture dans le répertoire de sortie.
+        """
+        write_roots = tuple(os.path.realpath(path) for path in write_paths if path)
+        self.write_roots = write_roots
+        self.read_roots = self.base_read_roots + write_roots + tuple(os.path.realpath(path) for path in read_paths
+                                                                   if path)
+
+
+def set_cpu_limit(seconds):
+    """
+    Description : Limite le temps CPU du job suivant. La limite est exprimée par rapport au temps CPU déjà
+    consommé par le worker, puisque RLIMIT_CPU est cumulatif sur la durée de vie du processus.
+    """
+    if resource is None or not seconds:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = int(usage.ru_utime + usage.ru_stime) + 1
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = used + int(seconds)
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def run_job(job, progress=None):
+    """
+    Description : Exécute un job reçu par un worker et construit sa réponse.
+
+    Renvoie : Un dictionnaire {"ok", "result" ou "error", "duration", "cpu", "max_rss"}.
+    """
+    start = time.perf_counter()
+    usage_start = resource.getrusage(resource.RUSAGE_SELF) if resource is not None else None
+    try:
+        set_cpu_limit(job.get("cpu_limit"))
+        wrapper = Wrapper(file_path=job["data_path"], function_path=job["function_path"],
+                          output_dir=job.get("output_dir"), params=job.get("params"), chunks=job.get("chunks"),
+                          progress=progress)
+        response = {"ok": True, "result": wrapper.fonction_run()}
+    except BaseException:
+        response = {"ok": False, "error": traceback.format_exc()}
+    response["duration"] = time.perf_counter() - start
+    if usage_start is not None:
+        # Temps CPU du job et pic de mémoire résidente du processus (ru_maxrss est en Kio sous Linux)
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        response["cpu"] = (usage.ru_utime + usage.ru_stime) - (usage_start.ru_utime + usage_start.ru_stime)
+        response["max_rss"] = usage.ru_maxrss * 1024
+    return response
+
+
+def run_forked(job, protocol, progress, prepare=None):
+    """
+    Description : Exécute un job dans un processus enfant créé par fork depuis le worker. L'enfant hérite des
+    modules déjà importés (pandas, numpy) mais disparaît à la fin du job : les modifications d'état faites par
+    une stratégie (modules remplacés, variables globales, monkeypatching) ne peuvent pas atteindre le job suivant.
+
+    Paramètres :
+        protocol : Flux du protocole, sur lequel l'enfant écrit ses lignes d'avancement et sa réponse.
+        progress : Fonction d'avancement transmise au Wrapper.
+        prepare : Fonction appelée dans l'enfant avec le job avant son exécution (optionnelle, voir Sandbox).
+    Renvoie : None si l'enfant a écrit sa réponse, sinon une réponse d'erreur décrivant son arrêt.
+    """
+    sys.stdout.flush()
+    sys.stderr.flush()
+    protocol.flush()
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            if prepare is not None:
+                prepare(job)
+            response = run_job(job, progress)
+            sys.stdout.flush()
+            protocol.write(json.dumps(response) + "\n")
+            protocol.flush()
+            status = 0
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            os._exit(status)
+    _, status = os.waitpid(pid, 0)
+    code = os.waitstatus_to_exitcode(status)
+    if code == 0:
+        return None
+    reason = f"signal {signal.Signals(-code).name}" if code < 0 else f"code {code}"
+    return {"ok": False, "error": f"Le processus du job s'est arrêté de manière inattendue ({reason}), "
+                                  f"limite de ressources probablement dépassée"}
+
+
+def worker_loop(max_jobs, memory_limit=None, sandbox=False):
+    """
+    Description : Boucle d'un worker de longue durée. Le worker importe pandas et numpy une seule fois, puis
+    reçoit des jobs sous forme de lignes JSON sur l'entrée standard et renvoie une ligne JSON par job,
+    éventuellement précédée de lignes d'avancement ({"progress": ...}) pour les exécutions par blocs.
+
+    Paramètres :
+        max_jobs : Nombre de jobs après lequel le worker se termine pour être recyclé.
+        memory_limit : Limite de mémoire virtuelle du worker en octets (optionnelle).
+        sandbox : Si True, chaque job est isolé (voir Sandbox) et n'accède qu'à ses propres fichiers.
+
+    Processus :
+        Réserve la sortie standard d'origine au protocole et redirige les print du code utilisateur vers stderr.
+        Chaque job s'exécute dans un processus enfant créé par fork (voir run_forked) : le worker lui-même
+        n'exécute jamais de code utilisateur et reste dans l'état obtenu après ses imports. Sur les systèmes
+        sans fork (Windows), les jobs s'exécutent dans le worker.
+    """
+    try:
+        import numpy  # noqa: F401  préchargé pour les stratégies
+    except ImportError:
+        pass
+    if resource is not None and memory_limit:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    protocol = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    def report_progress(progress):
+        sys.stdout.flush()
+        protocol.write(json.dumps({"progress": progress}) + "\n")
+        protocol.flush()
+
+    def isolate(job):
+        guard = Sandbox()
+        guard.allow(read_paths=[os.path.dirname(job["data_path"]), job["function_path"]],
+                    write_paths=[job.get("output_dir")])
+        guard.install()
+
+    prepare = isolate if sandbox else None
+    if sandbox and not hasattr(os, "fork"):
+        raise RuntimeError("L'isolement des jobs nécessite os.fork")
+    if sandbox and hasattr(os, "geteuid") and os.geteuid() == 0:
+        # VenvPool n'utilise pas l'interpréteur du serveur sous root : ce worker a été démarré directement
+        print("Attention : worker isolé exécuté en tant que root, les limites du noyau (RLIMIT_NPROC) sont sans "
+              "effet ; exécuter le serveur sous un utilisateur non privilégié", file=sys.stderr)
+    protocol.write(json.dumps({"ready": True, "pid": os.getpid()}) + "\n")
+    protocol.flush()
+
+    for _ in range(max_jobs):
+        line = sys.stdin.readline()
+        if not line:
+            break
+        job = json.loads(line)
+        if hasattr(os, "fork"):
+            response = run_forked(job, protocol, report_progress, prepare)
+            if response is None:
+                continue
+        else:
+            response = run_job(job, report_progress)
+        sys.stdout.flush()
+        protocol.write(json.dumps(response) + "\n")
+        protocol.flush()
+
+
 if __name__=="__main__":
+    if sys.argv[1] == "--worker":
+        # Mode worker : python script_wrapper.py --worker <max_jobs> [<memory_limit>] [--sandbox]
+        arguments = [argument for argument in sys.argv[2:] if argument != "--sandbox"]
+        worker_loop(max_jobs=int(arguments[0]), memory_limit=int(arguments[1]) if len(arguments) > 1 else None,
+                    sandbox="--sandbox" in sys.argv)
+        sys.exit(0)
     data_file_path = sys.argv[1]  # Chemin vers le fichier de données JSON.
     user_func_path = sys.argv[2]  # Chemin vers le script de l'utilisateur.
     wrapper = Wrapper(file_path=data_file_path, function_path=user_func_path)
     results = wrapper.fonction_run()
     # Indipensable d'avoir un print pour récuperer le résultat dans le subprocess
     print(results)
-
-
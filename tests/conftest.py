@@ -0,0 +1,35 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Les singletons des modules (store de bougies, pool d'environnements, stockage des résultats) sont configurés
+# par variables d'environnement à l'import : les tests utilisent un répertoire temporaire dédié
+TEST_DIR = tempfile.mkdtemp(prefix="backtest_tests_")
+os.environ.setdefault("CANDLE_STORE_PATH", os.path.join(TEST_DIR, "candles.sqlite"))
+os.environ.setdefault("VENV_POOL_DIR", os.path.join(TEST_DIR, "venvs"))
+os.environ.setdefault("RESULT_STORE_BACKEND", "local")
+os.environ.setdefault("RESULT_STORE_DIR", os.path.join(TEST_DIR, "results"))
+os.environ.setdefault("RECURRING_STATE_DIR", os.path.join(TEST_DIR, "recurring_state"))
+os.environ.setdefault("PRELOAD_MODULES", "0")
+
+
+def candles(tickers=("AAA", "BBB"), periods=300, freq="1h", seed=0):
+    """
+    Bougies synthétiques au format de DataCollector (une marche aléatoire par ticker, colonnes CANDLE_DTYPES).
+    """
+    import numpy as np
+    import pandas as pd
+    from Data_collector import CANDLE_DTYPES
+
+    generator = np.random.default_rng(seed)
+    dates = pd.date_range("2023-01-01", periods=periods, freq=freq, name="Dates")
+    data = {}
+    for ticker in tickers:
+        close = 100 * np.exp(np.cumsum(generator.normal(0, 0.01, periods)))
+        frame = pd.DataFrame({"Open": close, "High": close * 1.01, "Low": close * 0.99, "Close": close,
+                              "Volume": 1.0, "Quote_volume": close, "Nb_trades": 1}, index=dates)
+        data[ticker] = frame.astype(CANDLE_DTYPES)
+    return data
@@ -0,0 +1,118 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+import Backtest
+from conftest import candles
+
+
+def baseline_metrics(r, rf_rate=0.2, scale=9):
+    # Formules de la première version de Stats (pandas, une méthode par métrique)
+    def annualize(series):
+        return (1 + series).prod() ** (scale / series.shape[0]) - 1
+
+    rf_per_period = (1 + rf_rate) ** (1 / scale) - 1
+    vol_annual = r.std() * np.sqrt(scale)
+    demeaned = r - r.mean()
+    peaks = r.cummax()
+    max_draw = ((r - peaks) / peaks).min()
+    downside_vol = np.sqrt(np.mean(np.minimum(r - rf_rate, 0) ** 2))
+    r_annual = annualize(r)
+    return {
+        'r_annual': r_annual,
+        'vol_annual': vol_annual,
+        'sharpe_r': annualize(r - rf_per_period) / vol_annual,
+        'skew': (demeaned ** 3).mean() / r.std(ddof=0) ** 3,
+        'kurt': (demeaned ** 4).mean() / r.std(ddof=0) ** 4,
+        'semi_deviation': r[r < 0].std(ddof=0),
+        'var_hist': np.percentile(r, 5),
+        'max_draw': max_draw,
+        'downside_vol': downside_vol,
+        'sortino_ratio': annualize(r - rf_per_period) / downside_vol,
+        'calmar_ratio': r_annual / -max_draw,
+    }
+
+
+def assert_metrics_close(actual, expected, rtol=1e-9, returns=None):
+    for attribute, value in expected.items():
+        if attribute == 'var_hist' and returns is not None:
+            # VaR estimée par le digest : erreur mesurée en rang, quelques dixièmes de point de pourcentage au plus
+            assert abs(np.mean(returns <= actual[attribute]) - 0.05) < 2e-3, attribute
+        else:
+            assert np.isclose(actual[attribute], value, rtol=rtol, atol=1e-12, equal_nan=True), attribute
+
+
+def random_returns(n, seed=0):
+    return np.random.default_rng(seed).standard_t(4, n) * 0.01
+
+
+def test_stats_match_baseline():
+    data = candles(periods=500)
+    close = pd.DataFrame({ticker: frame["Close"] for ticker, frame in data.items()})
+    weights = (close.rolling(10).mean() < close).astype(float) * 0.5
+    stats = Backtest.Stats(weights, data)
+    expected = baseline_metrics(stats.r_indice['Index_Return'])
+    assert_metrics_close({attribute: getattr(stats, attribute) for attribute in expected}, expected)
+    assert_metrics_close(Backtest.compute_metrics(stats.r_indice['Index_Return'].to_numpy()), expected)
+
+
+def test_running_stats_match_compute_metrics():
+    r = random_returns(3000)
+    running_stats = Backtest.RunningStats()
+    for chunk in np.split(r, [1, 7, 500, 1200, 2999]):
+        running_stats.update(chunk)
+    # VaR exacte tant que l'historique tient dans le tampon du digest
+    assert_metrics_close(running_stats.metrics(), Backtest.compute_metrics(r))
+
+
+def test_running_stats_state_is_bounded():
+    r = random_returns(20000, seed=1)
+    running_stats = Backtest.RunningStats()
+    for chunk in np.array_split(r, 20):
+        running_stats.update(chunk)
+    assert_metrics_close(running_stats.metrics(), Backtest.compute_metrics(r), rtol=1e-8, returns=r)
+    state = running_stats.get_state()
+    assert 'returns' not in state and 'dates' not in state
+    assert len(state['quantiles']['means']) <= Backtest.QUANTILE_BUFFER
+    assert len(json.dumps(state)) < 200000
+
+
+def test_incremental_update_from_state():
+    r = random_returns(8000, seed=2)
+    state = json.loads(json.dumps(Backtest.RunningStats().update(r[:6000]).get_state()))
+    saved = json.dumps(state)
+    restored = Backtest.RunningStats.from_state(state).update(r[6000:])
+    # L'état relu n'est pas modifié par les mises à jour de l'objet reconstruit
+    assert json.dumps(state) == saved
+    assert_metrics_close(restored.metrics(), Backtest.compute_metrics(r), rtol=1e-8, returns=r)
+
+
+def test_state_with_returns_series_is_migrated():
+    r = random_returns(1000, seed=3)
+    state = Backtest.RunningStats().update(r).get_state()
+    del state['quantiles']
+    state['returns'], state['dates'] = r.tolist(), []
+    restored = Backtest.RunningStats.from_state(state)
+    assert restored.metrics()['var_hist'] == pytest.approx(np.percentile(r, 5))
+    assert restored.returns is None
+
+
+def test_series_are_kept_on_request():
+    r = random_returns(50, seed=4)
+    with pytest.raises(ValueError):
+        Backtest.RunningStats().update(r).rolling([5])
+    running_stats = Backtest.RunningStats(keep_series=True).update(r[:20]).update(r[20:])
+    assert running_stats.rolling([5])['returns'] == pytest.approx(r.tolist())
+
+
+@pytest.mark.parametrize("q", [0.0, 0.01, 0.05, 0.5, 0.95, 1.0])
+def test_quantile_digest(q):
+    r = random_returns(40000, seed=5)
+    small = Backtest.QuantileDigest().update(r[:1000])
+    assert small.quantile(q) == np.percentile(r[:1000], q * 100)
+    digest = Backtest.QuantileDigest()
+    for chunk in np.array_split(r, 40):
+        digest.update(chunk)
+    assert digest.weights.size <= Backtest.QUANTILE_BUFFER
+    assert digest.weights.sum() == r.size
+    assert abs(np.mean(r <= digest.quantile(q)) - q) < 2e-3
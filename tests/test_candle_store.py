@@ -0,0 +1,104 @@
+import time
+from CandleStore import CandleStore
+from Data_collector import DataCollector
+
+HOUR = 3_600_000
+
+
+def rows(start, count):
+    return [[start + position * HOUR, 1.0, 1.0, 1.0, 1.0, 1.0, start + (position + 1) * HOUR - 1, 1.0, 1, 0.0, 0.0,
+             "0"] for position in range(count)]
+
+
+def test_load_batches_matches_load(tmp_path):
+    store = CandleStore(str(tmp_path / "candles.sqlite"))
+    store.insert("AAA", "1h", rows(0, 25), 0, 25 * HOUR - 1)
+    store.insert("BBB", "1h", rows(0, 5), 0, 5 * HOUR - 1)
+    assert store.extent("AAA", "1h", 2 * HOUR, 20 * HOUR) == (19, 20 * HOUR)
+    assert store.extent("AAA", "1h", 30 * HOUR, 40 * HOUR) == (0, None)
+    batches = list(store.load_batches("AAA", "1h", 2 * HOUR, 20 * HOUR, batch_size=7))
+    assert [len(batch) for batch in batches] == [7, 7, 5]
+    assert [row for batch in batches for row in batch] == store.load("AAA", "1h", 2 * HOUR, 20 * HOUR)
+
+
+def coverage(store, symbol="AAA"):
+    with store._connect() as connection:
+        return connection.execute("SELECT start_ms, end_ms FROM coverage WHERE symbol = ? ORDER BY start_ms",
+                                  (symbol,)).fetchall()
+
+
+def test_coverage_is_merged(tmp_path):
+    store = CandleStore(str(tmp_path / "candles.sqlite"))
+    store.insert("AAA", "1h", rows(0, 10), 0, 10 * HOUR - 1)
+    store.insert("AAA", "1h", rows(20 * HOUR, 10), 20 * HOUR, 30 * HOUR - 1)
+    store.insert("BBB", "1h", rows(0, 40), 0, 40 * HOUR - 1)
+    assert coverage(store) == [(0, 10 * HOUR - 1), (20 * HOUR, 30 * HOUR - 1)]
+    assert store.missing_ranges("AAA", "1h", 5 * HOUR, 35 * HOUR) == [(10 * HOUR, 20 * HOUR - 1),
+                                                                     (30 * HOUR, 35 * HOUR)]
+    # Plage chevauchant la première et touchant la seconde : une seule plage couverte
+    store.insert("AAA", "1h", rows(8 * HOUR, 12), 8 * HOUR, 20 * HOUR - 1)
+    assert coverage(store) == [(0, 30 * HOUR - 1)]
+    assert store.missing_ranges("AAA", "1h", 0, 30 * HOUR - 1) == []
+    assert len(store.load("AAA", "1h", 0, 30 * HOUR)) == 30
+
+
+def test_truncated_page_is_not_covered(tmp_path):
+    store = CandleStore(str(tmp_path / "candles.sqlite"))
+    # Page tronquée : seules les bougies renvoyées sont couvertes
+    store.insert("AAA", "1h", rows(2 * HOUR, 10), 0, 20 * HOUR - 1)
+    assert coverage(store) == [(2 * HOUR, 12 * HOUR - 1)]
+    assert store.missing_ranges("AAA", "1h", 0, 20 * HOUR - 1) == [(0, 2 * HOUR - 1), (12 * HOUR, 20 * HOUR - 1)]
+    # Réponse vide : aucune bougie n'existe sur la plage, elle est couverte
+    store.insert("AAA", "1h", [], 12 * HOUR, 20 * HOUR - 1)
+    assert coverage(store) == [(2 * HOUR, 20 * HOUR - 1)]
+
+
+def test_open_candle_is_not_covered(tmp_path):
+    store = CandleStore(str(tmp_path / "candles.sqlite"))
+    now_ms = int(time.time() * 1000)
+    start_ms = now_ms - now_ms % HOUR - 5 * HOUR
+    store.insert("AAA", "1h", rows(start_ms, 6), start_ms, start_ms + 6 * HOUR - 1)
+    (missing_start, _), = store.missing_ranges("AAA", "1h", start_ms, start_ms + 6 * HOUR - 1)
+    # La bougie en cours sera téléchargée de nouveau
+    assert start_ms + 4 * HOUR < missing_start <= start_ms + 5 * HOUR
+
+
+def test_only_missing_ranges_are_downloaded(tmp_path, monkeypatch):
+    store = CandleStore(str(tmp_path / "candles.sqlite"))
+    collector = DataCollector(["AAA"], ["2023-01-01", "2023-01-03"], "1h", store=store)
+    start_ms, end_ms = collector.date_range()
+    store.insert("AAA", "1h", rows(start_ms, 24), start_ms, start_ms + 24 * HOUR - 1)
+    requested = []
+
+    def get_page(symbol, page_start, page_end):
+        requested.append((page_start, page_end))
+        return rows(page_start, (page_end - page_start) // HOUR + 1)
+
+    monkeypatch.setattr(collector, "get_page", get_page)
+    data = collector.collect_APIdata()
+    assert requested == [(start_ms + 24 * HOUR, end_ms)]
+    assert len(data["AAA"]) == 49
+    requested.clear()
+    collector.collect_APIdata()
+    assert requested == []
+
+
+def test_truncated_pages_are_downloaded_again(tmp_path, monkeypatch):
+    store = CandleStore(str(tmp_path / "candles.sqlite"))
+    collector = DataCollector(["AAA"], ["2023-01-01", "2023-01-03"], "1h", store=store)
+    start_ms, end_ms = collector.date_range()
+    requested = []
+
+    def get_page(symbol, page_start, page_end):
+        # API renvoyant au plus 20 bougies par page
+        requested.append((page_start, page_end))
+        return rows(page_start, min((page_end - page_start) // HOUR + 1, 20))
+
+    monkeypatch.setattr(collector, "get_page", get_page)
+    assert len(collector.collect_APIdata()["AAA"]) == 20
+    assert len(collector.collect_APIdata()["AAA"]) == 40
+    assert requested[1] == (start_ms + 20 * HOUR, end_ms)
+    assert len(collector.collect_APIdata()["AAA"]) == 49
+    requested.clear()
+    collector.collect_APIdata()
+    assert requested == []
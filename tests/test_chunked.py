@@ -0,0 +1,88 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+import DataTransport
+from BacktestHandler import BacktestHandler
+from CandleStore import CandleStore
+from Data_collector import DataCollector
+from conftest import candles
+from main import UserInput
+from test_inputs import BASE
+
+STRATEGY = """
+import pandas as pd
+def func_strat(dfs_dict):
+    df = pd.DataFrame({k: v["Close"] for k, v in dfs_dict.items()})
+    return (df.rolling(5).mean().fillna(0) - 100) / 10
+"""
+DATES = ["2023-01-01", "2023-01-13"]
+
+
+def gapped_candles():
+    data = candles(periods=300)
+    # Bougies manquantes pour BBB : l'index commun est l'union des deux index
+    data["BBB"] = data["BBB"].iloc[::3]
+    return data
+
+
+def store_rows(df):
+    open_times = df.index.as_unit("ms").asi8
+    return [[int(open_time), row.Open, row.High, row.Low, row.Close, row.Volume, int(open_time) + 3_599_999,
+             row.Quote_volume, int(row.Nb_trades), 0.0, 0.0, "0"]
+            for open_time, row in zip(open_times, df.itertuples())]
+
+
+def user_input(**options):
+    return UserInput(**dict(BASE, func_strat=STRATEGY, tickers=["AAA", "BBB"], dates=DATES, interval="1h",
+                            request_id="test_chunked", **options))
+
+
+def test_calendar_blocks():
+    generator = np.random.default_rng(0)
+    indexes = [np.sort(generator.choice(1000, size, replace=False)) for size in (300, 50, 0, 700)]
+    blocks = list(BacktestHandler.calendar_blocks(indexes, 64))
+    assert all(0 < len(block) <= 64 for block in blocks)
+    assert np.array_equal(np.concatenate(blocks), np.union1d(np.union1d(indexes[0], indexes[1]), indexes[3]))
+
+
+def test_collect_panel_matches_frames(tmp_path):
+    data = gapped_candles()
+    store = CandleStore(str(tmp_path / "candles.sqlite"))
+    collector = DataCollector(["AAA", "BBB"], DATES, "1h", store=store)
+    start_ms, end_ms = collector.date_range()
+    for ticker, df in data.items():
+        store.insert(ticker, "1h", store_rows(df), start_ms, end_ms)
+    expected = collector.collect_APIdata()
+    with collector.collect_panel(root_dir=str(tmp_path)) as panel_path:
+        frames = DataTransport.read_panel(panel_path, mmap=False)
+        for ticker, df in expected.items():
+            # Le transport binaire enregistre les dates en nanosecondes
+            pd.testing.assert_frame_equal(frames[ticker], df.set_axis(df.index.as_unit("ns")), check_freq=False)
+    assert not any(path.name.startswith("panel_") for path in tmp_path.iterdir())
+
+
+@pytest.mark.parametrize("source", ["frames", "disk_panel"])
+def test_chunked_matches_full_backtest(tmp_path, source):
+    data = gapped_candles()
+    handler = BacktestHandler(user_input(), data)
+    full = json.loads(handler.backtesting(handler.run_strategy(), data))
+
+    chunked_input = user_input(chunk_size=37, warmup_bars=10)
+    if source == "frames":
+        chunked = json.loads(BacktestHandler(chunked_input, data).run_backtest())
+    else:
+        store = CandleStore(str(tmp_path / "candles.sqlite"))
+        collector = DataCollector(["AAA", "BBB"], DATES, "1h", store=store)
+        start_ms, end_ms = collector.date_range()
+        for ticker, df in data.items():
+            store.insert(ticker, "1h", store_rows(df), start_ms, end_ms)
+        # Seules les bougies de la plage demandée sont chargées : même période pour le backtest complet
+        full_data = collector.collect_APIdata()
+        handler = BacktestHandler(user_input(), full_data)
+        full = json.loads(handler.backtesting(handler.run_strategy(), full_data))
+        with collector.collect_panel(root_dir=str(tmp_path)) as panel_path:
+            chunked = json.loads(BacktestHandler(chunked_input, None, panel_path=panel_path).run_backtest())
+    assert full.keys() == chunked.keys()
+    for metric, value in full.items():
+        assert np.isclose(chunked[metric], value, rtol=1e-9, equal_nan=True), metric
@@ -0,0 +1,46 @@
+import json
+import numpy as np
+import pandas as pd
+import Backtest
+from BacktestHandler import BacktestHandler
+from conftest import candles
+from main import CompareInput
+from test_inputs import COMPARE
+
+CONSTANT = """
+import pandas as pd
+def func_strat(dfs_dict):
+    df = pd.DataFrame({k: v["Close"] for k, v in dfs_dict.items()})
+    return pd.DataFrame(WEIGHT, index=df.index, columns=df.columns)
+"""
+FAILING = "def func_strat(dfs_dict):\n    raise RuntimeError('échec')\n"
+
+
+def run_compare(strategies, allocation):
+    data = candles()
+    user_input = CompareInput(**dict(COMPARE, strategies=strategies, allocation=allocation))
+    result = json.loads(BacktestHandler(user_input, data).run_compare(strategies, allocation))
+    return data, result
+
+
+def test_failed_strategy_share_is_redistributed():
+    strategies = {"long": CONSTANT.replace("WEIGHT", "0.5"), "short": CONSTANT.replace("WEIGHT", "-0.5"),
+                  "broken": FAILING}
+    data, result = run_compare(strategies, {"long": 0.3, "short": 0.1, "broken": 0.6})
+    portfolio = result["portfolio"]
+    assert portfolio["requested_allocation"] == {"long": 0.3, "short": 0.1, "broken": 0.6}
+    assert portfolio["allocation"] == {"long": 0.75, "short": 0.25}
+    assert "error" in result["strategies"][2]
+    # Portefeuille recalculé directement : 0,75 x stratégie longue + 0,25 x stratégie courte
+    close = pd.DataFrame({ticker: frame["Close"] for ticker, frame in data.items()})
+    long = 0.5 * close.pct_change().fillna(0).sum(axis=1).to_numpy()
+    expected = Backtest.compute_metrics(0.75 * long + 0.25 * -long)
+    assert np.isclose(portfolio["stats"]["Ratio de Sharpe"], expected["sharpe_r"])
+
+
+def test_portfolio_error_when_allocated_strategies_fail():
+    strategies = {"long": CONSTANT.replace("WEIGHT", "0.5"), "broken": FAILING}
+    _, result = run_compare(strategies, {"long": 0, "broken": 1})
+    assert "stats" not in result["portfolio"]
+    assert "error" in result["portfolio"]
+    assert "stats" in result["strategies"][0]
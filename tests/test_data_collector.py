@@ -0,0 +1,96 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from http.server import ThreadingHTTPServer
+import pandas as pd
+import pytest
+from benchmark import FakeBinanceHandler
+from CandleStore import CandleStore
+from Data_collector import DataCollector, retry_delay
+
+
+@pytest.mark.parametrize("retry_after, expected", [(None, 1.5), ("", 1.5), ("12", 12.0), ("0.5", 0.5), ("-3", 0.0),
+                                                   ("bientôt", 1.5), ("Wed, 99 Foo 2026 99:99:99 GMT", 1.5)])
+def test_retry_after_seconds_and_fallback(retry_after, expected):
+    assert retry_delay(retry_after, 1.5) == expected
+
+
+def test_retry_after_http_date():
+    retry_date = datetime.now(timezone.utc).replace(microsecond=0) + timedelta(seconds=30)
+    assert 25 <= retry_delay(format_datetime(retry_date, usegmt=True), 1.5) <= 30
+    # Date déjà passée : nouvel essai immédiat
+    assert retry_delay("Wed, 21 Oct 2015 07:28:00 GMT", 1.5) == 0.0
+
+
+class RecordingHandler(FakeBinanceHandler):
+    """
+    Faux serveur Binance (voir benchmark.FakeBinanceHandler) qui compte les requêtes simultanées et répond 429
+    aux rate_limited premières requêtes.
+    """
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+            limited = server.requests <= server.rate_limited
+        try:
+            if limited:
+                self.send_response(429)
+                self.send_header("Retry-After", "0.2")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            # Réponse lente : les requêtes concurrentes se chevauchent
+            time.sleep(0.05)
+            super().do_GET()
+        finally:
+            with server.lock:
+                server.active -= 1
+
+
+@pytest.fixture
+def exchange():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RecordingHandler)
+    server.lock = threading.Lock()
+    server.requests = server.active = server.peak = server.rate_limited = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def collector(exchange, tmp_path, tickers, dates, interval, **options):
+    return DataCollector(tickers, dates, interval, store=CandleStore(str(tmp_path / "candles.sqlite")),
+                         base_url=f"http://127.0.0.1:{exchange.server_port}", **options)
+
+
+def test_pages_have_no_gap_or_duplicate(exchange, tmp_path):
+    data = collector(exchange, tmp_path, ["AAA"], ["2023-01-01", "2023-01-04"], "1m").collect_APIdata()
+    index = data["AAA"].index
+    # Trois jours de bougies d'une minute, bornes incluses : cinq pages de 1000 bougies au plus
+    assert len(index) == 3 * 1440 + 1
+    assert index[0] == pd.Timestamp("2023-01-01") and index[-1] == pd.Timestamp("2023-01-04")
+    assert (index.to_series().diff().dropna() == pd.Timedelta(minutes=1)).all()
+    assert exchange.requests == 5
+
+
+def test_concurrency_is_bounded(exchange, tmp_path):
+    tickers = [f"T{position}" for position in range(6)]
+    data = collector(exchange, tmp_path, tickers, ["2023-01-01", "2023-01-03"], "1m", max_workers=3).collect_APIdata()
+    assert all(len(df) == 2 * 1440 + 1 for df in data.values())
+    assert exchange.requests == 6 * 3
+    assert 1 < exchange.peak <= 3
+
+
+def test_rate_limit_is_retried(exchange, tmp_path, monkeypatch):
+    exchange.rate_limited = 1
+    delays = []
+    monkeypatch.setattr("Data_collector.retry_delay",
+                        lambda retry_after, default: delays.append(retry_delay(retry_after, default)) or delays[-1])
+    data = collector(exchange, tmp_path, ["AAA"], ["2023-01-01", "2023-01-05"], "1h").collect_APIdata()
+    # Nouvel essai après la durée indiquée par Retry-After, puis succès
+    assert delays == [0.2]
+    assert exchange.requests == 2
+    assert len(data["AAA"]) == 4 * 24 + 1
@@ -0,0 +1,22 @@
+import json
+import pandas as pd
+import pytest
+import DataTransport
+
+WEIGHTS = pd.DataFrame({"AAA": [0.5, 0.25], "BBB": [0.5, 0.75]}, index=pd.date_range("2023-01-01", periods=2))
+
+
+def test_binary_result_reference(tmp_path):
+    reference = json.loads(DataTransport.write_result(WEIGHTS, str(tmp_path)))
+    # Référence relue quels que soient l'ordre de ses clés et sa mise en forme
+    for result in (json.dumps(reference), json.dumps(dict(reversed(list(reference.items()))), indent=2)):
+        # Le transport binaire enregistre les dates en nanosecondes
+        pd.testing.assert_frame_equal(DataTransport.read_result(result), WEIGHTS, check_freq=False,
+                                      check_index_type=False)
+
+
+@pytest.mark.parametrize("index", [pd.date_range("2023-01-01", periods=2), ["format", "manifest"]])
+def test_json_result(index):
+    weights = WEIGHTS.set_axis(index)
+    result = DataTransport.read_result(weights.to_json(orient="index"))
+    pd.testing.assert_frame_equal(result, weights, check_freq=False, check_index_type=False)
@@ -0,0 +1,87 @@
+import pytest
+from fastapi.testclient import TestClient
+import main
+
+client = TestClient(main.app)
+
+STRATEGY = """
+import pandas as pd
+def func_strat(dfs_dict):
+    df = pd.DataFrame({k: v["Close"] for k, v in dfs_dict.items()})
+    return pd.DataFrame(0.5, index=df.index, columns=df.columns)
+"""
+
+BASE = {"func_strat": STRATEGY, "requirements": ["pandas"], "tickers": ["ETHBTC", "BNBETH"],
+        "dates": ["2023-01-01", "2023-03-01"], "interval": "1d", "request_id": "test_inputs", "is_recurring": False,
+        "repeat_frequency": 1, "nb_execution": 1}
+
+
+# Requête de comparaison : strategies remplace func_strat
+COMPARE = dict({key: value for key, value in BASE.items() if key != "func_strat"}, request_id="test_compare_inputs",
+               strategies={"a": STRATEGY, "b": STRATEGY})
+
+
+def errors(response):
+    return " ".join(str(error["msg"]) for error in response.json()["detail"])
+
+
+@pytest.mark.parametrize("option, value", [("chunk_size", 100), ("walk_forward", {"n_folds": 3})])
+def test_recurring_options_are_rejected(option, value):
+    response = client.post("/backtesting/", json=dict(BASE, is_recurring=True, **{option: value}))
+    assert response.status_code == 422
+    assert option in errors(response)
+
+
+def test_recurring_input_is_accepted():
+    assert main.UserInput(**dict(BASE, is_recurring=True)).is_recurring
+
+
+@pytest.mark.parametrize("allocation, message", [
+    ({"zz": 1}, "inconnues"),
+    ({"a": 1.5, "b": -0.5}, "négatives"),
+    ({"a": 0, "b": 0}, "strictement positive"),
+])
+def test_invalid_allocations_are_rejected(allocation, message):
+    response = client.post("/backtesting/compare", json=dict(COMPARE, allocation=allocation))
+    assert response.status_code == 422
+    assert message in errors(response)
+
+
+@pytest.mark.parametrize("option, value", [("is_recurring", True), ("chunk_size", 100),
+                                           ("walk_forward", {"n_folds": 3})])
+def test_sweep_options_are_rejected(option, value):
+    request = dict(BASE, request_id="test_sweep_inputs", param_grid={"a": [1, 2]}, **{option: value})
+    response = client.post("/backtesting/sweep", json=request)
+    assert response.status_code == 422
+    assert option in errors(response)
+
+
+@pytest.mark.parametrize("param_grid, message", [
+    ({}, "au moins un paramètre"),
+    ({"a": [1, 2], "b": []}, "aucune valeur pour b"),
+    ({"a": list(range(40)), "b": list(range(30))}, "1200 combinaisons"),
+])
+def test_invalid_param_grids_are_rejected(param_grid, message):
+    request = dict(BASE, request_id="test_sweep_inputs", param_grid=param_grid)
+    response = client.post("/backtesting/sweep", json=request)
+    assert response.status_code == 422
+    assert message in errors(response)
+
+
+def test_sweep_size_limit(monkeypatch):
+    monkeypatch.setattr(main, "MAX_SWEEP_VARIANTS", 6)
+    assert main.SweepInput(**dict(BASE, param_grid={"a": [1, 2, 3], "b": [1, 2]})).param_grid["a"] == [1, 2, 3]
+    with pytest.raises(ValueError):
+        main.SweepInput(**dict(BASE, param_grid={"a": [1, 2, 3], "b": [1, 2, 3]}))
+
+
+@pytest.mark.parametrize("option, value", [("func_strat", STRATEGY), ("is_recurring", True), ("chunk_size", 100),
+                                           ("walk_forward", {"n_folds": 3})])
+def test_compare_options_are_rejected(option, value):
+    response = client.post("/backtesting/compare", json=dict(COMPARE, **{option: value}))
+    assert response.status_code == 422
+    assert option in errors(response)
+
+
+def test_compare_input_is_accepted():
+    assert main.CompareInput(**COMPARE).allocation is None
@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+import PanelRegistry
+from PanelRegistry import PanelRegistry as Registry, remove_stale_dirs
+from conftest import candles
+
+
+def test_panels_live_in_the_process_directory(tmp_path):
+    registry = Registry(root_dir=str(tmp_path))
+    data = candles(periods=20)
+    with registry.lease(data) as manifest_path:
+        # Une seconde requête sur les mêmes données partage le panel
+        assert registry.acquire(data) == manifest_path
+        registry.release(manifest_path)
+        process_dir = os.path.dirname(os.path.dirname(manifest_path))
+        assert process_dir == PanelRegistry.process_dir(str(tmp_path))
+        assert os.path.basename(process_dir).startswith(f"backtest_{os.getpid()}_")
+        assert os.path.exists(manifest_path)
+    assert not os.path.exists(manifest_path)
+
+
+def test_stale_process_directories_are_removed(tmp_path):
+    # Pid d'un processus terminé
+    finished = subprocess.Popen([sys.executable, "-c", "pass"])
+    finished.wait()
+    dead = tmp_path / f"backtest_{finished.pid}_0123456789ab" / "panel_x"
+    reused = tmp_path / f"backtest_{os.getpid()}_0123456789ab"
+    alive = tmp_path / f"backtest_{os.getppid()}_0123456789ab"
+    other = tmp_path / "panel_autre_application"
+    for path in (dead, reused, alive, other):
+        path.mkdir(parents=True)
+    (dead / "Close.npy").write_bytes(b"")
+    (dead / "Close.npy").chmod(0o444)
+    current = PanelRegistry.process_dir(str(tmp_path))
+
+    removed = remove_stale_dirs([str(tmp_path)])
+    assert sorted(removed) == sorted([str(dead.parent), str(reused)])
+    assert not dead.parent.exists() and not reused.exists()
+    assert alive.exists() and other.exists() and os.path.isdir(current)
@@ -0,0 +1,74 @@
+import os
+import subprocess
+import sys
+import DataTransport
+from ResultCache import ResultCache, cache_key, panel_fingerprint
+from conftest import ROOT, candles
+
+STRATEGY = """
+import pandas as pd
+def func_strat(dfs_dict):
+    return pd.DataFrame({k: v["Close"] for k, v in dfs_dict.items()}) * 0
+"""
+# Même stratégie : mise en forme, lignes vides et commentaires différents
+REFORMATTED = """
+import pandas as pd
+
+def func_strat( dfs_dict ):
+    # Poids nuls
+    return pd.DataFrame({k: v["Close"] for k, v in dfs_dict.items()})*0
+"""
+PARAMS = {"fill_policy": "ffill", "missing_policy": "zero", "chunk_size": 100}
+
+
+def key(strategy=STRATEGY, requirements=("pandas", "numpy==1.26"), data=None, params=None):
+    return cache_key(strategy, list(requirements), data if data is not None else candles(),
+                     dict(PARAMS) if params is None else params)
+
+
+def test_equivalent_requests_share_a_key():
+    reordered = dict(reversed(list(candles().items())))
+    assert key() == key(strategy=REFORMATTED)
+    assert key() == key(requirements=["NumPy == 1.26", " Pandas", "pandas"])
+    assert key() == key(data=reordered)
+    assert key() == key(params=dict(reversed(list(PARAMS.items()))))
+
+
+def test_changes_produce_a_new_key():
+    data = candles()
+    data["BBB"].iloc[-1, data["BBB"].columns.get_loc("Close")] += 1e-9
+    assert key() != key(strategy=STRATEGY.replace("* 0", "* 1"))
+    assert key() != key(requirements=["pandas", "numpy==1.25"])
+    assert key() != key(data=data)
+    assert key() != key(data=candles(periods=299))
+    assert key() != key(params=dict(PARAMS, chunk_size=200))
+
+
+def test_key_is_stable_across_processes():
+    code = (f"import sys; sys.path[:0] = [{ROOT!r}, {os.path.join(ROOT, 'tests')!r}]\n"
+            "from test_result_cache import key\nprint(key())")
+    keys = {subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                           env=dict(os.environ, PYTHONHASHSEED=seed)).stdout.strip() for seed in ("1", "2")}
+    assert keys == {key()}
+
+
+def test_panel_fingerprint(tmp_path):
+    data = candles()
+    first = panel_fingerprint(DataTransport.write_panel(data, str(tmp_path / "first")))
+    assert first == panel_fingerprint(DataTransport.write_panel(data, str(tmp_path / "second")), block_size=1000)
+    data["AAA"].iloc[0, 0] += 1
+    assert first != panel_fingerprint(DataTransport.write_panel(data, str(tmp_path / "third")))
+
+
+def test_entries_expire_and_are_evicted(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("ResultCache.time.monotonic", lambda: now[0])
+    cache = ResultCache(max_entries=2, ttl=10)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    # "b" est la moins récemment utilisée
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+    now[0] = 10
+    assert cache.get("a") is None
@@ -0,0 +1,165 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+import pytest
+from VenvPool import VenvPool
+from conftest import ROOT
+
+# Processus isolé : installe la Sandbox comme pour un job, exécute la tentative puis indique si elle a été refusée
+SANDBOXED = textwrap.dedent("""
+    import json, sys
+    sys.path.insert(0, sys.argv[1])
+    import script_wrapper
+    guard = script_wrapper.Sandbox()
+    guard.allow(read_paths=[sys.argv[2]], write_paths=[sys.argv[3]])
+    guard.install()
+    data_dir, output_dir = sys.argv[2], sys.argv[3]
+    try:
+        exec(sys.stdin.read())
+        outcome = "allowed"
+    except PermissionError as error:
+        outcome = "blocked: " + str(error)
+    sys.__stdout__.write(json.dumps(outcome) + "\\n")
+""")
+
+
+def run_sandboxed(tmp_path, code):
+    data_dir, output_dir = tmp_path / "data", tmp_path / "output"
+    data_dir.mkdir(exist_ok=True)
+    output_dir.mkdir(exist_ok=True)
+    (data_dir / "prices.csv").write_text("Close\n1\n")
+    completed = subprocess.run([sys.executable, "-c", SANDBOXED, ROOT, str(data_dir), str(output_dir)],
+                               input=textwrap.dedent(code), capture_output=True, text=True, timeout=60)
+    assert completed.returncode == 0, completed.stderr
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def test_job_files_are_accessible(tmp_path):
+    outcome = run_sandboxed(tmp_path, """
+        import numpy as np, pandas as pd
+        pd.read_csv(data_dir + "/prices.csv")
+        np.save(output_dir + "/weights.npy", np.zeros(3))
+    """)
+    assert outcome == "allowed"
+    assert (tmp_path / "output" / "weights.npy").exists()
+
+
+@pytest.mark.parametrize("code", [
+    "open('/etc/passwd').read()",
+    "open('/tmp/sandbox_escape', 'w')",
+    "open(output_dir + '/../escape', 'w')",
+    "import os; os.remove(data_dir + '/prices.csv')",
+    "import socket; socket.create_connection(('127.0.0.1', 80), timeout=1)",
+    "import subprocess; subprocess.run(['true'])",
+    "import os; os.system('true')",
+    "import ctypes; ctypes.CDLL(None)",
+    # Création de processus sans évènement d'audit (signature de Python 3.11)
+    """
+    import _posixsubprocess, os
+    read_fd, write_fd = os.pipe()
+    _posixsubprocess.fork_exec([b"/bin/true"], [b"/bin/true"], True, (write_fd,), None, None, -1, -1, -1, -1, -1,
+                               -1, read_fd, write_fd, False, False, -1, None, None, None, -1, None, False)
+    """,
+    "import importlib; importlib.import_module('_xxsubinterpreters').create()",
+    "import posix; posix.listdir('/')",
+    "import os; os.link(data_dir + '/prices.csv', output_dir + '/../escape')",
+    "import os; os.symlink(data_dir + '/prices.csv', output_dir + '/../escape')",
+    "import os; os.mkfifo(output_dir + '/../escape')",
+    "import os; os.mknod(output_dir + '/device')",
+    # Fonction native retrouvée par os.supports_dir_fd ou le module de base de os
+    "import os; next((f for f in os.supports_dir_fd if f.__name__ == 'mkfifo'), os.mkfifo)(output_dir + '/../escape')",
+    "import os, shutil; shutil.posix.mkfifo(output_dir + '/../escape')",
+], ids=["read", "write", "parent", "remove", "network", "subprocess", "system", "ctypes", "fork_exec",
+        "subinterpreters", "posix", "link", "symlink", "mkfifo", "mknod", "supports_dir_fd", "shutil_posix"])
+def test_operations_are_blocked(tmp_path, code):
+    assert run_sandboxed(tmp_path, code).startswith("blocked")
+    assert not os.path.lexists(tmp_path / "escape")
+
+
+@pytest.mark.parametrize("code", [
+    # Listes d'évènements du module remplacées
+    """
+    script_wrapper.SANDBOX_BLOCKED_EVENTS = frozenset()
+    script_wrapper.SANDBOX_FILE_EVENTS = ()
+    import socket; socket.create_connection(('127.0.0.1', 80), timeout=1)
+    """,
+    # Classe Sandbox et ses attributs remplacés
+    """
+    script_wrapper.Sandbox = None
+    guard.read_roots = guard.write_roots = ('/',)
+    open('/etc/passwd').read()
+    """,
+    # Fonctions de chemins et fonctions intégrées remplacées
+    """
+    import builtins, os
+    os.path.realpath = lambda path, **kwargs: output_dir
+    os.fsdecode = lambda path: output_dir
+    builtins.isinstance = lambda value, types: True
+    builtins.any = lambda values: True
+    open('/etc/passwd').read()
+    """,
+    # Sous-classe de str dont les comparaisons acceptent tout
+    """
+    class Anywhere(str):
+        def startswith(self, *args): return True
+        def __eq__(self, other): return True
+        __hash__ = str.__hash__
+    open(Anywhere('/etc/passwd')).read()
+    """,
+    # Lien symbolique du répertoire de sortie vers l'extérieur
+    """
+    import os
+    os.symlink('/etc', output_dir + '/etc')
+    """,
+    # Code d'une fonction existante remplacé
+    """
+    import os
+    os.path.realpath.__code__ = (lambda path, **kwargs: path).__code__
+    """,
+    # Recherche du hook par le ramasse-miettes
+    """
+    import gc
+    gc.get_objects()
+    """,
+], ids=["module", "class", "builtins", "str_subclass", "symlink", "code", "gc"])
+def test_escapes_are_blocked(tmp_path, code):
+    assert run_sandboxed(tmp_path, code).startswith("blocked")
+    assert not os.path.exists(tmp_path / "output" / "etc")
+
+
+def test_audit_hooks_cannot_be_added(tmp_path):
+    # sys.addaudithook ignore silencieusement le hook refusé : il ne doit jamais être appelé
+    outcome = run_sandboxed(tmp_path, """
+        import sys
+        calls = []
+        sys.addaudithook(lambda event, args: calls.append(event))
+        open(data_dir + "/prices.csv").read()
+        assert not calls
+    """)
+    assert outcome == "allowed"
+
+
+def test_proc_self_is_readable(tmp_path):
+    # /proc/self est un lien vers /proc/<pid> : la racine autorisée est résolue comme les chemins vérifiés
+    assert run_sandboxed(tmp_path, "open('/proc/self/status').read()") == "allowed"
+    assert run_sandboxed(tmp_path, "open('/proc/1/status').read()").startswith("blocked")
+
+
+def test_existing_symlink_is_resolved(tmp_path):
+    # Un lien créé avant l'isolement reste résolu vers sa cible réelle
+    (tmp_path / "output").mkdir()
+    os.symlink("/etc", tmp_path / "output" / "etc")
+    outcome = run_sandboxed(tmp_path, "open(output_dir + '/etc/passwd').read()")
+    assert outcome.startswith("blocked")
+
+
+@pytest.mark.skipif(not hasattr(os, "geteuid"), reason="nécessite os.geteuid")
+def test_host_interpreter_is_refused_as_root(tmp_path, monkeypatch):
+    pool = VenvPool(root_dir=str(tmp_path), host_packages=["pandas"])
+    monkeypatch.setattr(os, "geteuid", lambda: 1000)
+    assert pool.host_compatible(["pandas"])
+    # Sous root, RLIMIT_NPROC est sans effet : la stratégie doit s'exécuter dans un environnement virtuel
+    monkeypatch.setattr(os, "geteuid", lambda: 0)
+    assert not pool.host_compatible(["pandas"])
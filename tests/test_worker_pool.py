@@ -0,0 +1,180 @@
+import sys
+import textwrap
+import threading
+import time
+import os
+import pandas as pd
+import pytest
+import DataTransport
+from JobQueue import JobCancelled
+from WorkerPool import StrategyWorker, WorkerPool
+
+# Worker factice : signale qu'il est prêt puis, pour chaque job, exécute le comportement demandé
+FAKE_WORKER = textwrap.dedent("""
+    import json, sys, time
+    sys.stdout.write(json.dumps({"ready": True}) + "\\n")
+    sys.stdout.flush()
+    for line in sys.stdin:
+        job = json.loads(line)
+        if job["mode"] == "burst":
+            # Avancement et réponse écrits d'un seul bloc : les deux lignes arrivent ensemble dans le pipe
+            sys.stdout.write(json.dumps({"progress": {"chunks_done": 1, "chunks": 1}}) + "\\n"
+                             + json.dumps({"ok": True, "result": "poids"}) + "\\n")
+        elif job["mode"] == "slow_progress":
+            for position in range(3):
+                time.sleep(0.05)
+                sys.stdout.write(json.dumps({"progress": {"chunks_done": position + 1, "chunks": 3}}) + "\\n")
+                sys.stdout.flush()
+            sys.stdout.write(json.dumps({"ok": True, "result": "poids"}) + "\\n")
+        elif job["mode"] == "hang":
+            time.sleep(60)
+        sys.stdout.flush()
+""")
+
+
+@pytest.fixture
+def worker(tmp_path):
+    script = tmp_path / "fake_worker.py"
+    script.write_text(FAKE_WORKER)
+    strategy_worker = StrategyWorker(sys.executable, str(script), max_jobs=10)
+    strategy_worker.start(timeout=10)
+    yield strategy_worker
+    strategy_worker.close()
+
+
+def test_progress_and_reply_in_one_read(worker):
+    # La réponse déjà présente dans le tampon de lecture doit être lue sans attendre de nouvelles données
+    start = time.monotonic()
+    assert worker.run_job({"mode": "burst"}, timeout=5) == "poids"
+    assert time.monotonic() - start < 2
+    assert worker.run_job({"mode": "burst"}, timeout=5) == "poids"
+
+
+def test_progress_messages_are_consumed(worker):
+    assert worker.run_job({"mode": "slow_progress"}, timeout=5) == "poids"
+    assert worker.alive
+
+
+def test_timeout_kills_worker(worker):
+    start = time.monotonic()
+    with pytest.raises(RuntimeError, match="délai imparti"):
+        worker.run_job({"mode": "hang"}, timeout=0.5)
+    assert time.monotonic() - start < 5
+    assert not worker.alive
+
+
+def test_cancel_kills_worker(worker):
+    cancel_event = threading.Event()
+    threading.Timer(0.3, cancel_event.set).start()
+    with pytest.raises(JobCancelled):
+        worker.run_job({"mode": "hang"}, timeout=30, cancel_event=cancel_event)
+    assert not worker.alive
+
+
+# Stratégie malveillante : remplace l'écriture des résultats et une méthode de pandas pour les jobs suivants
+POISON = textwrap.dedent("""
+    import DataTransport
+    import pandas as pd
+
+    def func_strat(dfs_dict):
+        DataTransport.write_result = lambda df, directory: DataTransport.json.dumps({"format": "npy"})
+        pd.DataFrame.to_json = lambda self, *args, **kwargs: "{}"
+        closes = pd.DataFrame({ticker: df["Close"] for ticker, df in dfs_dict.items()})
+        return closes * 0 + 42.0
+""")
+CLEAN = textwrap.dedent("""
+    import pandas as pd
+
+    def func_strat(dfs_dict):
+        closes = pd.DataFrame({ticker: df["Close"] for ticker, df in dfs_dict.items()})
+        return closes * 0 + 0.5
+""")
+
+
+@pytest.mark.parametrize("host", [True, False])
+def test_jobs_do_not_share_state(tmp_path, host):
+    if host:
+        python_executable = sys.executable
+    else:
+        # Lien vers l'interpréteur, comme celui d'un environnement virtuel : le worker n'est pas isolé
+        python_executable = str(tmp_path / "python")
+        os.symlink(sys.executable, python_executable)
+    data = {"AAA": pd.DataFrame({"Close": [1.0, 2.0, 3.0]}, index=pd.date_range("2023-01-01", periods=3))}
+    manifest_path = DataTransport.write_panel(data, str(tmp_path / "data"))
+    for name, source in (("poison", POISON), ("clean", CLEAN)):
+        (tmp_path / f"{name}.py").write_text(source)
+    pool = WorkerPool(workers_per_env=1, max_jobs_per_worker=10)
+    try:
+        pool.run(python_executable, manifest_path, str(tmp_path / "poison.py"), output_dir=str(tmp_path / "out1"))
+        result = pool.run(python_executable, manifest_path, str(tmp_path / "clean.py"),
+                          output_dir=str(tmp_path / "out2"))
+        # Le même worker a servi les deux jobs
+        assert len(pool._idle[python_executable]) == 1
+    finally:
+        pool.shutdown()
+    weights = DataTransport.read_result(result)
+    assert (weights["AAA"] == 0.5).all()
+
+
+def _running(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as file:
+            # Un processus zombie (Z) est terminé et attend seulement d'être collecté
+            return file.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="nécessite /proc")
+def test_cancel_stops_job_process(tmp_path):
+    data = {"AAA": pd.DataFrame({"Close": [1.0, 2.0]}, index=pd.date_range("2023-01-01", periods=2))}
+    manifest_path = DataTransport.write_panel(data, str(tmp_path / "data"))
+    output_dir = tmp_path / "out"
+    (tmp_path / "sleep.py").write_text(textwrap.dedent(f"""
+        import os, time
+
+        def func_strat(dfs_dict):
+            os.makedirs({str(output_dir)!r}, exist_ok=True)
+            with open(os.path.join({str(output_dir)!r}, "pid"), "w") as file:
+                file.write(str(os.getpid()))
+            time.sleep(60)
+    """))
+    pool = WorkerPool(workers_per_env=1)
+    cancel_event = threading.Event()
+    threading.Timer(1.0, cancel_event.set).start()
+    with pytest.raises(JobCancelled):
+        pool.run(sys.executable, manifest_path, str(tmp_path / "sleep.py"), output_dir=str(output_dir),
+                 cancel_event=cancel_event)
+    pid = int((output_dir / "pid").read_text())
+    deadline = time.monotonic() + 5
+    while _running(pid) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not _running(pid)
+
+
+def test_parallelism_is_capped():
+    pool = WorkerPool(workers_per_env=4, max_parallel_per_request=3)
+    assert [pool.parallelism(n_tasks) for n_tasks in (0, 1, 2, 10)] == [1, 1, 2, 3]
+    assert WorkerPool(workers_per_env=2).parallelism(10) == 2
+
+
+def test_concurrent_tasks_share_pool_workers(tmp_path):
+    data = {"AAA": pd.DataFrame({"Close": [1.0, 2.0, 3.0]}, index=pd.date_range("2023-01-01", periods=3))}
+    manifest_path = DataTransport.write_panel(data, str(tmp_path / "data"))
+    (tmp_path / "clean.py").write_text(CLEAN)
+    pool = WorkerPool(workers_per_env=2, max_jobs_per_worker=50)
+    try:
+        threads = [threading.Thread(target=pool.run, args=(sys.executable, manifest_path, str(tmp_path / "clean.py")),
+                                    kwargs={"output_dir": str(tmp_path / f"out{position}")})
+                   for position in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Les six tâches ont été servies par au plus workers_per_env workers, conservés dans le pool
+        workers = pool._idle[sys.executable]
+        assert 1 <= len(workers) <= 2
+        assert all(worker.alive for worker in workers)
+    finally:
+        pool.shutdown()
+    assert all((tmp_path / f"out{position}").exists() for position in range(6))